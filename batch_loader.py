@@ -0,0 +1,213 @@
+"""
+Параллельное чтение файлов групп TradeWatch
+
+Разбор XLSX в openpyxl занимает процессор и упирается в GIL, поэтому
+при большом числе файлов групп они читаются в пуле процессов. Из каждого
+файла берутся только колонки, нужные для отчета, EAN нормализуется
+в том же процессе, а результаты объединяются одним pd.concat.
+
+BatchFileAccumulator разбирает файлы групп в том же пуле процессов по мере
+скачивания, пока браузеры работают с TradeWatch, - после последней группы
+остается только объединить готовые DataFrame и записать отчет.
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import config
+from ean_utils import normalize_ean_series
+from ean_cache import get_ean_cache
+
+# Колонки файла TradeWatch, которые попадают в отчет или нужны для ссылок
+REPORT_SOURCE_COLUMNS = frozenset(['EAN'] + config.DESIRED_COLUMN_ORDER + config.LINK_NUMBER_COLUMNS)
+
+
+def read_tradewatch_batch(file_path, columns=None):
+    """
+    Читает лист config.TRADEWATCH_SHEET_NAME одного файла группы
+
+    Args:
+        file_path: путь к файлу TradeWatch
+        columns: колонки, которые нужно прочитать (None - все)
+
+    Returns:
+        tuple: (DataFrame или None, текст ошибки или None)
+    """
+    try:
+        df = pd.read_excel(file_path, sheet_name=config.TRADEWATCH_SHEET_NAME)
+        # openpyxl разбирает все ячейки листа и с usecols, поэтому лишние
+        # колонки отбрасываются сразу после чтения - до передачи
+        # в основной процесс и объединения
+        return prepare_tradewatch_frame(df, os.path.basename(file_path), columns), None
+    except Exception as e:
+        return None, str(e)
+
+
+def prepare_tradewatch_frame(df, source_name, columns=None):
+    """
+    Приводит строки листа TradeWatch (из файла группы или кеша) к виду
+    для объединения: нужные колонки, источник и 13-значный EAN
+    """
+    if columns is not None:
+        df = df[[column for column in df.columns if column in columns]]
+    df = df.copy()
+    df['source_file'] = source_name
+
+    # Форматируем EAN в 13-цифровом формате
+    df['EAN'] = normalize_ean_series(df['EAN'])
+    return df
+
+
+def get_batch_read_workers(file_count):
+    """Число процессов для чтения file_count файлов (1 - читать в текущем процессе)"""
+    if file_count < config.BATCH_READ_PARALLEL_MIN_FILES:
+        return 1
+    cpu_count = os.cpu_count() or 1
+    workers = config.BATCH_READ_WORKERS or cpu_count
+    # Больше процессов, чем ядер, разбор не ускоряет
+    return max(1, min(workers, cpu_count, file_count))
+
+
+def load_tradewatch_batches(file_paths, columns=None):
+    """
+    Читает файлы групп TradeWatch и объединяет их в один DataFrame
+
+    Файлы с ошибкой чтения пропускаются (с сообщением в лог), как и раньше
+    при последовательном чтении.
+
+    Args:
+        file_paths: пути к файлам TradeWatch
+        columns: колонки, которые нужно прочитать (None - все)
+
+    Returns:
+        pd.DataFrame или None, если не удалось прочитать ни один файл
+    """
+    file_paths = list(file_paths)
+    workers = get_batch_read_workers(len(file_paths))
+    columns = frozenset(columns) if columns is not None else None
+
+    if workers > 1:
+        print(f"📖 Читаем {len(file_paths)} файлов TradeWatch в {workers} процессах")
+        # spawn: бот работает в нескольких потоках, fork из такого процесса небезопасен
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = list(executor.map(read_tradewatch_batch, file_paths, [columns] * len(file_paths)))
+    else:
+        results = [read_tradewatch_batch(file_path, columns) for file_path in file_paths]
+
+    frames = []
+    for file_path, (df, error) in zip(file_paths, results):
+        if df is None:
+            print(f"Ошибка при чтении файла {file_path}: {error}")
+            continue
+        frames.append(df)
+        print(f"  {os.path.basename(file_path)}: найдено EAN кодов {len(df)}")
+
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+class BatchFileAccumulator:
+    """
+    Фоновый разбор файлов групп по мере скачивания (producer/consumer)
+
+    Обработчики групп передают готовые файлы в submit(), файлы разбираются
+    в пуле процессов (openpyxl не держит GIL основного процесса, где работают
+    event loop бота и потоки Selenium), collect() дожидается результатов
+    и объединяет их в порядке переданных файлов. Если при передаче файла
+    указаны EAN коды группы, разобранные строки сохраняются в кеш EAN.
+    """
+
+    def __init__(self, columns=None):
+        self.columns = frozenset(columns) if columns is not None else None
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._executor = None
+        self._closed = False
+
+    def _get_executor(self):
+        # Процессы запускаются при первом файле - без скачанных групп пул не нужен
+        if self._executor is None:
+            cpu_count = os.cpu_count() or 1
+            workers = max(1, min(config.BATCH_READ_WORKERS or cpu_count, cpu_count))
+            # spawn: бот работает в нескольких потоках, fork из такого процесса небезопасен
+            context = multiprocessing.get_context('spawn')
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return self._executor
+
+    def submit(self, file_path, ean_codes=None):
+        """
+        Ставит скачанный файл группы в очередь разбора
+
+        Args:
+            file_path: файл группы
+            ean_codes: коды, отправленные в TradeWatch в этой группе, - строки
+                файла сохраняются в кеш EAN (None - не сохранять, например
+                для групп, уже скачанных до перезапуска)
+        """
+        with self._lock:
+            if self._closed or file_path in self._futures:
+                return
+            future = self._get_executor().submit(read_tradewatch_batch, file_path, self.columns)
+            self._futures[file_path] = future
+        if ean_codes is not None and config.EAN_CACHE_ENABLED:
+            future.add_done_callback(lambda done: self._store_in_cache(file_path, ean_codes, done))
+
+    def _store_in_cache(self, file_path, ean_codes, future):
+        try:
+            df, error = future.result()
+            if df is None:
+                print(f"⚠️ Не удалось сохранить файл {file_path} в кеш EAN: {error}")
+                return
+            get_ean_cache().store_batch_frame(ean_codes, df)
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить файл {file_path} в кеш EAN: {e}")
+
+    def close(self):
+        """Дожидается разбора уже переданных файлов и останавливает процессы"""
+        with self._lock:
+            self._closed = True
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _result(self, file_path):
+        future = self._futures.get(file_path)
+        if future is None:
+            # Файл не передавался в submit() - читаем сейчас
+            return read_tradewatch_batch(file_path, self.columns)
+        try:
+            return future.result()
+        except Exception as e:
+            # Процесс разбора упал (например, нехватка памяти)
+            return None, str(e)
+
+    def collect(self, file_paths):
+        """
+        Объединяет разобранные файлы (файлы, не переданные в submit(),
+        читаются сейчас)
+
+        Returns:
+            pd.DataFrame или None, если не удалось прочитать ни один файл
+        """
+        started_at = time.time()
+        frames = []
+        for file_path in file_paths:
+            df, error = self._result(file_path)
+            if df is None:
+                print(f"Ошибка при чтении файла {file_path}: {error}")
+                continue
+            frames.append(df)
+        self.close()
+
+        parsed_count = sum(1 for file_path in file_paths if file_path in self._futures)
+        print(f"📖 Файлы TradeWatch разобраны во время скачивания: {parsed_count} из {len(file_paths)} "
+              f"(ожидание результатов {time.time() - started_at:.1f} сек)")
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,112 @@
+"""
+Манифест групп в папке загрузок TradeWatch
+
+process_supplier_file_with_tradewatch записывает в download_dir каждую
+отправленную группу: номер -> хеш списка EAN -> файл -> статус. При
+повторном запуске на том же файле поставщика (тот же подготовленный
+список EAN) группы с целым скачанным файлом не запрашиваются снова -
+упавшая на середине задача продолжается, а не начинается сначала.
+Это единственное место, где хранятся группы: и после перезапуска бота,
+и при новом нажатии "Создать отчёт" на том же файле, и при запуске без бота.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+import config
+
+# Имя файла манифеста в download_dir (JSON Lines: заголовок, затем записи групп)
+MANIFEST_FILENAME = "batch_manifest.jsonl"
+
+# Статусы группы
+BATCH_RUNNING = "running"
+BATCH_DONE = "done"
+BATCH_FAILED = "failed"
+
+
+def hash_ean_codes(ean_codes):
+    """Хеш списка EAN кодов (порядок важен)"""
+    return hashlib.sha1('\n'.join(ean_codes).encode('ascii')).hexdigest()
+
+
+class BatchManifest:
+    """
+    Манифест групп одного файла поставщика
+
+    Записи дописываются в конец файла (последняя запись группы - актуальная),
+    чтобы обновление статуса не переписывало весь манифест.
+    """
+
+    def __init__(self, download_dir, ean_codes, ttl_seconds=None):
+        self.path = os.path.join(download_dir, MANIFEST_FILENAME)
+        self.ttl_seconds = config.BATCH_MANIFEST_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.supplier_hash = hash_ean_codes(ean_codes)
+        self._lock = threading.Lock()
+        self._batches = self._load()
+        if not self._batches:
+            # Новый манифест (или другой файл поставщика) - начинаем файл с заголовка
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'supplier_hash': self.supplier_hash}) + '\n')
+
+    def _load(self):
+        batches = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                header = json.loads(f.readline() or '{}')
+                if header.get('supplier_hash') != self.supplier_hash:
+                    # Другой файл поставщика - прежние группы к нему не относятся
+                    return {}
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        # Последняя строка могла не дописаться при падении
+                        continue
+                    batches[batch['batch_number']] = batch
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"⚠️ Манифест групп поврежден, начинаем заново: {e}")
+            return {}
+        return batches
+
+    def _record(self, batch_number, ean_codes, status, file_path=None):
+        batch = {
+            'batch_number': batch_number,
+            'ean_hash': hash_ean_codes(ean_codes),
+            'ean_codes': list(ean_codes),
+            'file': file_path,
+            'status': status,
+            'updated_at': time.time(),
+        }
+        with self._lock:
+            self._batches[batch_number] = batch
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(batch) + '\n')
+
+    def batch_started(self, batch_number, ean_codes):
+        self._record(batch_number, ean_codes, BATCH_RUNNING)
+
+    def batch_finished(self, batch_number, ean_codes, file_path):
+        """file_path - скачанный файл группы или None при ошибке"""
+        self._record(batch_number, ean_codes, BATCH_DONE if file_path else BATCH_FAILED, file_path)
+
+    def batches(self):
+        """
+        Группы этого файла поставщика (устаревшие и с неверным хешем пропускаются)
+
+        Returns:
+            list: (номер группы, EAN коды, статус, путь к файлу)
+        """
+        min_updated_at = time.time() - self.ttl_seconds
+        result = []
+        with self._lock:
+            for batch_number, batch in self._batches.items():
+                status = batch['status']
+                if batch['updated_at'] < min_updated_at or batch['ean_hash'] != hash_ean_codes(batch['ean_codes']):
+                    # Данные устарели или запись повреждена - группа будет запрошена заново
+                    status = BATCH_FAILED
+                result.append((batch_number, batch['ean_codes'], status, batch['file']))
+        return sorted(result)
@@ -0,0 +1,124 @@
+"""
+Планировщик групп EAN кодов с повторами и делением пополам
+
+Группы нарезаются из списка кодов по мере обработки (размер берется из
+AdaptiveBatchSizer в момент нарезки). Неудачная группа повторяется
+с паузой, а после исчерпания повторов делится пополам, пока не останутся
+отдельные "ядовитые" коды - они записываются как окончательно
+не полученные, остальные коды группы все равно обрабатываются.
+"""
+import time
+import threading
+from collections import deque
+
+import config
+from progress_bridge import (
+    emit_progress_event, EVENT_BATCH_STARTED, EVENT_BATCH_DONE, EVENT_BATCH_FAILED,
+    EVENT_BATCH_RETRY, EVENT_BATCH_SPLIT, EVENT_EAN_FAILED
+)
+
+
+class EanBatchScheduler:
+    """Потокобезопасная очередь групп EAN кодов с повторами"""
+
+    def __init__(self, ean_codes, sizer, max_retries=None, backoff_seconds=None, first_batch_number=1,
+                 progress_events=None):
+        self.ean_codes = ean_codes
+        self.sizer = sizer
+        self.max_retries = config.BATCH_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_seconds = config.BATCH_RETRY_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+
+        self.position = 0
+        # Номера групп продолжаются после уже скачанных (при продолжении задачи)
+        self.batch_count = first_batch_number - 1
+        self.retried_batches = 0
+        self.split_batches = 0
+        self.failed_codes = []
+        # Получатель событий групп (см. progress_bridge.py)
+        self.progress_events = progress_events
+
+        self._lock = threading.Lock()
+        # Группы на повтор: (время готовности, коды, оставшиеся повторы, номер попытки)
+        self._retry_queue = deque()
+        # Отправленные группы: номер -> (коды, оставшиеся повторы, номер попытки)
+        self._in_flight = {}
+
+    def next_batch(self):
+        """
+        Следующая группа для обработки: сначала готовые повторы, затем новые коды
+
+        Returns:
+            tuple: (номер группы, список EAN кодов) или None, если сейчас отправить нечего
+        """
+        with self._lock:
+            now = time.time()
+            for index, (ready_at, codes, retries_left, attempt) in enumerate(self._retry_queue):
+                if ready_at <= now:
+                    del self._retry_queue[index]
+                    return self._dispatch(codes, retries_left, attempt)
+
+            if self.position >= len(self.ean_codes):
+                return None
+
+            batch_size = self.sizer.next_batch_size()
+            batch = self.ean_codes[self.position:self.position + batch_size]
+            self.position += len(batch)
+            return self._dispatch(batch, self.max_retries, 1)
+
+    def _dispatch(self, codes, retries_left, attempt):
+        # Каждая отправка (и повтор) получает новый номер - это и имя файла группы
+        self.batch_count += 1
+        self._in_flight[self.batch_count] = (codes, retries_left, attempt)
+        emit_progress_event(self.progress_events, EVENT_BATCH_STARTED,
+                            batch=self.batch_count, size=len(codes), attempt=attempt)
+        return self.batch_count, codes
+
+    def report_result(self, batch_number, success):
+        """
+        Учитывает результат группы: неудачная группа ставится на повтор
+        с паузой или делится пополам; одиночный код без повторов - окончательная ошибка
+        """
+        with self._lock:
+            codes, retries_left, attempt = self._in_flight.pop(batch_number)
+            if success:
+                emit_progress_event(self.progress_events, EVENT_BATCH_DONE, batch=batch_number, size=len(codes))
+                return
+            emit_progress_event(self.progress_events, EVENT_BATCH_FAILED, batch=batch_number, size=len(codes))
+
+            delay = self.backoff_seconds * (2 ** (attempt - 1))
+            ready_at = time.time() + delay
+
+            if retries_left > 0:
+                self.retried_batches += 1
+                self._retry_queue.append((ready_at, codes, retries_left - 1, attempt + 1))
+                print(f"🔁 Группа {batch_number} ({len(codes)} кодов) будет повторена через {delay:.0f} сек")
+                emit_progress_event(self.progress_events, EVENT_BATCH_RETRY, batch=batch_number, delay=delay)
+            elif len(codes) > 1:
+                self.split_batches += 1
+                middle = len(codes) // 2
+                # Половины сразу делятся дальше при ошибке, без повторов целиком
+                self._retry_queue.append((ready_at, codes[:middle], 0, attempt + 1))
+                self._retry_queue.append((ready_at, codes[middle:], 0, attempt + 1))
+                print(f"✂️ Группа {batch_number} делится пополам: {middle} + {len(codes) - middle} кодов "
+                      f"(через {delay:.0f} сек)")
+                emit_progress_event(self.progress_events, EVENT_BATCH_SPLIT, batch=batch_number, delay=delay)
+            else:
+                self.failed_codes.extend(codes)
+                print(f"☠️ EAN {codes[0]} не удалось получить из TradeWatch")
+                emit_progress_event(self.progress_events, EVENT_EAN_FAILED, ean=codes[0])
+
+    def seconds_until_ready(self):
+        """Сколько ждать до ближайшего повтора (None, если повторов нет)"""
+        with self._lock:
+            if not self._retry_queue:
+                return None
+            return max(0.0, min(item[0] for item in self._retry_queue) - time.time())
+
+    def is_finished(self):
+        """Все коды отправлены, повторов и групп в обработке не осталось"""
+        with self._lock:
+            return self.position >= len(self.ean_codes) and not self._retry_queue and not self._in_flight
+
+    def print_summary(self):
+        print(f"🔁 Повторов групп: {self.retried_batches}, делений пополам: {self.split_batches}, "
+              f"окончательно не получено EAN: {len(self.failed_codes)}")
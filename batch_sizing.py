@@ -0,0 +1,127 @@
+"""
+Адаптивный размер групп EAN кодов для запросов к TradeWatch
+
+Размер группы подбирается по ходу задачи (AIMD, как в управлении
+перегрузкой TCP): после успешной группы, уложившейся в лимит времени,
+размер растет на фиксированный шаг, после ошибки или слишком медленной
+группы - уменьшается в несколько раз. Границы и шаги - в config.py.
+"""
+import time
+import threading
+
+import config
+
+# Последняя измеренная скорость (EAN в минуту) - для оценки времени новых задач
+_observed_rate = None
+_observed_rate_lock = threading.Lock()
+
+
+def get_observed_rate(default=None):
+    """Скорость обработки последней завершенной задачи (EAN в минуту)"""
+    with _observed_rate_lock:
+        return _observed_rate if _observed_rate else default
+
+
+def _set_observed_rate(rate):
+    global _observed_rate
+    with _observed_rate_lock:
+        _observed_rate = rate
+
+
+class AdaptiveBatchSizer:
+    """Потокобезопасный AIMD регулятор размера группы"""
+
+    def __init__(self, initial_size, min_size=None, max_size=None, increase_step=None,
+                 decrease_factor=None, latency_limit=None, enabled=None):
+        self.enabled = config.ADAPTIVE_BATCH_SIZE_ENABLED if enabled is None else enabled
+        self.min_size = config.BATCH_SIZE_MIN if min_size is None else min_size
+        self.max_size = config.BATCH_SIZE_MAX if max_size is None else max_size
+        self.increase_step = config.BATCH_SIZE_INCREASE_STEP if increase_step is None else increase_step
+        self.decrease_factor = config.BATCH_SIZE_DECREASE_FACTOR if decrease_factor is None else decrease_factor
+        self.latency_limit = config.BATCH_LATENCY_LIMIT_SECONDS if latency_limit is None else latency_limit
+
+        self._lock = threading.Lock()
+        if self.enabled:
+            self._size = max(self.min_size, min(self.max_size, initial_size))
+        else:
+            self._size = initial_size
+        self._started_at = time.time()
+        self._processed_codes = 0
+        self._failed_batches = 0
+        self.decisions = []
+
+    def next_batch_size(self):
+        """Размер следующей группы"""
+        with self._lock:
+            return self._size
+
+    def record(self, batch_number, batch_size, seconds, success):
+        """
+        Учитывает результат группы и пересчитывает размер следующей
+
+        Args:
+            batch_number: номер группы
+            batch_size: количество EAN кодов в группе
+            seconds: время генерации и экспорта группы
+            success: получен ли файл группы
+
+        Returns:
+            int: новый размер группы
+        """
+        with self._lock:
+            old_size = self._size
+            if success:
+                self._processed_codes += batch_size
+            else:
+                self._failed_batches += 1
+
+            if not self.enabled:
+                decision = "фиксированный размер"
+            elif not success:
+                self._size = max(self.min_size, int(self._size * self.decrease_factor))
+                decision = "ошибка -> уменьшаем"
+            elif seconds > self.latency_limit:
+                self._size = max(self.min_size, int(self._size * self.decrease_factor))
+                decision = f"дольше {self.latency_limit} сек -> уменьшаем"
+            else:
+                self._size = min(self.max_size, self._size + self.increase_step)
+                decision = "успех -> увеличиваем"
+
+            rate = batch_size / seconds * 60 if seconds > 0 else 0
+            self.decisions.append({
+                'batch_number': batch_number,
+                'batch_size': batch_size,
+                'seconds': round(seconds, 1),
+                'success': success,
+                'next_size': self._size,
+                'decision': decision
+            })
+            new_size = self._size
+
+        print(f"📏 Группа {batch_number}: {batch_size} кодов за {seconds:.1f} сек ({rate:.0f} EAN/мин), "
+              f"{decision}: {old_size} -> {new_size}")
+        return new_size
+
+    def throughput(self):
+        """Средняя скорость задачи (успешно обработанные EAN в минуту)"""
+        with self._lock:
+            elapsed = time.time() - self._started_at
+            return self._processed_codes / elapsed * 60 if elapsed > 0 else 0
+
+    def print_summary(self):
+        """Итог задачи: скорость, размеры групп, ошибки. Запоминает скорость для оценок"""
+        rate = self.throughput()
+        with self._lock:
+            sizes = [decision['batch_size'] for decision in self.decisions]
+            failed_batches = self._failed_batches
+            final_size = self._size
+
+        if rate > 0:
+            _set_observed_rate(rate)
+
+        if not sizes:
+            return
+        print(f"📏 Размер групп: мин {min(sizes)}, макс {max(sizes)}, итоговый {final_size} "
+              f"(границы {self.min_size}-{self.max_size}), ошибок {failed_batches} из {len(sizes)} групп")
+        print(f"🚀 Скорость задачи: {rate:.0f} EAN/мин")
+
@@ -0,0 +1,384 @@
+"""
+Бенчмарки производительности обработки TradeWatch
+
+Запуск:
+    python benchmarks.py pool <файл_поставщика.xlsx> [количество_групп]
+    python benchmarks.py fill [размер_группы ...]
+    python benchmarks.py ean [количество_значений]
+    python benchmarks.py excel [количество_строк ...]
+    python benchmarks.py batches [количество_файлов] [строк_в_файле]
+"""
+import os
+import sys
+import time
+import tempfile
+
+import pandas as pd
+
+
+def _load_benchmark_batches(supplier_file_path, batch_count):
+    """Нарезает EAN коды из файла поставщика на группы стандартного размера"""
+    from tradewatch_login import get_batch_size
+
+    df = pd.read_excel(supplier_file_path)
+    ean_codes = [code.strip() for code in df['GTIN'].dropna().astype(str) if code.strip()]
+    batch_size = get_batch_size()
+    batches = [ean_codes[i:i + batch_size] for i in range(0, len(ean_codes), batch_size)]
+    return batches[:batch_count]
+
+
+def _report(title, started_at, results):
+    elapsed = time.time() - started_at
+    succeeded = sum(1 for result in results if result)
+    rate = len(results) / (elapsed / 60) if elapsed > 0 else 0
+    print(f"📊 {title}: {succeeded}/{len(results)} групп за {elapsed:.1f} сек -> {rate:.2f} групп/мин")
+    return rate
+
+
+def benchmark_browser_pool(supplier_file_path, batch_count=5):
+    """
+    Сравнивает скорость обработки групп: новый браузер на каждую группу
+    против "теплых" сессий из пула
+
+    Требует рабочих учетных данных TradeWatch в окружении.
+    """
+    from tradewatch_login import process_batch_with_new_browser, process_batch_with_pool
+    from browser_pool import get_browser_pool
+
+    batches = _load_benchmark_batches(supplier_file_path, batch_count)
+    if not batches:
+        print("Нет EAN кодов для бенчмарка")
+        return
+
+    print(f"🏁 Бенчмарк пула браузеров: {len(batches)} групп по {len(batches[0])} кодов")
+
+    with tempfile.TemporaryDirectory() as download_dir:
+        # ДО: новый Chrome и вход для каждой группы
+        started_at = time.time()
+        results = [process_batch_with_new_browser(batch, download_dir, i) for i, batch in enumerate(batches, 1)]
+        rate_before = _report("Новый браузер на группу", started_at, results)
+
+        # ПОСЛЕ: сессии из пула (холодный старт первой сессии входит в замер)
+        started_at = time.time()
+        results = [process_batch_with_pool(batch, download_dir, i) for i, batch in enumerate(batches, 1)]
+        rate_after = _report("Пул сессий", started_at, results)
+
+        pool = get_browser_pool()
+        print(f"🏊 Статистика пула: {pool.stats()}")
+        pool.close_all()
+
+    if rate_before > 0:
+        print(f"🚀 Ускорение: x{rate_after / rate_before:.2f}")
+
+
+# Страница с полем как на EAN Price Report (без обращения к TradeWatch)
+FILL_BENCHMARK_PAGE = "data:text/html,<textarea id='eansPhrase' rows='10' cols='80'></textarea>"
+
+
+def _synthetic_ean_codes(count):
+    return [f"{5900000000000 + i * 7919:013d}" for i in range(count)]
+
+
+def benchmark_ean_field_fill(batch_sizes=(50, 100, 300, 500, 1000)):
+    """
+    Замеряет время заполнения поля EAN кодов: посимвольный send_keys
+    против одного execute_script (fill_ean_field_fast)
+
+    Запускает локальный headless Chrome, к TradeWatch не обращается.
+    """
+    from selenium.webdriver.common.by import By
+    from tradewatch_login import create_chrome_driver, fill_ean_field_fast, ean_codes_match
+
+    with tempfile.TemporaryDirectory() as download_dir:
+        driver = create_chrome_driver(download_dir, headless=True)
+        try:
+            print("🏁 Бенчмарк заполнения поля EAN кодов")
+            for batch_size in batch_sizes:
+                ean_codes_string = ' '.join(_synthetic_ean_codes(batch_size))
+
+                driver.get(FILL_BENCHMARK_PAGE)
+                ean_field = driver.find_element(By.ID, "eansPhrase")
+                started_at = time.time()
+                ean_field.send_keys(ean_codes_string)
+                send_keys_time = time.time() - started_at
+                send_keys_ok = ean_codes_match(ean_field.get_attribute("value"), ean_codes_string)
+
+                driver.get(FILL_BENCHMARK_PAGE)
+                ean_field = driver.find_element(By.ID, "eansPhrase")
+                started_at = time.time()
+                field_value = fill_ean_field_fast(driver, ean_field, ean_codes_string)
+                fast_time = time.time() - started_at
+                fast_ok = ean_codes_match(field_value, ean_codes_string)
+
+                speedup = send_keys_time / fast_time if fast_time > 0 else 0
+                print(f"📊 {batch_size} кодов: send_keys {send_keys_time:.2f} сек ({'OK' if send_keys_ok else 'расхождение'}), "
+                      f"execute_script {fast_time * 1000:.1f} мс ({'OK' if fast_ok else 'расхождение'}) -> x{speedup:.0f}")
+        finally:
+            driver.quit()
+
+
+def _legacy_format_ean_to_13_digits(ean_code):
+    """Прежняя построчная нормализация EAN (копия для сравнения)"""
+    try:
+        ean_str = str(ean_code).strip()
+        if not ean_str:
+            return None
+        if 'E' in ean_str.upper() or 'e' in ean_str:
+            try:
+                ean_str = str(int(float(ean_str)))
+            except:
+                pass
+        ean_digits = ''.join(char for char in ean_str if char.isdigit())
+        if not ean_digits:
+            return None
+        return ean_digits[:13].zfill(13)
+    except Exception:
+        return None
+
+
+def _synthetic_ean_values(count):
+    """Смесь значений колонки GTIN, как их отдает pandas из Excel"""
+    import numpy as np
+
+    codes = _synthetic_ean_codes(count)
+    odd_values = [
+        lambda code: f"{float(code):.12E}",
+        lambda code: f"  {code} ",
+        lambda code: code + "99",
+        lambda code: np.nan,
+        lambda code: f"{code[:6]}-{code[6:]}",
+    ]
+    values = []
+    for i, code in enumerate(codes):
+        kind = i % 10
+        if kind < 4:
+            values.append(int(code))
+        elif kind < 7:
+            values.append(float(code))
+        elif kind < 9:
+            values.append(code[i % 5:])
+        else:
+            # Каждое десятое значение - "грязное"
+            values.append(odd_values[(i // 10) % len(odd_values)](code))
+    return pd.Series(values, dtype=object)
+
+
+def benchmark_ean_normalization(count=1_000_000):
+    """
+    Замеряет нормализацию колонки EAN: прежний Series.apply по строкам
+    против векторной normalize_ean_series (и с проверкой контрольной цифры)
+    """
+    from ean_utils import normalize_ean_series, normalize_ean_with_mask
+
+    values = _synthetic_ean_values(count)
+    print(f"🏁 Бенчмарк нормализации EAN: {count} значений")
+
+    started_at = time.time()
+    legacy = values.apply(_legacy_format_ean_to_13_digits)
+    legacy_time = time.time() - started_at
+
+    started_at = time.time()
+    vectorized = normalize_ean_series(values)
+    vectorized_time = time.time() - started_at
+
+    started_at = time.time()
+    normalize_ean_with_mask(values)
+    mask_time = time.time() - started_at
+
+    mismatches = int((legacy.fillna('') != vectorized.fillna('')).sum())
+    speedup = legacy_time / vectorized_time if vectorized_time > 0 else 0
+    print(f"📊 Смешанная колонка - Series.apply: {legacy_time:.2f} сек, "
+          f"normalize_ean_series: {vectorized_time:.2f} сек -> x{speedup:.1f}")
+    print(f"📊 С проверкой контрольной цифры: {mask_time:.2f} сек")
+    print(f"📊 Расхождений с прежней функцией: {mismatches}")
+
+    # Колонка GTIN без текстовых ячеек pandas читает как числа
+    numeric_values = pd.Series([int(code) for code in _synthetic_ean_codes(count)])
+    started_at = time.time()
+    numeric_values.apply(_legacy_format_ean_to_13_digits)
+    legacy_time = time.time() - started_at
+    started_at = time.time()
+    normalize_ean_series(numeric_values)
+    vectorized_time = time.time() - started_at
+    speedup = legacy_time / vectorized_time if vectorized_time > 0 else 0
+    print(f"📊 Числовая колонка - Series.apply: {legacy_time:.2f} сек, "
+          f"normalize_ean_series: {vectorized_time:.2f} сек -> x{speedup:.1f}")
+
+
+def _synthetic_report(rows):
+    """DataFrame итогового отчета с колонками config.DESIRED_COLUMN_ORDER"""
+    import numpy as np
+
+    rng = np.random.default_rng(42)
+    codes = _synthetic_ean_codes(rows)
+    return pd.DataFrame({
+        'Lp': np.arange(1, rows + 1),
+        'EAN': codes,
+        'Price': rng.random(rows) * 100,
+        'Price PL': None,
+        'Cena min.': rng.random(rows) * 200,
+        'Profit': None,
+        'ROI': None,
+        'Link': [f"https://allegro.pl/oferta/{10000000000 + i}" for i in range(rows)],
+        'Top oferta': [f"Produkt testowy {i}" for i in range(rows)],
+        'Dost. szt.': rng.integers(0, 500, rows),
+        'Ilość aukcji': rng.integers(0, 50, rows),
+        'Transakcje (30 dni)': rng.integers(0, 1000, rows),
+        'Product Link': [f"https://api.qogita.com/variants/link/{code}/" for code in codes],
+    })
+
+
+def _run_excel_writer(writer_name, rows, results):
+    """Запускается в отдельном процессе, чтобы пиковая память мерялась независимо"""
+    import io
+    import contextlib
+    import resource
+
+    # Логи модулей при импорте и записи в бенчмарке не нужны
+    with contextlib.redirect_stdout(io.StringIO()):
+        import merge_excel_with_calculations as merge
+
+        df = _synthetic_report(rows)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        writer = getattr(merge, writer_name)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            started_at = time.time()
+            writer(df, os.path.join(temp_dir, 'report.xlsx'))
+            elapsed = time.time() - started_at
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux - в килобайтах
+    results.put((elapsed, rss_after / 1024, (rss_after - rss_before) / 1024))
+
+
+def benchmark_excel_writer(row_counts=(10_000, 100_000, 500_000)):
+    """
+    Сравнивает запись отчета: to_excel + load_workbook + оформление по ячейкам
+    против потоковой write-only записи (время и пиковая память процесса)
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    writers = [
+        ('save_formatted_excel_in_place', 'to_excel + load_workbook'),
+        ('save_formatted_excel_streaming', 'потоковая запись'),
+    ]
+
+    print("🏁 Бенчмарк записи Excel отчета")
+    for rows in row_counts:
+        for writer_name, title in writers:
+            results = context.Queue()
+            process = context.Process(target=_run_excel_writer, args=(writer_name, rows, results))
+            process.start()
+            elapsed, peak_rss, write_rss = results.get()
+            process.join()
+            print(f"📊 {rows} строк, {title}: {elapsed:.1f} сек, пиковая память {peak_rss:.0f} МБ "
+                  f"(+{write_rss:.0f} МБ на запись)")
+
+
+def _write_synthetic_batch_files(directory, file_count, rows):
+    """Файлы групп в формате экспорта TradeWatch (с колонками, которых нет в отчете)"""
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    file_paths = []
+    for index in range(file_count):
+        codes = _synthetic_ean_codes(rows)
+        df = pd.DataFrame({
+            'EAN': codes,
+            'Top oferta': [f"Produkt testowy {i}" for i in range(rows)],
+            'Kategoria': [f"Kategoria {i % 40}" for i in range(rows)],
+            'Sprzedawca': [f"sprzedawca_{i % 300}" for i in range(rows)],
+            'Link': rng.integers(10_000_000_000, 20_000_000_000, rows),
+            'Cena': rng.random(rows) * 200,
+            'Cena min.': rng.random(rows) * 200,
+            'Sprzedawca.1': [f"sprzedawca_{i % 500}" for i in range(rows)],
+            'Link.1': rng.integers(10_000_000_000, 20_000_000_000, rows),
+            'Dost. szt.': rng.integers(0, 500, rows),
+            'Ilość aukcji': rng.integers(0, 50, rows),
+            'Transakcje (30 dni)': rng.integers(0, 1000, rows),
+            'Sprzedane szt. (30 dni)': rng.integers(0, 1000, rows),
+            'Obrót (30 dni)': rng.random(rows) * 10_000,
+            'Opis': ["Opis produktu " * 5] * rows,
+        })
+        file_path = os.path.join(directory, f"TradeWatch_batch_{index + 1}.xlsx")
+        df.to_excel(file_path, sheet_name='Produkty wg EAN', index=False)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def benchmark_batch_reading(file_count=100, rows=300):
+    """
+    Сравнивает чтение файлов групп: последовательный pd.read_excel всех колонок
+    против пула процессов с чтением только колонок отчета
+    """
+    import io
+    import contextlib
+
+    import config
+    from ean_utils import normalize_ean_series
+    from batch_loader import REPORT_SOURCE_COLUMNS, get_batch_read_workers, load_tradewatch_batches
+
+    print(f"🏁 Бенчмарк чтения файлов групп: {file_count} файлов по {rows} строк")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_paths = _write_synthetic_batch_files(temp_dir, file_count, rows)
+
+        started_at = time.time()
+        frames = []
+        for file_path in file_paths:
+            df = pd.read_excel(file_path, sheet_name=config.TRADEWATCH_SHEET_NAME)
+            df['EAN'] = normalize_ean_series(df['EAN'])
+            frames.append(df)
+        sequential = pd.concat(frames, ignore_index=True)
+        sequential_time = time.time() - started_at
+        print(f"📊 Последовательно, все колонки: {sequential_time:.1f} сек ({sequential.shape[1]} колонок)")
+
+        started_at = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parallel = load_tradewatch_batches(file_paths, columns=REPORT_SOURCE_COLUMNS)
+        parallel_time = time.time() - started_at
+        speedup = sequential_time / parallel_time if parallel_time > 0 else 0
+        print(f"📊 {get_batch_read_workers(file_count)} процессов, колонки отчета: {parallel_time:.1f} сек "
+              f"({parallel.shape[1]} колонок) -> x{speedup:.1f}")
+
+        matching_columns = [column for column in parallel.columns if column != 'source_file']
+        same = sequential[matching_columns].equals(parallel[matching_columns])
+        print(f"✅ Данные совпадают: {same}")
+
+
+BENCHMARKS = {
+    'pool': benchmark_browser_pool,
+    'fill': benchmark_ean_field_fill,
+    'ean': benchmark_ean_normalization,
+    'excel': benchmark_excel_writer,
+    'batches': benchmark_batch_reading,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__)
+        sys.exit(1)
+
+    name = sys.argv[1]
+    args = sys.argv[2:]
+    if name == 'pool':
+        if not args:
+            print(__doc__)
+            sys.exit(1)
+        benchmark_browser_pool(args[0], int(args[1]) if len(args) > 1 else 5)
+    elif name == 'fill':
+        if args:
+            benchmark_ean_field_fill(tuple(int(arg) for arg in args))
+        else:
+            benchmark_ean_field_fill()
+    elif name == 'ean':
+        benchmark_ean_normalization(int(args[0]) if args else 1_000_000)
+    elif name == 'excel':
+        if args:
+            benchmark_excel_writer(tuple(int(arg) for arg in args))
+        else:
+            benchmark_excel_writer()
+    elif name == 'batches':
+        benchmark_batch_reading(*(int(arg) for arg in args[:2]))
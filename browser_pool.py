@@ -0,0 +1,327 @@
+"""
+Пул "теплых" сессий Chrome для TradeWatch
+
+Держит N залогиненных драйверов между группами EAN кодов и между
+пользователями. Драйверы выдаются через lease()/release(), проверяются
+перед выдачей и пересоздаются после заданного числа групп или при
+превышении порога памяти.
+"""
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+import config
+from tradewatch_login import create_chrome_driver, login_tradewatch, get_parallel_sessions
+
+
+def get_process_tree_memory_mb(root_pid):
+    """
+    Считает суммарную резидентную память процесса и всех его потомков (Linux)
+
+    Args:
+        root_pid: PID корневого процесса (chromedriver)
+
+    Returns:
+        float: объем памяти в МБ (0 если /proc недоступен)
+    """
+    if not root_pid or not os.path.isdir('/proc'):
+        return 0.0
+
+    # Строим дерево процессов по ppid
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+            ppid = int(stat.rsplit(')', 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    resident_pages = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                resident_pages += int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            pass
+        stack.extend(children.get(pid, []))
+
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class BrowserSession:
+    """Залогиненный драйвер Chrome, выдаваемый пулом"""
+
+    def __init__(self, session_id: int, driver, download_dir: str):
+        self.session_id = session_id
+        self.driver = driver
+        self.download_dir = None
+        self.batches_processed = 0
+        self.created_at = time.time()
+        self.set_download_dir(download_dir)
+
+    def set_download_dir(self, download_dir):
+        """Переключает папку загрузок уже запущенного браузера через CDP"""
+        download_path = str(Path(download_dir).absolute())
+        if download_path == self.download_dir:
+            return
+        Path(download_path).mkdir(parents=True, exist_ok=True)
+        self.driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+            "behavior": "allow",
+            "downloadPath": download_path
+        })
+        self.download_dir = download_path
+
+    def memory_usage_mb(self):
+        """Память, занятая chromedriver и процессами Chrome"""
+        try:
+            return get_process_tree_memory_mb(self.driver.service.process.pid)
+        except Exception:
+            return 0.0
+
+    def is_healthy(self):
+        """
+        Проверяет, что браузер отвечает и сессия TradeWatch не разлогинена
+        """
+        try:
+            current_url = self.driver.current_url
+        except Exception as e:
+            print(f"⚠️ Сессия {self.session_id} не отвечает: {e}")
+            return False
+
+        if "login.jsf" in current_url:
+            print(f"⚠️ Сессия {self.session_id} разлогинена, выполняем повторный вход...")
+            try:
+                return login_tradewatch(self.driver, WebDriverWait(self.driver, 15))
+            except Exception as e:
+                print(f"❌ Повторный вход для сессии {self.session_id} не удался: {e}")
+                return False
+
+        return True
+
+    def needs_recycle(self, max_batches, max_memory_mb):
+        """Нужно ли пересоздать драйвер (по числу групп или памяти)"""
+        if max_batches and self.batches_processed >= max_batches:
+            print(f"♻️ Сессия {self.session_id} обработала {self.batches_processed} групп - пересоздаем")
+            return True
+
+        if max_memory_mb:
+            memory_mb = self.memory_usage_mb()
+            if memory_mb > max_memory_mb:
+                print(f"♻️ Сессия {self.session_id} занимает {memory_mb:.0f} МБ - пересоздаем")
+                return True
+
+        return False
+
+    def quit(self):
+        """Закрывает браузер"""
+        try:
+            self.driver.quit()
+            print(f"🔒 Сессия {self.session_id} закрыта")
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """Пул залогиненных сессий Chrome с семантикой lease/release"""
+
+    def __init__(self, size: int, headless: bool = True,
+                 max_batches_per_driver: int = None, max_memory_mb: float = None):
+        self.size = size
+        self.headless = headless
+        self.max_batches_per_driver = max_batches_per_driver
+        self.max_memory_mb = max_memory_mb
+
+        self._idle = []
+        self._total = 0  # Созданные сессии (свободные + выданные + создаваемые)
+        self._next_id = 1
+        self._closed = False
+        self._condition = threading.Condition()
+
+        # Статистика для логов и бенчмарков
+        self.created_count = 0
+        self.recycled_count = 0
+        self.leases_count = 0
+
+    def _create_session(self, download_dir):
+        """Запускает новый Chrome и выполняет вход в TradeWatch"""
+        with self._condition:
+            session_id = self._next_id
+            self._next_id += 1
+
+        print(f"🆕 Пул: запускаем браузер для сессии {session_id}")
+        driver = None
+        try:
+            driver = create_chrome_driver(download_dir, self.headless)
+            if not login_tradewatch(driver, WebDriverWait(driver, 15)):
+                print(f"❌ Пул: ошибка входа для сессии {session_id}")
+                driver.quit()
+                return None
+
+            session = BrowserSession(session_id, driver, download_dir)
+            self.created_count += 1
+            print(f"✅ Пул: сессия {session_id} готова")
+            return session
+        except Exception as e:
+            print(f"❌ Пул: не удалось создать сессию {session_id}: {e}")
+            if driver:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+            return None
+
+    def lease(self, download_dir, timeout=None):
+        """
+        Выдает залогиненную сессию из пула
+
+        Args:
+            download_dir: папка для скачивания файлов этой группы
+            timeout: максимальное время ожидания свободной сессии (в секундах)
+
+        Returns:
+            BrowserSession: сессия или None, если получить ее не удалось
+        """
+        if timeout is None:
+            timeout = config.BROWSER_POOL_LEASE_TIMEOUT
+        deadline = time.time() + timeout
+
+        while True:
+            session = None
+            with self._condition:
+                while not self._idle and self._total >= self.size and not self._closed:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        print("❌ Пул: превышено время ожидания свободной сессии")
+                        return None
+                    self._condition.wait(remaining)
+
+                if self._closed:
+                    return None
+
+                if self._idle:
+                    session = self._idle.pop()
+                else:
+                    # Резервируем место под новую сессию
+                    self._total += 1
+
+            if session is None:
+                session = self._create_session(download_dir)
+                if session is None:
+                    self._discard_slot()
+                    return None
+            elif not session.is_healthy():
+                self._recycle(session)
+                continue
+
+            try:
+                session.set_download_dir(download_dir)
+            except Exception as e:
+                print(f"⚠️ Пул: не удалось переключить папку загрузок сессии {session.session_id}: {e}")
+                self._recycle(session)
+                continue
+
+            self.leases_count += 1
+            return session
+
+    def release(self, session, failed=False):
+        """
+        Возвращает сессию в пул
+
+        Args:
+            session: сессия, полученная через lease()
+            failed: True если группа не обработалась - драйвер пересоздается
+        """
+        session.batches_processed += 1
+
+        if failed or self._closed or session.needs_recycle(self.max_batches_per_driver, self.max_memory_mb):
+            self._recycle(session)
+            return
+
+        with self._condition:
+            self._idle.append(session)
+            self._condition.notify()
+
+    @contextmanager
+    def leased(self, download_dir, timeout=None):
+        """Контекстный менеджер: выдает сессию и возвращает ее в пул"""
+        session = self.lease(download_dir, timeout)
+        failed = True
+        try:
+            yield session
+            failed = False
+        finally:
+            if session is not None:
+                self.release(session, failed=failed)
+
+    def _recycle(self, session):
+        """Закрывает сессию и освобождает ее место в пуле"""
+        session.quit()
+        self.recycled_count += 1
+        self._discard_slot()
+
+    def _discard_slot(self):
+        with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    def close_all(self):
+        """Закрывает все свободные сессии и запрещает выдачу новых"""
+        with self._condition:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._total -= len(idle)
+            self._condition.notify_all()
+
+        for session in idle:
+            session.quit()
+
+    def stats(self):
+        """Статистика пула"""
+        with self._condition:
+            return {
+                'size': self.size,
+                'alive': self._total,
+                'idle': len(self._idle),
+                'created': self.created_count,
+                'recycled': self.recycled_count,
+                'leases': self.leases_count
+            }
+
+
+# Глобальный пул, общий для всех пользователей бота
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+
+def get_browser_pool(headless=True):
+    """
+    Возвращает глобальный пул сессий (создается при первом обращении)
+    """
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            # Пул рассчитан на все слоты очереди отчетов: отчеты, которые очередь
+            # запустила одновременно, не ждут друг друга за одним драйвером
+            # (сессии создаются по мере надобности, лишние браузеры не запускаются)
+            size = max(get_parallel_sessions(), config.REPORT_BROWSER_SLOTS)
+            print(f"🏊 Создаем пул браузеров на {size} сессий")
+            _browser_pool = BrowserPool(
+                size,
+                headless=headless,
+                max_batches_per_driver=config.BROWSER_POOL_MAX_BATCHES_PER_DRIVER,
+                max_memory_mb=config.BROWSER_POOL_MAX_MEMORY_MB
+            )
+            atexit.register(_browser_pool.close_all)
+        return _browser_pool
@@ -20,6 +20,13 @@ EXCEL_DATA_START_ROW_NUM = 5
 # Высота строки заголовков в пикселях
 EXCEL_HEADER_ROW_HEIGHT = 65
 
+# Потоковая запись отчета (write-only книга за один проход, память не зависит
+# от числа строк). False - прежняя запись через to_excel и load_workbook
+EXCEL_STREAMING_WRITER = True
+
+# Сколько строк DataFrame подготавливается к потоковой записи за раз
+EXCEL_WRITE_CHUNK_ROWS = 10000
+
 # =============================================================================
 # НАСТРОЙКИ ЗАГОЛОВКА
 # =============================================================================
@@ -42,6 +49,16 @@ TITLE_ROWS = {
     3: {"D": "Упаковка", "G": "0"}
 }
 
+# =============================================================================
+# РАСЧЕТ PRICE PL, PROFIT И ROI
+# =============================================================================
+# Значения всегда считаются при обработке (pricing.py) по параметрам из
+# TITLE_ROWS. В файл они записываются:
+# 'formulas' - формулами Excel (пересчитываются при изменении G1-G3 и M1)
+# 'values' - готовыми числами (можно сортировать и выгружать без Excel)
+REPORT_CALCULATION_MODE = 'formulas'
+
+
 # =============================================================================
 # ПОРЯДОК КОЛОНОК
 # =============================================================================
@@ -91,6 +108,13 @@ COST_COLUMNS = ['Cost', 'Cena min.', 'Lowest Priced Offer Inventory']
 # Базовый URL для создания ссылок на предложения Allegro
 ALLEGRO_BASE_URL = "https://allegro.pl/oferta/"
 
+# Базовый URL карточки товара по EAN (колонка Product Link)
+PRODUCT_LINK_BASE_URL = "https://api.qogita.com/variants/link/"
+
+# Текст ячеек с гиперссылками в итоговом Excel
+LINK_DISPLAY_TEXT = "Link"
+PRODUCT_LINK_DISPLAY_TEXT = "View Product"
+
 # Колонки, которые содержат номера для создания ссылок
 # Приоритет отдается колонкам из блока минимальной цены (с суффиксом .1)
 LINK_NUMBER_COLUMNS = ['Link.1', 'Link', 'Sprzedawca.1', 'Sprzedawca']
@@ -199,6 +223,34 @@ CONDITIONAL_FORMAT_COLUMNS = {
     'ROI': CONDITIONAL_FORMAT_ROI
 }
 
+# =============================================================================
+# ОТБОР СТРОК ОТЧЕТА
+# =============================================================================
+# Режимы отбора (пользователь выбирает в боте). Строка остается, если
+# Profit > min_profit и ROI > min_roi; top_n - N строк с наибольшим ROI.
+# Пороги - границы цветовой шкалы условного форматирования; Profit и ROI
+# считаются по параметрам TITLE_ROWS, заданным по умолчанию
+REPORT_TOP_N = 500
+
+REPORT_FILTERS = {
+    'all': {'label': 'Все строки'},
+    'positive': {'label': 'Profit > 0', 'min_profit': 0},
+    'good': {
+        'label': f"Profit > {CONDITIONAL_FORMAT_PROFIT['mid_value']} и ROI > {CONDITIONAL_FORMAT_ROI['mid_value']:.0%}",
+        'min_profit': CONDITIONAL_FORMAT_PROFIT['mid_value'],
+        'min_roi': CONDITIONAL_FORMAT_ROI['mid_value']
+    },
+    'best': {
+        'label': f"Profit > {CONDITIONAL_FORMAT_PROFIT['end_value']} и ROI > {CONDITIONAL_FORMAT_ROI['end_value']:.0%}",
+        'min_profit': CONDITIONAL_FORMAT_PROFIT['end_value'],
+        'min_roi': CONDITIONAL_FORMAT_ROI['end_value']
+    },
+    'top': {'label': f"Топ-{REPORT_TOP_N} по ROI", 'top_n': REPORT_TOP_N},
+}
+
+# Режим отбора по умолчанию
+DEFAULT_REPORT_FILTER = 'all'
+
 # =============================================================================
 # ШИРИНА КОЛОНОК
 # =============================================================================
@@ -227,3 +279,181 @@ WIDE_COLUMNS = {
     'Dost. szt.': 10, # Колонка для доступного количества
     'Ilość aukcji': 12 # Колонка для количества аукционов
 }
+
+# =============================================================================
+# ПУЛ БРАУЗЕРОВ TRADEWATCH
+# =============================================================================
+# Настройки пула "теплых" сессий Chrome, которые переиспользуются между
+# группами EAN кодов и между пользователями вместо запуска нового браузера
+
+# Использовать пул сессий (False - новый браузер и вход для каждой группы)
+BROWSER_POOL_ENABLED = True
+
+# Сколько групп обрабатывает один драйвер перед пересозданием
+BROWSER_POOL_MAX_BATCHES_PER_DRIVER = 30
+
+# Порог памяти процессов Chrome (в МБ), после которого драйвер пересоздается
+BROWSER_POOL_MAX_MEMORY_MB = 1500
+
+# Максимальное время ожидания свободной сессии из пула (в секундах)
+BROWSER_POOL_LEASE_TIMEOUT = 600
+
+# =============================================================================
+# КЕШ СЕССИИ TRADEWATCH
+# =============================================================================
+# Cookies авторизованной сессии сохраняются на диск и переиспользуются
+# новыми браузерами вместо входа через форму логина
+
+# Файл с cookies сессии
+SESSION_COOKIE_CACHE_FILE = "temp_files/tradewatch_session.json"
+
+# Срок жизни сохраненной сессии (в секундах)
+SESSION_COOKIE_TTL_SECONDS = 1800
+
+# =============================================================================
+# ТРАНСПОРТ TRADEWATCH
+# =============================================================================
+# Способ получения отчетов EAN Price Report:
+# "selenium" - через браузер Chrome, "http" - прямые JSF запросы без браузера
+# (можно переопределить переменной окружения TRADEWATCH_TRANSPORT)
+TRADEWATCH_TRANSPORT = "selenium"
+
+# Адрес TradeWatch и страницы входа и отчета - общие для обоих транспортов
+TRADEWATCH_BASE_URL = "https://tradewatch.pl"
+TRADEWATCH_LOGIN_PATH = "/login.jsf"
+TRADEWATCH_REPORT_PATH = "/report/ean-price-report.jsf"
+TRADEWATCH_REPORT_URL = TRADEWATCH_BASE_URL + TRADEWATCH_REPORT_PATH
+
+# Адрес TradeWatch для HTTP транспорта (для проверки можно указать
+# локальный tradewatch_stub_server.py, например "http://127.0.0.1:8765")
+TRADEWATCH_HTTP_BASE_URL = TRADEWATCH_BASE_URL
+
+# Количество параллельных групп для HTTP транспорта (не требует памяти Chrome)
+HTTP_PARALLEL_SESSIONS = 6
+
+# =============================================================================
+# ОЖИДАНИЯ НА СТРАНИЦАХ TRADEWATCH
+# =============================================================================
+# Максимальное время ожидания каждого шага (в секундах). Шаг завершается,
+# как только выполнено условие на странице, таймаут - только верхняя граница
+WAIT_TIMEOUTS = {
+    'default': 20,
+    'login_redirect': 30,      # Уход со страницы логина после отправки формы
+    'ean_field_ready': 30,     # Поле eansPhrase доступно для ввода
+    'ajax_idle': 30,           # Завершение AJAX запросов PrimeFaces
+    'results_ready': 90,       # Результаты после нажатия "Generuj"
+    'export_clickable': 30,    # Ссылка "Eksport do XLS" кликабельна
+    'field_cleared': 2,        # Поле EAN кодов очищено
+}
+
+# =============================================================================
+# АДАПТИВНЫЙ РАЗМЕР ГРУПП EAN
+# =============================================================================
+# Размер группы растет на шаг после успешной группы и уменьшается
+# в BATCH_SIZE_DECREASE_FACTOR раз после ошибки или слишком долгой группы.
+# Начальный размер - get_batch_size() в tradewatch_login.py
+ADAPTIVE_BATCH_SIZE_ENABLED = True
+
+# Границы размера группы (EAN кодов)
+BATCH_SIZE_MIN = 100
+BATCH_SIZE_MAX = 800
+
+# Шаг увеличения после успешной группы
+BATCH_SIZE_INCREASE_STEP = 50
+
+# Множитель уменьшения после ошибки
+BATCH_SIZE_DECREASE_FACTOR = 0.5
+
+# Группа дольше этого времени (в секундах) считается перегрузкой сайта
+BATCH_LATENCY_LIMIT_SECONDS = 180
+
+# =============================================================================
+# ПОВТОРЫ НЕУДАЧНЫХ ГРУПП
+# =============================================================================
+# Неудачная группа повторяется целиком BATCH_MAX_RETRIES раз, затем делится
+# пополам до отдельных кодов, которые не удается получить из TradeWatch
+BATCH_MAX_RETRIES = 1
+
+# Пауза перед повтором (в секундах), удваивается с каждой попыткой
+BATCH_RETRY_BACKOFF_SECONDS = 10
+
+# =============================================================================
+# КЕШ РЕЗУЛЬТАТОВ EAN
+# =============================================================================
+# Строки отчета TradeWatch сохраняются по EAN и используются в следующих
+# задачах вместо повторного запроса, пока не устареют
+EAN_CACHE_ENABLED = True
+
+# Файл базы SQLite
+EAN_CACHE_FILE = "temp_files/ean_cache.sqlite3"
+
+# Срок жизни результата (в секундах)
+EAN_CACHE_TTL_SECONDS = 6 * 3600
+
+# =============================================================================
+# ПОДГОТОВКА EAN КОДОВ
+# =============================================================================
+# Не отправлять в TradeWatch коды с неверной контрольной цифрой GS1
+EAN_VALIDATE_CHECK_DIGIT = True
+
+# =============================================================================
+# ЧТЕНИЕ ФАЙЛОВ ГРУПП TRADEWATCH
+# =============================================================================
+# Файлы групп читаются в пуле процессов, если их не меньше
+# BATCH_READ_PARALLEL_MIN_FILES (запуск процессов занимает пару секунд)
+BATCH_READ_PARALLEL_MIN_FILES = 8
+
+# Количество процессов для чтения (не больше числа ядер; None - по числу ядер)
+BATCH_READ_WORKERS = 4
+
+# Разбирать файлы групп в фоне сразу после скачивания, пока TradeWatch
+# обрабатывает следующие группы (False - читать все файлы после скачивания)
+BATCH_PIPELINE_PARSING = True
+
+# =============================================================================
+# ОЧЕРЕДЬ ОТЧЕТОВ
+# =============================================================================
+# Общее ограничение для всех пользователей: сколько сессий Chrome могут
+# работать одновременно. Отчет занимает столько слотов, сколько
+# параллельных сессий запускает (HTTP транспорт - 1 слот); отчеты, которым
+# не хватает слотов, ждут в очереди. Пул браузеров вмещает не меньше
+# сессий, чтобы у каждого запущенного отчета был свой драйвер
+REPORT_BROWSER_SLOTS = 2
+
+# =============================================================================
+# ХРАНИЛИЩЕ ЗАДАЧ
+# =============================================================================
+# Загруженные файлы и задачи сохраняются в SQLite, чтобы после перезапуска
+# бот продолжил незавершенные отчеты (скачанные группы - в манифесте групп)
+JOB_STORE_FILE = "temp_files/jobs.sqlite3"
+
+# Сколько раз задача продолжается после перезапуска. Если задача сама
+# роняет контейнер (например, нехватка памяти), Railway перезапускает его
+# снова и снова - после этого числа попыток задача считается неудачной
+JOB_MAX_RESUMES = 2
+
+# Сколько времени (в секундах) хранятся записи завершенных задач
+JOB_HISTORY_TTL_SECONDS = 7 * 24 * 3600
+
+# =============================================================================
+# МАНИФЕСТ ГРУПП
+# =============================================================================
+# Обработчик групп записывает манифест в папку загрузок и при повторном
+# запуске на том же файле поставщика (после перезапуска бота или новом
+# нажатии "Создать отчёт") не запрашивает группы, файлы которых уже скачаны
+BATCH_MANIFEST_ENABLED = True
+
+# Сколько времени (в секундах) скачанная группа считается актуальной
+BATCH_MANIFEST_TTL_SECONDS = EAN_CACHE_TTL_SECONDS
+
+# =============================================================================
+# СООБЩЕНИЕ С ПРОГРЕССОМ
+# =============================================================================
+# События прогресса из потоков обработки объединяются, и сообщение
+# редактируется не чаще, чем раз в PROGRESS_MIN_EDIT_INTERVAL секунд
+# (ограничения Telegram на редактирование сообщений)
+PROGRESS_MIN_EDIT_INTERVAL = 3
+
+# Без новых событий сообщение обновляется раз в PROGRESS_REFRESH_INTERVAL
+# секунд - только прошедшее и оставшееся время
+PROGRESS_REFRESH_INTERVAL = 15
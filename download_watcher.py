@@ -0,0 +1,180 @@
+"""
+Отслеживание завершения загрузки файлов Chrome
+
+Вместо опроса glob() каждые 2 секунды и дополнительной паузы для сравнения
+размеров ждет события файловой системы (inotify на Linux, опрос как запасной
+вариант): Chrome пишет файл как .crdownload и переименовывает его в конечное
+имя после завершения. Готовый файл дополнительно проверяется как целый
+ZIP/XLSX контейнер.
+"""
+import os
+import time
+import errno
+import fnmatch
+import select
+import zipfile
+import ctypes
+import ctypes.util
+
+# Имя, под которым TradeWatch отдает экспорт (Chrome может добавить " (1)")
+TRADEWATCH_DOWNLOAD_PATTERN = "TradeWatch - raport konkurencji*.xlsx"
+
+# Расширения незавершенных загрузок
+PARTIAL_DOWNLOAD_SUFFIXES = ('.crdownload', '.part', '.tmp')
+
+# Интервал опроса, если inotify недоступен (в секундах)
+POLL_INTERVAL = 0.5
+
+# Маски событий inotify (см. <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_libc = None
+
+
+def _get_libc():
+    """Загружает libc с функциями inotify (None если недоступно)"""
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+def is_complete_xlsx(file_path):
+    """
+    Проверяет, что файл - целый XLSX (ZIP с [Content_Types].xml и
+    центральным каталогом, который пишется в самом конце файла)
+    """
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            return '[Content_Types].xml' in zf.namelist()
+    except (zipfile.BadZipFile, OSError, ValueError):
+        return False
+
+
+class DownloadWatcher:
+    """
+    Ожидает появления нового готового файла загрузки в папке
+
+    Создавайте наблюдатель ДО клика по кнопке экспорта: файлы, которые уже
+    лежали в папке в момент создания, не считаются новой загрузкой.
+    """
+
+    def __init__(self, download_dir, pattern=TRADEWATCH_DOWNLOAD_PATTERN):
+        self.download_dir = str(download_dir)
+        self.pattern = pattern
+        self._fd = None
+
+        os.makedirs(self.download_dir, exist_ok=True)
+        self._initial_files = self._snapshot()
+        self._start_inotify()
+
+    def _start_inotify(self):
+        libc = _get_libc()
+        if libc is None:
+            return
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, self.download_dir.encode(), mask) < 0:
+            os.close(fd)
+            return
+
+        self._fd = fd
+
+    def _snapshot(self):
+        """Файлы по шаблону и время их изменения"""
+        snapshot = {}
+        try:
+            for name in os.listdir(self.download_dir):
+                if fnmatch.fnmatch(name, self.pattern):
+                    try:
+                        snapshot[name] = os.stat(os.path.join(self.download_dir, name)).st_mtime_ns
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        return snapshot
+
+    def _find_completed_file(self):
+        """Новый или перезаписанный файл по шаблону, прошедший проверку XLSX"""
+        candidates = []
+        for name, mtime in self._snapshot().items():
+            if name.endswith(PARTIAL_DOWNLOAD_SUFFIXES):
+                continue
+            if self._initial_files.get(name) == mtime:
+                continue
+            candidates.append((mtime, name))
+
+        # Самый свежий файл первым
+        for _, name in sorted(candidates, reverse=True):
+            path = os.path.join(self.download_dir, name)
+            if is_complete_xlsx(path):
+                return path
+        return None
+
+    def _wait_for_event(self, timeout):
+        """Ждет событие inotify (или просто паузу при опросе)"""
+        if self._fd is None:
+            time.sleep(min(POLL_INTERVAL, timeout))
+            return
+
+        # Даже с inotify перепроверяем папку не реже раза в секунду
+        ready, _, _ = select.select([self._fd], [], [], min(timeout, 1.0))
+        if ready:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+
+    def wait(self, timeout=60):
+        """
+        Ждет завершения загрузки
+
+        Args:
+            timeout: максимальное время ожидания (в секундах)
+
+        Returns:
+            str: путь к готовому файлу или None, если файл не появился
+        """
+        deadline = time.time() + timeout
+        while True:
+            completed = self._find_completed_file()
+            if completed:
+                return completed
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self._wait_for_event(remaining)
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
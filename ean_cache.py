@@ -0,0 +1,171 @@
+"""
+Кеш результатов TradeWatch по EAN кодам между задачами
+
+Пользователи загружают пересекающиеся каталоги поставщиков много раз
+в день. Строки листа "Produkty wg EAN" сохраняются в SQLite по 13-значному
+EAN со временем получения, и свежие коды не запрашиваются у TradeWatch
+повторно. Коды, по которым TradeWatch ничего не вернул, тоже кешируются
+(пустой список строк), чтобы не запрашивать их снова.
+
+Строки попадают в кеш из DataFrame, который уже разобран для отчета
+(BatchFileAccumulator), а найденные в кеше строки передаются в объединение
+отчета DataFrame - файлы Excel ради кеша повторно не пишутся и не читаются.
+"""
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+import config
+from ean_utils import normalize_ean_series
+
+class EanResultCache:
+    """SQLite кеш строк отчета TradeWatch по EAN"""
+
+    def __init__(self, db_file: str, ttl_seconds: int):
+        self.db_file = Path(db_file)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self.db_file), timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ean_results ("
+                "ean TEXT PRIMARY KEY, rows_json TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._initialized = True
+        return connection
+
+    def lookup(self, ean_codes):
+        """
+        Ищет свежие результаты для EAN кодов
+
+        Args:
+            ean_codes: список 13-значных EAN кодов
+
+        Returns:
+            dict: EAN -> список строк отчета (только для свежих записей)
+        """
+        unique_codes = list(dict.fromkeys(code for code in ean_codes if code))
+        min_fetched_at = time.time() - self.ttl_seconds
+        found = {}
+
+        with self._lock:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            try:
+                # Удаляем устаревшие записи, чтобы база не росла бесконечно
+                connection.execute("DELETE FROM ean_results WHERE fetched_at < ?", (min_fetched_at,))
+                connection.commit()
+
+                # SQLite ограничивает число параметров запроса - ищем частями
+                for i in range(0, len(unique_codes), 500):
+                    chunk = unique_codes[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor = connection.execute(
+                        f"SELECT ean, rows_json FROM ean_results WHERE fetched_at >= ? AND ean IN ({placeholders})",
+                        [min_fetched_at] + chunk
+                    )
+                    for ean, rows_json in cursor:
+                        found[ean] = json.loads(rows_json)
+            finally:
+                connection.close()
+
+        return found
+
+    def store(self, results):
+        """
+        Сохраняет результаты
+
+        Args:
+            results: dict EAN -> список строк отчета (пустой список - TradeWatch ничего не нашел)
+        """
+        if not results:
+            return
+
+        now = time.time()
+        records = [(ean, json.dumps(rows, ensure_ascii=False, default=str), now) for ean, rows in results.items()]
+
+        with self._lock:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            try:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO ean_results (ean, rows_json, fetched_at) VALUES (?, ?, ?)",
+                    records
+                )
+                connection.commit()
+            finally:
+                connection.close()
+
+    def store_batch_file(self, ean_codes, file_path):
+        """
+        Сохраняет в кеш результаты скачанного файла группы (когда файл
+        не разбирается для отчета - иначе используйте store_batch_frame)
+
+        Args:
+            ean_codes: EAN коды, отправленные в TradeWatch в этой группе
+            file_path: файл экспорта TradeWatch
+        """
+        try:
+            df = pd.read_excel(file_path, sheet_name=config.TRADEWATCH_SHEET_NAME)
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить файл {file_path} в кеш EAN: {e}")
+            return
+
+        self.store_batch_frame(ean_codes, df)
+
+    def store_batch_frame(self, ean_codes, df):
+        """
+        Сохраняет в кеш результаты группы из уже разобранного DataFrame
+
+        Args:
+            ean_codes: EAN коды, отправленные в TradeWatch в этой группе
+            df: строки листа TradeWatch этой группы
+        """
+        results = {code: [] for code in normalize_ean_series(ean_codes).dropna()}
+
+        if 'EAN' in df.columns:
+            # source_file - служебная колонка разбора, к строке TradeWatch не относится
+            df = df.drop(columns=['source_file'], errors='ignore')
+            df['EAN'] = normalize_ean_series(df['EAN'])
+            # Python типы вместо numpy и None вместо NaN - для JSON
+            df = df.astype(object).where(pd.notna(df), None)
+            for row in df.to_dict('records'):
+                if row['EAN']:
+                    results.setdefault(row['EAN'], []).append(row)
+
+        self.store(results)
+
+
+def cache_hits_frame(cached_results):
+    """
+    Строки из кеша в виде DataFrame листа TradeWatch
+
+    Returns:
+        pd.DataFrame или None, если строк нет
+    """
+    rows = [row for ean_rows in cached_results.values() for row in ean_rows]
+    if not rows:
+        return None
+    return pd.DataFrame(rows)
+
+
+# Глобальный кеш, общий для всех задач
+_ean_cache = None
+_ean_cache_lock = threading.Lock()
+
+
+def get_ean_cache():
+    """Возвращает глобальный кеш результатов EAN"""
+    global _ean_cache
+    with _ean_cache_lock:
+        if _ean_cache is None:
+            _ean_cache = EanResultCache(config.EAN_CACHE_FILE, config.EAN_CACHE_TTL_SECONDS)
+        return _ean_cache
@@ -0,0 +1,195 @@
+"""
+Нормализация и подготовка EAN кодов
+
+Единственная реализация приведения EAN к 13 цифрам для всех модулей:
+целые числа и строки из цифр (почти вся колонка GTIN из Excel)
+обрабатываются векторно в numpy, остальные значения - по одному. Здесь же проверка контрольной цифры GS1 и подготовка кодов
+из файла поставщика (один раз до нарезки на группы, чтобы количество
+групп и нагрузка на TradeWatch зависели от числа уникальных корректных
+кодов, а не от числа строк файла).
+"""
+import re
+import math
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Веса позиций 1-12 для контрольной цифры GS1 (EAN-13)
+GS1_WEIGHTS = np.array([1, 3] * 6, dtype=np.int64)
+
+# Разряды 13-значного числа - для перевода целых в цифры без Python цикла
+POWERS_OF_TEN = 10 ** np.arange(12, -1, -1, dtype=np.int64)
+
+# Правила нормализации значений, которые не являются целыми числами
+# Только ASCII цифры: \d пропускает цифры Unicode (например, полноширинные)
+_scientific_re = re.compile(r'^[+-]?[0-9]+(?:\.[0-9]+)?[eE][+-]?[0-9]+$')   # "5.901234123457E+12"
+_excel_float_re = re.compile(r'^([0-9]+)\.0*$')                             # "5901234123457.0"
+_non_digit_re = re.compile(r'[^0-9]')
+
+
+def normalize_ean_series(values):
+    """
+    Приводит EAN коды к 13-цифровому формату (векторно)
+
+    Числа из Excel ("5901234123457.0", "5.901234123457E+12") переводятся
+    в целые, нецифровые символы удаляются, длинные коды обрезаются
+    до 13 цифр (без учета ведущих нулей), короткие дополняются ведущими нулями.
+
+    Args:
+        values: Series/список EAN кодов (строки или числа)
+
+    Returns:
+        pd.Series: 13-значные строки, None для пустых значений
+    """
+    series = pd.Series(values, copy=False)
+    result = np.full(len(series), None, dtype=object)
+
+    present = series.notna().to_numpy()
+    if not present.any():
+        return pd.Series(result, index=series.index, dtype=object)
+
+    # Быстрый путь: целые числа до 13 цифр (числовые ячейки Excel и строки
+    # из цифр) - цифры считаются в numpy без цикла
+    numbers = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    with np.errstate(invalid='ignore'):
+        fast = present & (numbers >= 0) & (numbers < 1e13) & (numbers == np.floor(numbers))
+
+    if fast.any():
+        ints = numbers[fast].astype(np.int64)
+        digits = ((ints[:, None] // POWERS_OF_TEN) % 10 + 48).astype(np.uint8)
+        result[fast] = digits.view('S13').ravel().astype(str).tolist()
+
+    # Остальное (символы, научная нотация, длинные коды) - по одному значению
+    rest = present & ~fast
+    if rest.any():
+        result[rest] = [format_ean_to_13_digits(value) for value in series.to_numpy()[rest]]
+
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def normalize_ean_with_mask(values):
+    """
+    Нормализует EAN коды и возвращает маску корректных кодов
+
+    Returns:
+        tuple: (pd.Series 13-значных строк или None, pd.Series bool - код
+                не пустой и контрольная цифра GS1 верна)
+    """
+    normalized = normalize_ean_series(values)
+    valid = pd.Series(False, index=normalized.index)
+    present = normalized.notna()
+    if present.any():
+        valid[present] = gs1_check_digit_valid(normalized[present])
+    return normalized, valid
+
+
+def format_ean_to_13_digits(ean_value):
+    """
+    Приводит один EAN к 13-цифровому формату по тем же правилам, что
+    normalize_ean_series (для колонок используйте normalize_ean_series)
+
+    Пример:
+        format_ean_to_13_digits("123456789") -> "0000123456789"
+        format_ean_to_13_digits(5901234123457.0) -> "5901234123457"
+    """
+    if ean_value is None or (not isinstance(ean_value, str) and pd.isna(ean_value)):
+        return None
+
+    text = str(ean_value).strip()
+    if _scientific_re.match(text):
+        try:
+            number = float(text)
+        except (ValueError, OverflowError):
+            return None
+        if not math.isfinite(number):
+            # "1E+400" - не код, а переполнение
+            return None
+        text = str(int(round(number)))
+    text = _excel_float_re.sub(r'\1', text)
+
+    digits = _non_digit_re.sub('', text)
+    if len(digits) > 13:
+        digits = digits.lstrip('0')[:13] or '0'
+    return digits.zfill(13) if digits else None
+
+
+def gs1_check_digit_valid(ean_codes):
+    """
+    Проверяет контрольную цифру GS1 у 13-значных кодов (векторно)
+
+    Args:
+        ean_codes: Series 13-значных строк из цифр
+
+    Returns:
+        np.ndarray: bool для каждого кода (не 13 ASCII цифр - False)
+    """
+    codes = pd.Series(ean_codes, copy=False)
+    result = np.zeros(len(codes), dtype=bool)
+    if codes.empty:
+        return result
+
+    well_formed = codes.astype(str).str.fullmatch(r'[0-9]{13}').to_numpy(dtype=bool)
+    if not well_formed.any():
+        return result
+
+    digits = np.frombuffer(''.join(codes[well_formed]).encode('ascii'), dtype=np.uint8)
+    digits = digits.reshape(-1, 13).astype(np.int64) - 48
+    expected = (10 - (digits[:, :12] @ GS1_WEIGHTS) % 10) % 10
+    result[well_formed] = expected == digits[:, 12]
+    return result
+
+
+def prepare_ean_codes(values, check_digit=None):
+    """
+    Подготавливает EAN коды к запросу в TradeWatch: нормализация,
+    проверка контрольной цифры, удаление дубликатов
+
+    Args:
+        values: колонка GTIN файла поставщика
+        check_digit: отбрасывать коды с неверной контрольной цифрой
+            (по умолчанию config.EAN_VALIDATE_CHECK_DIGIT)
+
+    Returns:
+        dict: ean_codes (уникальные корректные коды в порядке файла),
+              total_rows, empty_count, invalid_count, invalid_examples, duplicate_count
+    """
+    if check_digit is None:
+        check_digit = config.EAN_VALIDATE_CHECK_DIGIT
+
+    normalized, valid = normalize_ean_with_mask(values)
+    total_rows = len(normalized)
+
+    present = normalized.notna()
+    empty_count = total_rows - int(present.sum())
+
+    invalid_examples = []
+    invalid_count = 0
+    if check_digit:
+        invalid = present & ~valid
+        invalid_count = int(invalid.sum())
+        invalid_examples = normalized[invalid].head(5).tolist()
+        codes = normalized[valid]
+    else:
+        codes = normalized[present]
+
+    unique_codes = codes.drop_duplicates()
+
+    return {
+        'ean_codes': unique_codes.tolist(),
+        'total_rows': total_rows,
+        'empty_count': empty_count,
+        'invalid_count': invalid_count,
+        'invalid_examples': invalid_examples,
+        'duplicate_count': len(codes) - len(unique_codes)
+    }
+
+
+def print_ean_preparation(preparation):
+    """Печатает итог подготовки EAN кодов"""
+    print(f"📋 EAN коды: строк {preparation['total_rows']}, уникальных корректных {len(preparation['ean_codes'])}, "
+          f"пустых {preparation['empty_count']}, дубликатов {preparation['duplicate_count']}, "
+          f"с неверной контрольной цифрой {preparation['invalid_count']}")
+    if preparation['invalid_examples']:
+        print(f"   Примеры неверных кодов: {preparation['invalid_examples']}")
@@ -0,0 +1,119 @@
+"""
+Общая очередь задач создания отчетов
+
+Каждая задача занимает столько "мест" (слотов браузеров), сколько
+параллельных сессий Chrome она запускает, и стартует только когда
+свободных мест хватает - несколько пользователей одновременно не могут
+запустить больше браузеров, чем помещается в память контейнера.
+У пользователя может быть только одна задача (в очереди или в работе),
+поэтому очередь по порядку постановки честная: никто не может занять ее
+несколькими отчетами подряд.
+"""
+import time
+import asyncio
+from collections import OrderedDict
+
+import config
+
+
+class ReportJob:
+    """Задача создания отчета в очереди"""
+
+    def __init__(self, user_id, slots):
+        self.user_id = user_id
+        self.slots = slots
+        self.enqueued_at = time.time()
+        self.started_at = None
+
+
+class ReportJobQueue:
+    """Очередь задач с общим ограничением слотов браузеров (для event loop бота)"""
+
+    def __init__(self, total_slots=None):
+        self.total_slots = total_slots or config.REPORT_BROWSER_SLOTS
+        self.used_slots = 0
+        self._waiting = OrderedDict()   # user_id -> ReportJob, в порядке постановки
+        self._running = {}              # user_id -> ReportJob
+        self._condition = None
+
+    def _get_condition(self):
+        # Создается в event loop бота при первом использовании
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def has_job(self, user_id):
+        """Есть ли у пользователя задача в очереди или в работе"""
+        return user_id in self._waiting or user_id in self._running
+
+    def enqueue(self, user_id, slots=1):
+        """
+        Ставит задачу пользователя в очередь
+
+        Returns:
+            ReportJob или None, если у пользователя уже есть задача
+        """
+        if self.has_job(user_id):
+            return None
+        job = ReportJob(user_id, max(1, min(slots, self.total_slots)))
+        self._waiting[user_id] = job
+        print(f"📥 Задача пользователя {user_id} в очереди: позиция {self.position(job)}, "
+              f"слотов {job.slots}, занято {self.used_slots}/{self.total_slots}")
+        return job
+
+    def position(self, job):
+        """Позиция задачи в очереди (1 - следующая), 0 - задача уже выполняется"""
+        if job.user_id in self._running:
+            return 0
+        return list(self._waiting).index(job.user_id) + 1
+
+    def _can_start(self, job):
+        # Первая задача ждет освобождения мест - следующие ее не обгоняют
+        return next(iter(self._waiting)) == job.user_id and self.used_slots + job.slots <= self.total_slots
+
+    async def wait_for_turn(self, job, on_position=None):
+        """
+        Ждет, пока задача станет первой и для нее освободятся слоты
+
+        Args:
+            job: задача из enqueue()
+            on_position: async функция(позиция), вызывается при изменении позиции
+        """
+        condition = self._get_condition()
+        last_position = None
+        while True:
+            async with condition:
+                if self._can_start(job):
+                    del self._waiting[job.user_id]
+                    self._running[job.user_id] = job
+                    self.used_slots += job.slots
+                    job.started_at = time.time()
+                    # Следующая задача может поместиться в оставшиеся слоты
+                    condition.notify_all()
+                    break
+
+                position = self.position(job)
+                if position == last_position or not on_position:
+                    await condition.wait()
+                    continue
+
+            # Сообщение пользователю отправляется без блокировки очереди
+            last_position = position
+            try:
+                await on_position(position)
+            except Exception as e:
+                print(f"Ошибка при обновлении позиции в очереди: {e}")
+
+        print(f"▶️ Задача пользователя {job.user_id} запущена после {job.started_at - job.enqueued_at:.0f} сек "
+              f"в очереди, занято слотов {self.used_slots}/{self.total_slots}")
+
+    async def release(self, job):
+        """Освобождает слоты задачи (или убирает ее из очереди, если она не началась)"""
+        condition = self._get_condition()
+        async with condition:
+            if self._running.get(job.user_id) is job:
+                del self._running[job.user_id]
+                self.used_slots -= job.slots
+            elif self._waiting.get(job.user_id) is job:
+                del self._waiting[job.user_id]
+            condition.notify_all()
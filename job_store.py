@@ -0,0 +1,156 @@
+"""
+Постоянное хранилище задач бота между перезапусками
+
+Railway перезапускает контейнер при сбое, а загруженные файлы и задачи
+хранились только в словарях telegram_bot.py. Здесь в SQLite (temp_files)
+записываются загруженные файлы поставщиков и задачи создания отчетов.
+После перезапуска бот продолжает незавершенные задачи; уже скачанные
+группы берутся из манифеста групп в папке загрузок (batch_manifest.py).
+"""
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+
+import config
+
+# Статусы задачи
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+class JobStore:
+    """SQLite хранилище загрузок и задач"""
+
+    def __init__(self, db_file: str):
+        self.db_file = Path(db_file)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.db_file), timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "user_id INTEGER PRIMARY KEY, supplier_file TEXT NOT NULL, uploaded_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, "
+                "supplier_file TEXT NOT NULL, report_filter TEXT, status TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, resume_count INTEGER NOT NULL DEFAULT 0)"
+            )
+            job_columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+            if 'resume_count' not in job_columns:
+                # Хранилище, созданное до счетчика продолжений
+                connection.execute("ALTER TABLE jobs ADD COLUMN resume_count INTEGER NOT NULL DEFAULT 0")
+            # Группы раньше хранились здесь по задаче - теперь в манифесте групп
+            connection.execute("DROP TABLE IF EXISTS batches")
+            self._initialized = True
+        return connection
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            connection = self._connect()
+            try:
+                rows = connection.execute(query, params).fetchall()
+                connection.commit()
+                return rows
+            finally:
+                connection.close()
+
+    # --- Загруженные файлы ---
+
+    def save_upload(self, user_id, supplier_file):
+        self._execute(
+            "INSERT OR REPLACE INTO uploads (user_id, supplier_file, uploaded_at) VALUES (?, ?, ?)",
+            (user_id, str(supplier_file), time.time())
+        )
+
+    def remove_upload(self, user_id):
+        self._execute("DELETE FROM uploads WHERE user_id = ?", (user_id,))
+
+    def load_uploads(self):
+        """
+        Returns:
+            dict: user_id -> путь к файлу поставщика
+        """
+        return dict(self._execute("SELECT user_id, supplier_file FROM uploads"))
+
+    # --- Задачи ---
+
+    def create_job(self, user_id, chat_id, supplier_file, report_filter=None):
+        """
+        Returns:
+            str: идентификатор задачи
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (job_id, user_id, chat_id, supplier_file, report_filter, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, user_id, chat_id, str(supplier_file), report_filter, JOB_QUEUED, now, now)
+        )
+        return job_id
+
+    def set_job_status(self, job_id, status):
+        self._execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id))
+
+    def increment_resume_count(self, job_id):
+        """
+        Отмечает очередное продолжение задачи после перезапуска
+
+        Returns:
+            int: сколько раз задача продолжалась, включая это
+        """
+        self._execute(
+            "UPDATE jobs SET resume_count = resume_count + 1, updated_at = ? WHERE job_id = ?",
+            (time.time(), job_id)
+        )
+        rows = self._execute("SELECT resume_count FROM jobs WHERE job_id = ?", (job_id,))
+        return rows[0][0] if rows else 0
+
+    def prune_finished_jobs(self, max_age_seconds=None):
+        """Удаляет записи завершенных задач старше max_age_seconds"""
+        if max_age_seconds is None:
+            max_age_seconds = config.JOB_HISTORY_TTL_SECONDS
+        params = (JOB_DONE, JOB_FAILED, time.time() - max_age_seconds)
+        condition = "status IN (?, ?) AND updated_at < ?"
+        removed_count = self._execute(f"SELECT COUNT(*) FROM jobs WHERE {condition}", params)[0][0]
+        if removed_count:
+            self._execute(f"DELETE FROM jobs WHERE {condition}", params)
+            print(f"🧹 Удалено записей завершенных задач: {removed_count}")
+        return removed_count
+
+    def incomplete_jobs(self):
+        """
+        Задачи, прерванные перезапуском (в очереди или в работе)
+
+        Returns:
+            list: dict с job_id, user_id, chat_id, supplier_file, report_filter, status, resume_count
+        """
+        rows = self._execute(
+            "SELECT job_id, user_id, chat_id, supplier_file, report_filter, status, resume_count FROM jobs "
+            "WHERE status IN (?, ?) ORDER BY created_at",
+            (JOB_QUEUED, JOB_RUNNING)
+        )
+        keys = ('job_id', 'user_id', 'chat_id', 'supplier_file', 'report_filter', 'status', 'resume_count')
+        return [dict(zip(keys, row)) for row in rows]
+
+
+# Глобальное хранилище бота
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Возвращает глобальное хранилище задач"""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore(config.JOB_STORE_FILE)
+        return _job_store
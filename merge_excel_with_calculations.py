@@ -1,14 +1,22 @@
 import pandas as pd
+import numpy as np
 import os
 import glob
 from pathlib import Path
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
 from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, column_index_from_string
 from openpyxl.formatting.rule import ColorScaleRule
 from datetime import datetime
 import config
+from ean_utils import normalize_ean_series
+from pricing import calculate_pricing, select_profitable_rows
+from batch_loader import REPORT_SOURCE_COLUMNS, BatchFileAccumulator, load_tradewatch_batches, prepare_tradewatch_frame
+from supplier_artifact import load_supplier_frame
+from progress_bridge import emit_progress_event, EVENT_STAGE
 
 # Проверяем доступность Selenium и выбираем соответствующий модуль
 try:
@@ -21,49 +29,43 @@ except ImportError:
     from tradewatch_fallback import download_from_tradewatch
     print("❌ Excel processor: Selenium недоступен - fallback режим")
 
-def format_ean_to_13_digits(ean_value):
+def build_allegro_links(values):
     """
-    Приводит EAN к стандартному 13-цифровому формату
+    Строит ссылки Allegro из номеров предложений (векторно)
+
+    Номер берется из числа ("12345.0" -> "12345") или из последнего
+    сегмента уже готовой ссылки.
+
+    Returns:
+        pd.Series: URL или None для пустых значений
     """
-    if pd.isna(ean_value):
-        return None
-    
-    try:
-        # Конвертируем в строку и удаляем пробелы
-        ean_str = str(ean_value).strip()
-        
-        # Если получилось пустое значение, возвращаем None
-        if not ean_str:
-            return None
-        
-        # Особая обработка для научной нотации
-        if 'E' in ean_str.upper() or 'e' in ean_str:
-            try:
-                # Конвертируем через float для обработки научной нотации
-                ean_float = float(ean_str)
-                ean_str = str(int(ean_float))
-            except:
-                pass
-        
-        # Удаляем все нечисловые символы
-        ean_digits = ''.join(char for char in ean_str if char.isdigit())
-        
-        # Если получилось пустое значение, возвращаем None
-        if not ean_digits:
-            return None
-            
-        # Обрезаем до 13 цифр если больше
-        if len(ean_digits) > 13:
-            ean_digits = ean_digits[:13]
-            
-        # Дополняем ведущими нулями до 13 цифр
-        ean_formatted = ean_digits.zfill(13)
-        
-        return ean_formatted
-        
-    except Exception as e:
-        print(f"Ошибка при форматировании EAN {ean_value}: {str(e)}")
-        return None
+    raw = pd.Series(values, copy=False)
+    text = raw.astype(str).str.strip()
+    present = raw.notna() & (text != '')
+
+    # У готовых ссылок номер - последний сегмент пути
+    is_url = text.str.startswith('http')
+    numbers_text = text.where(~is_url, text.str.rsplit('/', n=1).str[-1])
+    numbers_text = numbers_text.str.replace(r'\.0$', '', regex=True)
+
+    # Числа (в том числе "1.2345E+10") - через целое, как int(float(...))
+    numbers = pd.to_numeric(raw.where(~is_url), errors='coerce')
+    integral = numbers.notna() & (numbers.abs() < 1e18)
+    numbers_text[integral] = numbers[integral].astype(np.int64).astype(str)
+
+    return (config.ALLEGRO_BASE_URL + numbers_text).where(present, None)
+
+
+def build_product_links(ean_values):
+    """
+    Строит ссылки Product Link из EAN кодов (векторно)
+
+    Returns:
+        pd.Series: URL или None для пустых EAN
+    """
+    ean_codes = normalize_ean_series(ean_values)
+    return (config.PRODUCT_LINK_BASE_URL + ean_codes + '/').where(ean_codes.notna(), None)
+
 
 def create_hyperlinks(df):
     """
@@ -84,37 +86,9 @@ def create_hyperlinks(df):
     if 'Link' not in df.columns:
         df['Link'] = ''
     
-    # Конвертируем колонку Link в строковый тип
-    df['Link'] = df['Link'].astype(str)
-    
-    # Создаем гиперссылки
-    for index, row in df.iterrows():
-        link_number = row[link_number_column]
-        if pd.notna(link_number) and str(link_number).strip():
-            # Извлекаем номер из ссылки если это уже ссылка
-            if str(link_number).startswith('http'):
-                # Если уже есть ссылка, извлекаем номер
-                try:
-                    number = str(link_number).split('/')[-1]
-                    # Убираем .0 из номера если он есть
-                    if number.endswith('.0'):
-                        number = number[:-2]
-                    df.at[index, 'Link'] = f"{config.ALLEGRO_BASE_URL}{number}"
-                except:
-                    df.at[index, 'Link'] = str(link_number)
-            else:
-                # Создаем новую ссылку
-                # Конвертируем в число и обратно в строку для удаления .0
-                try:
-                    # Пытаемся конвертировать в число
-                    clean_number = str(int(float(link_number)))
-                except (ValueError, TypeError):
-                    # Если не удается конвертировать, просто удаляем .0
-                    clean_number = str(link_number).rstrip('.0')
-                    if clean_number == '':
-                        clean_number = '0'
-                
-                df.at[index, 'Link'] = f"{config.ALLEGRO_BASE_URL}{clean_number}"
+    # Строки без номера сохраняют прежнее значение Link
+    links = build_allegro_links(df[link_number_column])
+    df['Link'] = links.where(links.notna(), df['Link'].astype(str))
     
     print(f"Созданы гиперссылки на основе колонки: {link_number_column}")
     return df
@@ -136,37 +110,83 @@ def create_product_links(df):
     
     print("Найдена колонка Product Link в прайсе поставщика, создаем гиперссылки...")
     
-    # Конвертируем колонку Product Link в строковый тип
-    df['Product Link'] = df['Product Link'].astype(str)
-    
-    # Создаем гиперссылки на основе EAN
-    for index, row in df.iterrows():
-        ean_value = row['EAN']
-        if pd.notna(ean_value) and str(ean_value).strip():
-            # Форматируем EAN в 13-цифровой формат
-            formatted_ean = format_ean_to_13_digits(ean_value)
-            if formatted_ean:
-                # Создаем URL с EAN
-                product_url = f"https://api.qogita.com/variants/link/{formatted_ean}/"
-                df.at[index, 'Product Link'] = product_url
+    # Строки без EAN сохраняют прежнее значение Product Link
+    product_links = build_product_links(df['EAN'])
+    df['Product Link'] = product_links.where(product_links.notna(), df['Product Link'].astype(str))
     
     print("Созданы Product Link гиперссылки на основе EAN кодов")
     return df
 
+def build_hyperlink_cells(df):
+    """
+    Готовит гиперссылки для записи в Excel одним проходом по колонкам
+
+    Ссылкой становятся только значения, начинающиеся с http; Product Link
+    строится из EAN строки.
+
+    Returns:
+        dict: колонка -> (список URL или None по строкам, текст ячейки)
+    """
+    hyperlink_cells = {}
+
+    if 'Link' in df.columns:
+        links = df['Link']
+        is_url = links.notna() & links.astype(str).str.startswith('http')
+        hyperlink_cells['Link'] = (
+            np.where(is_url, links.astype(str), None).tolist(),
+            config.LINK_DISPLAY_TEXT
+        )
+
+    if 'Product Link' in df.columns and 'EAN' in df.columns:
+        product_links = df['Product Link']
+        is_url = product_links.notna() & product_links.astype(str).str.startswith('http')
+        hyperlink_cells['Product Link'] = (
+            np.where(is_url, build_product_links(df['EAN']), None).tolist(),
+            config.PRODUCT_LINK_DISPLAY_TEXT
+        )
+
+    return hyperlink_cells
+
 def calculate_profit_and_roi(df):
     """
-    Добавляет колонки Profit и ROI для расчета в Excel формулами
+    Добавляет колонки Profit и ROI с посчитанными значениями
+    (в Excel они записываются формулами или числами - config.REPORT_CALCULATION_MODE)
     """
-    # Добавляем пустые колонки для Profit и ROI
-    # Формулы будут добавлены при форматировании Excel
-    if 'Profit' not in df.columns:
-        df['Profit'] = None
-    if 'ROI' not in df.columns:
-        df['ROI'] = None
+    pricing = calculate_pricing(df)
+    df['Profit'] = pricing['Profit']
+    df['ROI'] = pricing['ROI']
     
-    print("Добавлены колонки Profit и ROI для расчета формулами Excel")
+    print("Добавлены колонки Profit и ROI")
     return df
 
+def apply_report_filter(df, report_filter=None):
+    """
+    Оставляет строки отчета по режиму отбора из config.REPORT_FILTERS
+    (нужны посчитанные Profit и ROI - после calculate_profit_and_roi)
+
+    Returns:
+        tuple: (DataFrame, количество отброшенных строк)
+    """
+    report_filter = report_filter or config.DEFAULT_REPORT_FILTER
+    settings = config.REPORT_FILTERS.get(report_filter)
+    if settings is None:
+        print(f"⚠️ Неизвестный режим отбора '{report_filter}', оставляем все строки")
+        return df, 0
+
+    if all(settings.get(key) is None for key in ('min_profit', 'min_roi', 'top_n')):
+        return df, 0
+
+    filtered = select_profitable_rows(
+        df,
+        min_profit=settings.get('min_profit'),
+        min_roi=settings.get('min_roi'),
+        top_n=settings.get('top_n')
+    ).reset_index(drop=True)
+    filtered_out = len(df) - len(filtered)
+    print(f"🔎 Отбор строк '{settings['label']}': осталось {len(filtered)} из {len(df)}")
+    return filtered, filtered_out
+
+
 def merge_excel_files_by_ean_with_calculations(directory_path='.'):
     """
     Объединяет файлы Excel по EAN коду с расчетом прибыли и ROI.
@@ -220,14 +240,11 @@ def merge_excel_files_by_ean_with_calculations(directory_path='.'):
             df_clean = df[df['EAN'].notna()].copy()
             
             # Форматируем EAN в 13-цифровой формат
-            df_clean['EAN'] = df_clean['EAN'].apply(format_ean_to_13_digits)
+            df_clean['EAN'] = normalize_ean_series(df_clean['EAN'])
             
             # Убираем строки с невалидными EAN
             df_clean = df_clean[df_clean['EAN'].notna()].copy()
             
-            # Форматируем EAN в 13-цифровом формате
-            df_clean['EAN'] = df_clean['EAN'].apply(format_ean_to_13_digits)
-            
             all_ean_data.append(df_clean)
             print(f"  Найдено EAN кодов: {len(df_clean)}")
             
@@ -304,14 +321,11 @@ def merge_excel_files_by_ean_with_calculations(directory_path='.'):
             other_df_clean = other_df[other_df[gtin_column].notna()].copy()
             
             # Форматируем GTIN в 13-цифровой формат
-            other_df_clean[gtin_column] = other_df_clean[gtin_column].apply(format_ean_to_13_digits)
+            other_df_clean[gtin_column] = normalize_ean_series(other_df_clean[gtin_column])
             
             # Убираем строки с невалидными GTIN
             other_df_clean = other_df_clean[other_df_clean[gtin_column].notna()].copy()
             
-            # Форматируем GTIN в 13-цифровом формате
-            other_df_clean[gtin_column] = other_df_clean[gtin_column].apply(format_ean_to_13_digits)
-            
             # Объединяем по EAN/GTIN
             merged = pd.merge(
                 combined_tradewatch,
@@ -395,10 +409,322 @@ def merge_excel_files_by_ean_with_calculations(directory_path='.'):
         save_formatted_excel(combined_tradewatch, output_file)
         print(f"Данные TradeWatch сохранены в файл: {output_file}")
 
+# Ссылка на помощь в ячейке A3 отчета
+HELP_LINK_URL = "https://t.me/iilluummiinnaattoorr"
+
+# Именованные стили отчета (ячейки данных - report_data_<выравнивание>_<формат>)
+REPORT_HEADER_STYLE = 'report_header'
+REPORT_LINK_STYLE = 'report_link'
+REPORT_TITLE_STYLE = 'report_title'
+REPORT_TITLE_LABEL_STYLE = 'report_title_label'
+REPORT_TITLE_VALUE_STYLE = 'report_title_value'
+REPORT_HELP_STYLE = 'report_help'
+
+
+def get_column_style_name(column):
+    """Имя стиля ячеек данных колонки: выравнивание и числовой формат из config"""
+    alignment = 'right' if column in config.RIGHT_ALIGNED_COLUMNS else 'left'
+    if column in config.PRICE_FORMAT_COLUMNS:
+        number_format = 'price'
+    elif column in config.ROI_FORMAT_COLUMNS:
+        number_format = 'roi'
+    elif column in config.EAN_FORMAT_COLUMNS:
+        number_format = 'ean'
+    else:
+        number_format = 'general'
+    return f"report_data_{alignment}_{number_format}"
+
+
+def build_report_styles():
+    """
+    Именованные стили отчета из настроек config
+
+    Returns:
+        dict: имя -> NamedStyle
+    """
+    title_font_args = {
+        'name': config.TITLE_FONT_SETTINGS['name'],
+        'size': config.TITLE_FONT_SETTINGS['size'],
+        'bold': config.TITLE_FONT_SETTINGS['bold']
+    }
+
+    def named_style(name, **kwargs):
+        # Без явной границы NamedStyle пишет пустой <border/> вместо границы по умолчанию
+        kwargs.setdefault('border', DEFAULT_BORDER)
+        return NamedStyle(name=name, **kwargs)
+
+    header_border_side = Side(
+        border_style=config.HEADER_BORDER_STYLE['border_style'],
+        color=config.HEADER_BORDER_STYLE['color']
+    )
+
+    styles = {
+        REPORT_HEADER_STYLE: named_style(
+            REPORT_HEADER_STYLE,
+            font=Font(
+                name=config.HEADER_FONT['name'],
+                size=config.HEADER_FONT['size'],
+                bold=config.HEADER_FONT['bold'],
+                color=config.HEADER_FONT['color']
+            ),
+            alignment=Alignment(
+                horizontal=config.HEADER_ALIGNMENT['horizontal'],
+                vertical=config.HEADER_ALIGNMENT['vertical'],
+                wrap_text=config.HEADER_ALIGNMENT['wrap_text']
+            ),
+            fill=PatternFill(
+                start_color=config.HEADER_FILL['start_color'],
+                end_color=config.HEADER_FILL['end_color'],
+                fill_type=config.HEADER_FILL['fill_type']
+            ),
+            border=Border(left=header_border_side, right=header_border_side,
+                          top=header_border_side, bottom=header_border_side)
+        ),
+        REPORT_LINK_STYLE: named_style(
+            REPORT_LINK_STYLE,
+            font=Font(name='Arial', size=10, color='0000FF', underline='single'),
+            alignment=Alignment(horizontal='center', vertical='center')
+        ),
+        REPORT_TITLE_STYLE: named_style(REPORT_TITLE_STYLE, font=Font(**title_font_args)),
+        REPORT_TITLE_LABEL_STYLE: named_style(
+            REPORT_TITLE_LABEL_STYLE,
+            font=Font(**title_font_args, color=config.TITLE_LABEL_FONT_COLOR)
+        ),
+        REPORT_TITLE_VALUE_STYLE: named_style(
+            REPORT_TITLE_VALUE_STYLE,
+            font=Font(**title_font_args, color=config.TITLE_VALUE_FONT_COLOR)
+        ),
+        REPORT_HELP_STYLE: named_style(
+            REPORT_HELP_STYLE,
+            font=Font(**title_font_args, color='0000FF', underline='single')
+        ),
+    }
+
+    data_font = Font(name=config.DATA_FONT['name'], size=config.DATA_FONT['size'])
+    alignments = {
+        'left': Alignment(horizontal=config.DATA_ALIGNMENT['horizontal'],
+                          vertical=config.DATA_ALIGNMENT['vertical']),
+        'right': Alignment(horizontal=config.DATA_ALIGNMENT_RIGHT['horizontal'],
+                           vertical=config.DATA_ALIGNMENT_RIGHT['vertical'])
+    }
+    number_formats = {
+        'general': 'General',
+        'price': config.PRICE_NUMBER_FORMAT,
+        'roi': config.ROI_NUMBER_FORMAT,
+        'ean': config.EAN_NUMBER_FORMAT
+    }
+    for alignment_name, alignment in alignments.items():
+        for format_name, number_format in number_formats.items():
+            name = f"report_data_{alignment_name}_{format_name}"
+            styles[name] = named_style(name, font=data_font, alignment=alignment, number_format=number_format)
+
+    return styles
+
+
+def register_report_styles(wb, columns):
+    """
+    Регистрирует в книге именованные стили, нужные отчету с этими колонками
+
+    Стиль регистрируется один раз, а ячейки ссылаются на него по имени -
+    без отдельных Font/Alignment/number_format на каждую ячейку.
+    """
+    styles = build_report_styles()
+    names = [REPORT_HEADER_STYLE, REPORT_LINK_STYLE, REPORT_TITLE_STYLE,
+             REPORT_TITLE_LABEL_STYLE, REPORT_TITLE_VALUE_STYLE, REPORT_HELP_STYLE]
+    for column in columns:
+        name = get_column_style_name(column)
+        if name not in names:
+            names.append(name)
+    for name in names:
+        wb.add_named_style(styles[name])
+
+
 def save_formatted_excel(df, output_file):
     """
     Сохраняет DataFrame в Excel с форматированием согласно конфигурации
     """
+    if not config.EXCEL_STREAMING_WRITER:
+        save_formatted_excel_in_place(df, output_file)
+        return
+
+    try:
+        save_formatted_excel_streaming(df, output_file)
+        print(f"Файл сохранен с форматированием: {output_file}")
+    except Exception as e:
+        print(f"Ошибка при форматировании файла {output_file}: {str(e)}")
+        # Если форматирование не удалось, сохраняем без форматирования
+        df.to_excel(output_file, index=False)
+        print(f"Файл сохранен без форматирования: {output_file}")
+
+
+def build_formula_plan(columns):
+    """
+    План формул Price PL, Profit и ROI для строк отчета
+
+    Буквы колонок определяются один раз на отчет. Формула хранится как
+    части между номерами строки, поэтому для строки остается только
+    склеить их: row_text.join(parts).
+
+    Returns:
+        dict: колонка -> tuple частей формулы
+    """
+    columns = list(columns)
+
+    def letter(column):
+        return get_column_letter(columns.index(column) + 1)
+
+    templates = {}
+    if 'Price PL' in columns and 'Price' in columns:
+        # Price * G1 (курс обмена)
+        templates['Price PL'] = f"={letter('Price')}{{row}}*$G$1"
+    if 'Profit' in columns and 'Price PL' in columns and 'Cena min.' in columns:
+        # Profit = (Cena min. / 1.23) - ((Cena min. * M1%) / 1.23) - Price PL - Доставка(G2) - Стоимость Prep Center(G3)
+        cena_min = letter('Cena min.')
+        templates['Profit'] = (f"=({cena_min}{{row}}/1.23)-(({cena_min}{{row}}*$M$1/100)/1.23)"
+                               f"-{letter('Price PL')}{{row}}-$G$2-$G$3")
+    if 'ROI' in columns and 'Profit' in columns and 'Cena min.' in columns:
+        # ROI = Profit / Cena min. (формат 0% умножит на 100)
+        cena_min = letter('Cena min.')
+        templates['ROI'] = f"=IF({cena_min}{{row}}<>0,{letter('Profit')}{{row}}/{cena_min}{{row}},0)"
+
+    return {column: tuple(template.split('{row}')) for column, template in templates.items()}
+
+
+def get_report_formula_plan(columns):
+    """
+    План формул для записи отчета: пустой в режиме 'values' - тогда
+    Price PL, Profit и ROI записываются посчитанными числами из DataFrame
+    """
+    if config.REPORT_CALCULATION_MODE == 'values':
+        return {}
+    return build_formula_plan(columns)
+
+
+def save_formatted_excel_streaming(df, output_file):
+    """
+    Записывает отчет с тем же оформлением, что save_formatted_excel_in_place,
+    за один проход через write-only книгу openpyxl
+
+    Строки пишутся сразу в файл, поэтому память на оформление не растет
+    с числом строк. Исключение - гиперссылки: в xlsx они хранятся после
+    всех строк листа, и openpyxl держит их в памяти до конца записи.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    register_report_styles(wb, df.columns)
+
+    columns = list(df.columns)
+    header_row = config.EXCEL_HEADER_ROW_NUM
+    start_row = config.EXCEL_DATA_START_ROW_NUM
+    last_data_row = len(df) + start_row - 1
+    last_column_letter = get_column_letter(len(columns))
+
+    # Ширина колонок, закрепление и фильтр задаются до записи строк
+    for col_num, column in enumerate(columns, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = config.WIDE_COLUMNS.get(column, config.DEFAULT_COLUMN_WIDTH)
+    ws.row_dimensions[header_row].height = config.EXCEL_HEADER_ROW_HEIGHT
+    ws.freeze_panes = f"A{start_row}"
+    ws.auto_filter.ref = f"A{header_row}:{last_column_letter}{last_data_row}"
+
+    # Строки над таблицей: параметры из config.TITLE_ROWS, дата и ссылка Help
+    title_cells = {}
+    for row_num, row_data in config.TITLE_ROWS.items():
+        for col_letter, value in row_data.items():
+            if value is None:
+                continue
+            cell = WriteOnlyCell(ws, value=value)
+            if col_letter in ['D', 'I']:  # Колонки с названиями
+                cell.style = REPORT_TITLE_LABEL_STYLE
+            elif col_letter in ['G', 'M']:  # Колонки со значениями
+                cell.style = REPORT_TITLE_VALUE_STYLE
+            title_cells[(row_num, col_letter)] = cell
+
+    date_label_cell = WriteOnlyCell(ws, value="Date:")
+    date_label_cell.style = REPORT_TITLE_STYLE
+    title_cells[(1, 'A')] = date_label_cell
+
+    date_cell = WriteOnlyCell(ws, value=datetime.now().strftime('%d.%m.%Y'))
+    date_cell.style = REPORT_TITLE_STYLE
+    title_cells[(1, 'B')] = date_cell
+
+    help_cell = WriteOnlyCell(ws, value="Help")
+    help_cell.hyperlink = HELP_LINK_URL
+    help_cell.style = REPORT_HELP_STYLE
+    title_cells[(3, 'A')] = help_cell
+
+    for row_num in range(1, header_row):
+        row_cells = {column_index_from_string(col_letter): cell
+                     for (cell_row, col_letter), cell in title_cells.items() if cell_row == row_num}
+        width = max(row_cells, default=0)
+        ws.append([row_cells.get(col_num) for col_num in range(1, width + 1)])
+
+    # Строка заголовков таблицы
+    header_cells = []
+    for column in columns:
+        cell = WriteOnlyCell(ws, value=column)
+        cell.style = REPORT_HEADER_STYLE
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    # Стиль, формула и гиперссылки каждой колонки определяются один раз
+    formula_plan = get_report_formula_plan(columns)
+    hyperlink_cells = build_hyperlink_cells(df)
+    column_styles = [
+        (get_column_style_name(column), formula_plan.get(column), hyperlink_cells.get(column))
+        for column in columns
+    ]
+
+    # Данные пишутся частями: в памяти только текущая часть строк
+    chunk_rows = config.EXCEL_WRITE_CHUNK_ROWS
+    for chunk_start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[chunk_start:chunk_start + chunk_rows]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+
+        for offset, values in enumerate(chunk.itertuples(index=False, name=None)):
+            row_index = chunk_start + offset
+            row_text = str(start_row + row_index)
+            row_cells = []
+            for value, (style_name, formula_parts, hyperlinks) in zip(values, column_styles):
+                if formula_parts:
+                    value = row_text.join(formula_parts)
+                url = hyperlinks[0][row_index] if hyperlinks else None
+                if url:
+                    cell = WriteOnlyCell(ws, value=hyperlinks[1])
+                    cell.hyperlink = url
+                    cell.style = REPORT_LINK_STYLE
+                else:
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.style = style_name
+                row_cells.append(cell)
+            ws.append(row_cells)
+
+    # Условное форматирование (цветовая шкала) для Profit и ROI
+    for column_name, format_config in config.CONDITIONAL_FORMAT_COLUMNS.items():
+        if column_name in columns:
+            col_letter = get_column_letter(columns.index(column_name) + 1)
+            range_string = f"{col_letter}{start_row}:{col_letter}{last_data_row}"
+            rule = ColorScaleRule(
+                start_type='num',
+                start_value=format_config['start_value'],
+                start_color=format_config['start_color'],
+                mid_type='num',
+                mid_value=format_config['mid_value'],
+                mid_color=format_config['mid_color'],
+                end_type='num',
+                end_value=format_config['end_value'],
+                end_color=format_config['end_color']
+            )
+            ws.conditional_formatting.add(range_string, rule)
+            print(f"Применено условное форматирование для колонки '{column_name}' в диапазоне {range_string}")
+
+    wb.save(output_file)
+
+
+def save_formatted_excel_in_place(df, output_file):
+    """
+    Сохраняет DataFrame через to_excel и оформляет его, загрузив книгу
+    целиком (прежний способ, config.EXCEL_STREAMING_WRITER = False)
+    """
     try:
         # Сохраняем DataFrame в файл
         df.to_excel(output_file, index=False, startrow=config.EXCEL_TO_EXCEL_STARTROW)
@@ -494,6 +820,12 @@ def save_formatted_excel(df, output_file):
             else:
                 ws.column_dimensions[column_letter].width = config.DEFAULT_COLUMN_WIDTH
         
+        # Формулы и гиперссылки Link/Product Link считаются заранее для всех строк
+        formula_plan = get_report_formula_plan(df.columns)
+        hyperlink_cells = build_hyperlink_cells(df)
+        hyperlink_font = Font(name='Arial', size=10, color='0000FF', underline='single')
+        hyperlink_alignment = Alignment(horizontal='center', vertical='center')
+        
         # Применяем форматирование к данным (без границ)
         for row_num in range(config.EXCEL_DATA_START_ROW_NUM, len(df) + config.EXCEL_DATA_START_ROW_NUM):
             for col_num in range(1, len(df.columns) + 1):
@@ -517,101 +849,19 @@ def save_formatted_excel(df, output_file):
                 elif column_name in config.EAN_FORMAT_COLUMNS:
                     cell.number_format = config.EAN_NUMBER_FORMAT
                 
-                # Добавляем формулу для колонки Price PL
-                if column_name == 'Price PL':
-                    # Находим колонку Price
-                    price_col_num = None
-                    for i, col in enumerate(df.columns):
-                        if col == 'Price':
-                            price_col_num = i + 1
-                            break
-                    
-                    if price_col_num:
-                        # Получаем буквы колонок
-                        from openpyxl.utils import get_column_letter
-                        price_col_letter = get_column_letter(price_col_num)
-                        
-                        # Создаем формулу: Price * G1 (курс обмена)
-                        formula = f"={price_col_letter}{row_num}*$G$1"
-                        cell.value = formula
-                        
-                        # Применяем формат числа (будет применен позже через config.PRICE_NUMBER_FORMAT)
+                # Формулы Price PL, Profit и ROI из плана формул
+                if column_name in formula_plan:
+                    cell.value = str(row_num).join(formula_plan[column_name])
                 
-                # Добавляем формулу для колонки Profit
-                elif column_name == 'Profit':
-                    # Находим нужные колонки
-                    price_pl_col_num = None
-                    cena_min_col_num = None
-                    
-                    for i, col in enumerate(df.columns):
-                        if col == 'Price PL':
-                            price_pl_col_num = i + 1
-                        elif col == 'Cena min.':
-                            cena_min_col_num = i + 1
-                    
-                    if price_pl_col_num and cena_min_col_num:
-                        # Получаем буквы колонок
-                        from openpyxl.utils import get_column_letter
-                        price_pl_col_letter = get_column_letter(price_pl_col_num)
-                        cena_min_col_letter = get_column_letter(cena_min_col_num)
-                        
-                        # Создаем формулу для расчета прибыли:
-                        # Profit = (Cena min. / 1.23) - ((Cena min. * M1%) / 1.23) - Price PL - Доставка(G2) - Стоимость Prep Center(G3)
-                        formula = f"=({cena_min_col_letter}{row_num}/1.23)-(({cena_min_col_letter}{row_num}*$M$1/100)/1.23)-{price_pl_col_letter}{row_num}-$G$2-$G$3"
-                        cell.value = formula
-                        
-                        # Применяем формат числа (будет применен позже через config.PRICE_NUMBER_FORMAT)
-                
-                # Добавляем формулу для колонки ROI
-                elif column_name == 'ROI':
-                    # Находим нужные колонки
-                    profit_col_num = None
-                    cena_min_col_num = None
-                    
-                    for i, col in enumerate(df.columns):
-                        if col == 'Profit':
-                            profit_col_num = i + 1
-                        elif col == 'Cena min.':
-                            cena_min_col_num = i + 1
-                    
-                    if profit_col_num and cena_min_col_num:
-                        # Получаем буквы колонок
-                        from openpyxl.utils import get_column_letter
-                        profit_col_letter = get_column_letter(profit_col_num)
-                        cena_min_col_letter = get_column_letter(cena_min_col_num)
-                        
-                        # Создаем формулу для расчета ROI: (Profit / Cena min.)
-                        # Формат 0% в config.ROI_NUMBER_FORMAT автоматически умножит на 100
-                        formula = f"=IF({cena_min_col_letter}{row_num}<>0,{profit_col_letter}{row_num}/{cena_min_col_letter}{row_num},0)"
-                        cell.value = formula
-                        
-                        # Применяем формат числа (будет применен позже через config.ROI_NUMBER_FORMAT)
-                
-                # Особое форматирование для гиперссылок
-                elif column_name == 'Link' and pd.notna(df.iloc[row_num - config.EXCEL_DATA_START_ROW_NUM, col_num - 1]):
-                    link_value = df.iloc[row_num - config.EXCEL_DATA_START_ROW_NUM, col_num - 1]
-                    if str(link_value).startswith('http'):
-                        # Создаем гиперссылку с текстом "Link"
-                        cell.hyperlink = str(link_value)
-                        cell.value = "Link"  # Отображаем текст "Link" вместо полной ссылки
-                        cell.font = Font(name='Arial', size=10, color='0000FF', underline='single')
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
-                
-                # Особое форматирование для Product Link гиперссылок
-                elif column_name == 'Product Link' and pd.notna(df.iloc[row_num - config.EXCEL_DATA_START_ROW_NUM, col_num - 1]):
-                    product_link_value = df.iloc[row_num - config.EXCEL_DATA_START_ROW_NUM, col_num - 1]
-                    if str(product_link_value).startswith('http'):
-                        # Создаем обычную гиперссылку через openpyxl (более надежно чем формула)
-                        ean_value = df.iloc[row_num - config.EXCEL_DATA_START_ROW_NUM, df.columns.get_loc('EAN')] if 'EAN' in df.columns else ''
-                        formatted_ean = format_ean_to_13_digits(ean_value) if ean_value else ''
-                        
-                        if formatted_ean:
-                            # Создаем URL и присваиваем как гиперссылку
-                            product_url = f"https://api.qogita.com/variants/link/{formatted_ean}/"
-                            cell.hyperlink = product_url
-                            cell.value = "View Product"  # Отображаемый текст
-                            cell.font = Font(name='Arial', size=10, color='0000FF', underline='single')
-                            cell.alignment = Alignment(horizontal='center', vertical='center')
+                # Гиперссылки Link и Product Link с коротким текстом вместо URL
+                elif column_name in hyperlink_cells:
+                    urls, display_text = hyperlink_cells[column_name]
+                    url = urls[row_num - config.EXCEL_DATA_START_ROW_NUM]
+                    if url:
+                        cell.hyperlink = url
+                        cell.value = display_text
+                        cell.font = hyperlink_font
+                        cell.alignment = hyperlink_alignment
         
         # Добавляем "Date:" в ячейку A1
         date_label_cell = ws['A1']
@@ -634,7 +884,7 @@ def save_formatted_excel(df, output_file):
         # Добавляем гиперссылку Help в ячейку A3
         help_cell = ws['A3']
         help_cell.value = "Help"
-        help_cell.hyperlink = "https://t.me/iilluummiinnaattoorr"
+        help_cell.hyperlink = HELP_LINK_URL
         help_cell.font = Font(
             name=config.TITLE_FONT_SETTINGS['name'],
             size=config.TITLE_FONT_SETTINGS['size'],
@@ -696,11 +946,9 @@ def save_formatted_excel(df, output_file):
 
 def add_price_pl_column(df):
     """
-    Добавляет колонку 'Price PL' для расчета цены по курсу валют
+    Добавляет колонку 'Price PL' с ценой по курсу валют
     """
-    # Добавляем колонку Price PL с пустыми значениями
-    # Формула будет добавлена позже при форматировании Excel
-    df['Price PL'] = None
+    df['Price PL'] = calculate_pricing(df)['Price PL']
     
     print("Добавлена колонка 'Price PL' для расчета цены по курсу валют")
     return df
@@ -716,7 +964,8 @@ def add_roi_column(df):
     print("Добавлена колонка 'ROI' для расчета возврата инвестиций")
     return df
 
-def merge_excel_files_from_list(file_paths, original_filename=None):
+def merge_excel_files_from_list(file_paths, original_filename=None, report_filter=None, tradewatch_data=None,
+                                output_dir=None):
     """
     Объединяет файлы Excel по EAN коду из списка файлов.
     Предназначено для работы с загруженными в бот файлами
@@ -724,6 +973,11 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
     Args:
         file_paths: список путей к файлам для обработки
         original_filename: оригинальное имя файла поставщика (для создания итогового файла)
+        report_filter: режим отбора строк из config.REPORT_FILTERS (опционально)
+        tradewatch_data: уже прочитанные файлы TradeWatch (например, BatchFileAccumulator
+            разобрал их во время скачивания) - тогда они не читаются повторно
+        output_dir: папка для итогового файла (по умолчанию - папка первого
+            файла TradeWatch)
     
     Returns:
         dict: статистика обработки
@@ -740,7 +994,7 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
         elif filename.endswith('.xlsx') and not any(filename.startswith(prefix) for prefix in config.EXCLUDED_FILE_PREFIXES):
             other_files.append(file_path)
     
-    if not tradewatch_files:
+    if not tradewatch_files and tradewatch_data is None:
         print("Не найдены файлы TradeWatch среди загруженных файлов")
         return None
     
@@ -748,29 +1002,23 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
     for file in tradewatch_files:
         print(f"  - {os.path.basename(file)}")
     
-    # Собираем все EAN коды из файлов TradeWatch
-    all_ean_data = []
+    # Итоговый файл - в той же папке, что и первый TradeWatch файл
+    if output_dir is None:
+        output_dir = os.path.dirname(tradewatch_files[0])
     
-    for file_path in tradewatch_files:
-        try:
-            print(f"\nОбрабатываем файл: {os.path.basename(file_path)}")
-            df = pd.read_excel(file_path, sheet_name=config.TRADEWATCH_SHEET_NAME)
-            df['source_file'] = os.path.basename(file_path)
-            
-            # Форматируем EAN в 13-цифровом формате
-            df['EAN'] = df['EAN'].apply(format_ean_to_13_digits)
-            
-            all_ean_data.append(df)
-            print(f"  Найдено EAN кодов: {len(df)}")
-        except Exception as e:
-            print(f"Ошибка при чтении файла {file_path}: {str(e)}")
+    # Читаем все файлы TradeWatch (параллельно, если их много). При объединении
+    # с файлом поставщика в отчет попадают только колонки DESIRED_COLUMN_ORDER,
+    # поэтому остальные колонки не читаются
+    columns = REPORT_SOURCE_COLUMNS if other_files else None
+    if tradewatch_data is not None:
+        combined_tradewatch = tradewatch_data
+    else:
+        combined_tradewatch = load_tradewatch_batches(tradewatch_files, columns=columns)
     
-    if not all_ean_data:
+    if combined_tradewatch is None:
         print("Не удалось загрузить данные из файлов TradeWatch")
         return None
     
-    # Объединяем все данные TradeWatch
-    combined_tradewatch = pd.concat(all_ean_data, ignore_index=True)
     print(f"\nВсего уникальных EAN кодов из TradeWatch: {combined_tradewatch['EAN'].nunique()}")
     
     if not other_files:
@@ -781,14 +1029,15 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
         # Добавляем колонку Price PL
         combined_tradewatch = add_price_pl_column(combined_tradewatch)
         
+        # Отбираем строки по Profit/ROI до создания ссылок и записи файла
+        combined_tradewatch, filtered_out_rows = apply_report_filter(combined_tradewatch, report_filter)
+        
         # Создаем гиперссылки
         combined_tradewatch = create_hyperlinks(combined_tradewatch)
         
         # Создаем Product Link гиперссылки
         combined_tradewatch = create_product_links(combined_tradewatch)
         
-        # Определяем выходной файл в той же папке, что и первый TradeWatch файл
-        output_dir = os.path.dirname(tradewatch_files[0])
         output_file = os.path.join(output_dir, config.OUTPUT_FILE_MERGED_TRADEWATCH)
         save_formatted_excel(combined_tradewatch, output_file)
         
@@ -796,7 +1045,8 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
             'total_rows': len(combined_tradewatch),
             'unique_ean': combined_tradewatch['EAN'].nunique() if 'EAN' in combined_tradewatch.columns else 0,
             'files_processed': 0,  # только TradeWatch файлы
-            'output_file': output_file
+            'output_file': output_file,
+            'filtered_out_rows': filtered_out_rows
         }
         
         print(f"Сохранены данные TradeWatch в файл: {output_file}")
@@ -813,8 +1063,8 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
         try:
             print(f"\nОбъединяем с файлом: {os.path.basename(other_file)}")
             
-            # Читаем файл
-            other_df = pd.read_excel(other_file)
+            # Читаем файл (из артефакта, разобранного при загрузке)
+            other_df = load_supplier_frame(other_file)
             
             # Ищем колонку с GTIN
             gtin_column = None
@@ -829,7 +1079,7 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
             
             # Форматируем GTIN в 13-цифровой формат
             other_df_clean = other_df[other_df[gtin_column].notna()].copy()
-            other_df_clean[gtin_column] = other_df_clean[gtin_column].apply(format_ean_to_13_digits)
+            other_df_clean[gtin_column] = normalize_ean_series(other_df_clean[gtin_column])
             other_df_clean = other_df_clean[other_df_clean[gtin_column].notna()].copy()
             
             # Объединяем по EAN
@@ -856,6 +1106,9 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
         # Добавляем колонку Price PL
         final_result = add_price_pl_column(final_result)
         
+        # Отбираем строки по Profit/ROI до создания ссылок и записи файла
+        final_result, filtered_out_rows = apply_report_filter(final_result, report_filter)
+        
         # Создаем гиперссылки
         final_result = create_hyperlinks(final_result)
         
@@ -867,8 +1120,6 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
         final_column_order = available_ordered_columns
         final_result = final_result[final_column_order]
         
-        # Определяем выходной файл в той же папке, что и первый TradeWatch файл
-        output_dir = os.path.dirname(tradewatch_files[0])
         
         # Создаем имя файла на основе оригинального имени с timestamp
         if original_filename:
@@ -888,7 +1139,8 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
             'total_rows': len(final_result),
             'unique_ean': final_result['EAN'].nunique() if 'EAN' in final_result.columns else 0,
             'files_processed': len(other_files),
-            'output_file': output_file
+            'output_file': output_file,
+            'filtered_out_rows': filtered_out_rows
         }
         
         print(f"\nРезультат сохранен в файл: {output_file}")
@@ -905,14 +1157,15 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
         # Добавляем колонку Price PL
         combined_tradewatch = add_price_pl_column(combined_tradewatch)
         
+        # Отбираем строки по Profit/ROI до создания ссылок и записи файла
+        combined_tradewatch, filtered_out_rows = apply_report_filter(combined_tradewatch, report_filter)
+        
         # Создаем гиперссылки
         combined_tradewatch = create_hyperlinks(combined_tradewatch)
         
         # Создаем Product Link гиперссылки
         combined_tradewatch = create_product_links(combined_tradewatch)
         
-        # Определяем выходной файл в той же папке, что и первый TradeWatch файл
-        output_dir = os.path.dirname(tradewatch_files[0])
         output_file = os.path.join(output_dir, config.OUTPUT_FILE_TRADEWATCH_ONLY)
         save_formatted_excel(combined_tradewatch, output_file)
         
@@ -920,13 +1173,15 @@ def merge_excel_files_from_list(file_paths, original_filename=None):
             'total_rows': len(combined_tradewatch),
             'unique_ean': combined_tradewatch['EAN'].nunique() if 'EAN' in combined_tradewatch.columns else 0,
             'files_processed': 0,
-            'output_file': output_file
+            'output_file': output_file,
+            'filtered_out_rows': filtered_out_rows
         }
         
         print(f"Сохранены данные TradeWatch в файл: {output_file}")
         return stats
 
-def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress_callback=None):
+def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress_callback=None, report_filter=None,
+                                          progress_events=None):
     """
     Новая функция для автоматической обработки файла поставщика с TradeWatch
     
@@ -934,6 +1189,8 @@ def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress
         supplier_file_path: путь к файлу поставщика
         temp_dir: временная папка для скачивания файлов
         progress_callback: функция для отслеживания прогресса (опционально)
+        report_filter: режим отбора строк из config.REPORT_FILTERS (опционально)
+        progress_events: получатель событий прогресса (этапы, группы), см. progress_bridge.py
     
     Returns:
         dict: статистика обработки и путь к результату
@@ -948,8 +1205,28 @@ def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress
         # Обрабатываем файл поставщика и получаем файлы TradeWatch
         print("Извлекаем EAN коды и обрабатываем через TradeWatch...")
         
+        job_stats = {}
+        cached_frames = []
+        batch_accumulator = None
         if SELENIUM_AVAILABLE:
-            tradewatch_files = process_supplier_file_with_tradewatch(supplier_file_path, download_dir, progress_callback=progress_callback)
+            # Файлы групп разбираются в пуле процессов по мере скачивания; файл
+            # поставщика всегда объединяется с ними, поэтому нужны только колонки
+            # отчета. Пул создается только здесь, где его гарантированно закроют
+            if config.BATCH_PIPELINE_PARSING:
+                batch_accumulator = BatchFileAccumulator(REPORT_SOURCE_COLUMNS)
+            try:
+                tradewatch_files = process_supplier_file_with_tradewatch(
+                    supplier_file_path, download_dir,
+                    progress_callback=progress_callback, job_stats=job_stats,
+                    batch_file_callback=batch_accumulator.submit if batch_accumulator else None,
+                    progress_events=progress_events,
+                    cached_rows_callback=lambda df: cached_frames.append(
+                        prepare_tradewatch_frame(df, "EAN cache", REPORT_SOURCE_COLUMNS)
+                    )
+                )
+            finally:
+                if batch_accumulator:
+                    batch_accumulator.close()
         else:
             # Fallback режим - возвращаем пустой результат с информативным сообщением
             if progress_callback:
@@ -961,14 +1238,19 @@ def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress
                 'message': 'Для полной функциональности необходимо развертывание с Selenium'
             }
         
-        if not tradewatch_files:
+        failed_ean_codes = job_stats.get('failed_ean_codes', [])
+        
+        if not tradewatch_files and not cached_frames:
             return {
                 'success': False,
                 'error': 'Не удалось получить данные из TradeWatch',
-                'files_processed': 0
+                'files_processed': 0,
+                'failed_ean_codes': failed_ean_codes
             }
         
         print(f"Получено {len(tradewatch_files)} файлов TradeWatch")
+        if failed_ean_codes:
+            print(f"⚠️ Не удалось получить из TradeWatch {len(failed_ean_codes)} EAN кодов: {failed_ean_codes[:10]}...")
         
         # Проверяем, что все файлы существуют
         print("Проверка файлов TradeWatch:")
@@ -981,10 +1263,22 @@ def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress
         
         # Объединяем файлы поставщика с файлами TradeWatch
         print("Объединяем файлы...")
+        emit_progress_event(progress_events, EVENT_STAGE, stage="Объединение файлов и расчёт отчёта")
         
         # Создаем список всех файлов для объединения
         all_files = [supplier_file_path] + tradewatch_files
-        result = merge_excel_files_from_list(all_files, supplier_file_path)
+        if batch_accumulator:
+            tradewatch_data = batch_accumulator.collect(tradewatch_files)
+        elif tradewatch_files:
+            tradewatch_data = load_tradewatch_batches(tradewatch_files, columns=REPORT_SOURCE_COLUMNS)
+        else:
+            tradewatch_data = None
+        
+        # Строки из кеша EAN объединяются вместе со скачанными группами
+        tradewatch_frames = cached_frames + ([tradewatch_data] if tradewatch_data is not None else [])
+        tradewatch_data = pd.concat(tradewatch_frames, ignore_index=True) if tradewatch_frames else None
+        result = merge_excel_files_from_list(all_files, supplier_file_path, report_filter=report_filter,
+                                             tradewatch_data=tradewatch_data, output_dir=download_dir)
         
         if result:
             print(f"Обработка завершена успешно!")
@@ -1000,7 +1294,13 @@ def process_supplier_with_tradewatch_auto(supplier_file_path, temp_dir, progress
                 'unique_ean': result['unique_ean'],
                 'files_processed': len(tradewatch_files),
                 'supplier_file': supplier_file_path,
-                'tradewatch_files_count': len(tradewatch_files)
+                'tradewatch_files_count': len(tradewatch_files),
+                'failed_ean_codes': failed_ean_codes,
+                'cache_hits': job_stats.get('cache_hits', 0),
+                'cache_misses': job_stats.get('cache_misses', 0),
+                'invalid_ean_count': job_stats.get('invalid_ean_count', 0),
+                'duplicate_ean_count': job_stats.get('duplicate_ean_count', 0),
+                'filtered_out_rows': result.get('filtered_out_rows', 0)
             }
         else:
             return {
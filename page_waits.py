@@ -0,0 +1,200 @@
+"""
+Ожидания состояний страниц TradeWatch вместо фиксированных пауз
+
+Каждый шаг ждет конкретное условие в DOM (редирект после входа, готовность
+поля eansPhrase, завершение AJAX запросов PrimeFaces, появление результатов,
+кликабельность ссылки экспорта) со своим таймаутом из config.WAIT_TIMEOUTS.
+Время каждого шага записывается в статистику, чтобы видеть, сколько
+на самом деле ждет сайт.
+"""
+import time
+import threading
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+import config
+
+# Как часто проверять условие (в секундах)
+POLL_FREQUENCY = 0.2
+
+EXPORT_LINK_TEXT = "Eksport do XLS"
+
+# Строки таблицы результатов (PrimeFaces datatable или обычная таблица),
+# кроме строки "нет данных" пустой таблицы PrimeFaces
+RESULT_ROWS_SELECTOR = ".ui-datatable-data tr:not(.ui-datatable-empty-message), table#results tr"
+
+# Нет активных AJAX запросов PrimeFaces/jQuery и страница загружена
+AJAX_IDLE_SCRIPT = """
+if (document.readyState !== 'complete') return false;
+if (window.jQuery && window.jQuery.active > 0) return false;
+if (window.PrimeFaces && PrimeFaces.ajax && PrimeFaces.ajax.Queue) {
+    var queue = PrimeFaces.ajax.Queue;
+    if (queue.isEmpty && !queue.isEmpty()) return false;
+    if (queue.xhrs && queue.xhrs.length > 0) return false;
+}
+return true;
+"""
+
+
+class WaitTelemetry:
+    """Потокобезопасная статистика времени ожидания по шагам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = {}
+
+    def record(self, step, seconds, success):
+        with self._lock:
+            stats = self._steps.setdefault(step, {'count': 0, 'timeouts': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            if not success:
+                stats['timeouts'] += 1
+
+    def snapshot(self):
+        """Копия статистики: шаг -> count/timeouts/avg/max"""
+        with self._lock:
+            return {
+                step: {
+                    'count': stats['count'],
+                    'timeouts': stats['timeouts'],
+                    'avg': stats['total'] / stats['count'],
+                    'max': stats['max']
+                }
+                for step, stats in self._steps.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._steps.clear()
+
+    def print_summary(self):
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+        print("⏱️ Время ожидания по шагам:")
+        for step, stats in sorted(snapshot.items()):
+            print(f"  {step}: {stats['count']} раз, среднее {stats['avg']:.2f} сек, "
+                  f"макс {stats['max']:.2f} сек, таймаутов {stats['timeouts']}")
+
+
+wait_telemetry = WaitTelemetry()
+
+
+def get_step_timeout(step):
+    """Таймаут шага из config.WAIT_TIMEOUTS"""
+    return config.WAIT_TIMEOUTS.get(step, config.WAIT_TIMEOUTS['default'])
+
+
+def wait_for_condition(driver, step, condition, timeout=None):
+    """
+    Ждет условие с таймаутом шага и записывает время ожидания
+
+    Args:
+        driver: веб-драйвер
+        step: имя шага (ключ config.WAIT_TIMEOUTS и статистики)
+        condition: функция driver -> значение (ложное - ждем дальше)
+        timeout: таймаут в секундах (по умолчанию из config)
+
+    Returns:
+        Результат condition или None при таймауте
+    """
+    timeout = get_step_timeout(step) if timeout is None else timeout
+    started_at = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+        wait_telemetry.record(step, time.time() - started_at, True)
+        return result
+    except TimeoutException:
+        elapsed = time.time() - started_at
+        wait_telemetry.record(step, elapsed, False)
+        print(f"⏱️ Шаг '{step}' не дождался условия за {elapsed:.1f} сек")
+        return None
+
+
+def _ajax_idle(driver):
+    try:
+        return driver.execute_script(AJAX_IDLE_SCRIPT)
+    except Exception:
+        return False
+
+
+def wait_for_ajax_idle(driver, timeout=None):
+    """Ждет завершения AJAX запросов PrimeFaces/jQuery"""
+    return bool(wait_for_condition(driver, 'ajax_idle', _ajax_idle, timeout))
+
+
+def wait_for_login_redirect(driver, timeout=None):
+    """
+    Ждет ухода со страницы логина после отправки формы
+
+    Returns:
+        bool: True если браузер покинул login.jsf (вход выполнен)
+    """
+    def left_login_page(d):
+        return "login.jsf" not in d.current_url and d.execute_script("return document.readyState") == 'complete'
+
+    return bool(wait_for_condition(driver, 'login_redirect', left_login_page, timeout))
+
+
+def wait_for_ean_field_ready(driver, timeout=None):
+    """
+    Ждет, пока поле eansPhrase станет доступным для ввода
+
+    Returns:
+        WebElement поля или None при таймауте
+    """
+    def ean_field_ready(d):
+        if not _ajax_idle(d):
+            return False
+        return EC.element_to_be_clickable((By.ID, "eansPhrase"))(d)
+
+    return wait_for_condition(driver, 'ean_field_ready', ean_field_ready, timeout)
+
+
+def wait_for_report_results(driver, timeout=None):
+    """
+    Ждет результаты после нажатия "Generuj": AJAX завершен и на странице
+    есть строки результатов или ссылка экспорта
+
+    Returns:
+        bool: True если результаты появились
+    """
+    def results_ready(d):
+        if not _ajax_idle(d):
+            return False
+        return (d.find_elements(By.CSS_SELECTOR, RESULT_ROWS_SELECTOR)
+                or d.find_elements(By.LINK_TEXT, EXPORT_LINK_TEXT))
+
+    return bool(wait_for_condition(driver, 'results_ready', results_ready, timeout))
+
+
+def wait_for_export_link(driver, timeout=None):
+    """
+    Ждет кликабельную ссылку "Eksport do XLS"
+
+    Returns:
+        WebElement ссылки или None при таймауте
+    """
+    return wait_for_condition(
+        driver, 'export_clickable',
+        EC.element_to_be_clickable((By.LINK_TEXT, EXPORT_LINK_TEXT)),
+        timeout
+    )
+
+
+def wait_for_field_value(driver, element, predicate, step='field_value', timeout=None):
+    """
+    Ждет, пока значение поля удовлетворит predicate(value)
+
+    Returns:
+        bool: True если условие выполнено
+    """
+    def value_matches(d):
+        return predicate(element.get_attribute("value") or "")
+
+    return bool(wait_for_condition(driver, step, value_matches, timeout))
@@ -0,0 +1,136 @@
+"""
+Расчет Price PL, Profit и ROI в NumPy
+
+Те же формулы, что пишутся в Excel (build_formula_plan), с параметрами
+из config.TITLE_ROWS: курс обмена (G1), доставка (G2), упаковка (G3)
+и комиссия Allegro в процентах (M1). Посчитанные значения можно
+сортировать и фильтровать до записи отчета и отдавать без Excel.
+"""
+import numpy as np
+import pandas as pd
+
+import config
+
+# Цены Allegro включают НДС 23%
+VAT_DIVISOR = 1.23
+
+# Ячейки параметров в config.TITLE_ROWS: (строка, колонка)
+PARAMETER_CELLS = {
+    'exchange_rate': (1, 'G'),
+    'commission_percent': (1, 'M'),
+    'delivery_cost': (2, 'G'),
+    'packaging_cost': (3, 'G'),
+}
+
+
+def parse_title_number(value):
+    """
+    Число из ячейки заголовка ("1,00", "0,5%", 2) - как его поймет Excel
+
+    Returns:
+        float: значение (0 для пустой ячейки)
+    """
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace('\xa0', '').replace(' ', '').replace('%', '').replace(',', '.')
+    return float(text) if text else 0.0
+
+
+def get_pricing_parameters(title_rows=None):
+    """
+    Параметры расчета из заголовка отчета
+
+    Returns:
+        dict: exchange_rate, commission_percent, delivery_cost, packaging_cost
+    """
+    title_rows = config.TITLE_ROWS if title_rows is None else title_rows
+    return {
+        name: parse_title_number(title_rows.get(row, {}).get(column))
+        for name, (row, column) in PARAMETER_CELLS.items()
+    }
+
+
+def _numeric_column(df, column):
+    """
+    Колонка как float массив: пустые ячейки - 0 (как в формулах Excel),
+    текст, который не является числом - NaN
+
+    Returns:
+        np.ndarray или None, если колонки нет
+    """
+    if column not in df.columns:
+        return None
+    raw = df[column]
+    values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=float, na_value=np.nan, copy=True)
+    values[raw.isna().to_numpy()] = 0.0
+    return values
+
+
+def calculate_pricing(df, parameters=None):
+    """
+    Считает Price PL, Profit и ROI для всех строк (векторно)
+
+    Price PL = Price * курс
+    Profit   = Cena min. / 1.23 - Cena min. * комиссия% / 1.23 - Price PL - доставка - упаковка
+    ROI      = Profit / Cena min. (0, если Cena min. = 0)
+
+    Колонки, для которых нет исходных данных, - NaN (формулы для них
+    в Excel тоже не пишутся).
+
+    Returns:
+        pd.DataFrame: колонки 'Price PL', 'Profit', 'ROI' с индексом df
+    """
+    parameters = get_pricing_parameters() if parameters is None else parameters
+    rows = len(df)
+    empty = np.full(rows, np.nan)
+
+    price = _numeric_column(df, 'Price')
+    cena_min = _numeric_column(df, 'Cena min.')
+
+    price_pl = price * parameters['exchange_rate'] if price is not None else empty
+    profit = roi = empty
+
+    if cena_min is not None:
+        # Пустая Price PL в Excel считается нулем
+        price_pl_in_formula = np.nan_to_num(price_pl, nan=0.0) if price is None else price_pl
+        commission = parameters['commission_percent'] / 100
+        profit = (cena_min / VAT_DIVISOR
+                  - cena_min * commission / VAT_DIVISOR
+                  - price_pl_in_formula
+                  - parameters['delivery_cost']
+                  - parameters['packaging_cost'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            roi = np.where(cena_min != 0, profit / cena_min, 0.0)
+        roi[np.isnan(cena_min)] = np.nan
+
+    return pd.DataFrame({'Price PL': price_pl, 'Profit': profit, 'ROI': roi}, index=df.index)
+
+
+def select_profitable_rows(df, min_profit=None, min_roi=None, top_n=None):
+    """
+    Отбирает строки отчета по посчитанным Profit и ROI
+
+    Строка остается, если Profit > min_profit и ROI > min_roi (порог None -
+    не проверяется). top_n оставляет N строк с наибольшим ROI: отбор через
+    np.argpartition за O(n), сортируются только выбранные N строк.
+
+    Returns:
+        pd.DataFrame: отобранные строки (при top_n - по убыванию ROI)
+    """
+    keep = np.ones(len(df), dtype=bool)
+    if min_profit is not None:
+        keep &= _numeric_column(df, 'Profit') > min_profit
+    if min_roi is not None:
+        keep &= _numeric_column(df, 'ROI') > min_roi
+
+    positions = np.flatnonzero(keep)
+    if top_n is not None:
+        roi = np.nan_to_num(_numeric_column(df, 'ROI')[positions], nan=-np.inf)
+        selected = np.arange(len(positions))
+        if len(positions) > top_n:
+            selected = np.argpartition(-roi, top_n - 1)[:top_n] if top_n > 0 else selected[:0]
+        positions = positions[selected[np.argsort(-roi[selected], kind='stable')]]
+
+    return df.iloc[positions]
@@ -0,0 +1,63 @@
+"""
+Передача прогресса из потоков обработки в event loop бота
+
+Обработка отчета идет в потоках (run_in_executor и воркеры групп), а
+сообщение с прогрессом редактируется в event loop. asyncio объекты не
+потокобезопасны, поэтому события передаются только через
+loop.call_soon_threadsafe в asyncio.Queue. События - словари с типом
+и данными: этапы задачи, начало и результат групп, повторы, счетчики EAN.
+"""
+import time
+import asyncio
+
+# Типы событий прогресса
+EVENT_STAGE = "stage"                   # stage: текст этапа
+EVENT_PROCESSED = "processed"           # processed: обработано EAN кодов
+EVENT_CACHE = "cache"                   # hits, misses: результат кеша EAN
+EVENT_BATCH_STARTED = "batch_started"   # batch, size, attempt
+EVENT_BATCH_DONE = "batch_done"         # batch, size
+EVENT_BATCH_FAILED = "batch_failed"     # batch, size
+EVENT_BATCH_RETRY = "batch_retry"       # batch, delay
+EVENT_BATCH_SPLIT = "batch_split"       # batch, delay
+EVENT_EAN_FAILED = "ean_failed"         # ean: код не получен после всех попыток
+
+
+def emit_progress_event(progress_events, event_type, **data):
+    """Передает событие получателю (ошибка получателя не прерывает обработку)"""
+    if progress_events:
+        try:
+            progress_events(event_type, **data)
+        except Exception as e:
+            print(f"Ошибка в progress_events: {e}")
+
+
+class ProgressBridge:
+    """Потокобезопасный канал событий прогресса в event loop"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        # Создается в event loop, читается только из него
+        self.queue = asyncio.Queue()
+
+    def emit(self, event_type, **data):
+        """Отправляет событие (можно вызывать из любого потока)"""
+        event = {'type': event_type, 'time': time.time(), **data}
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            # Event loop уже закрыт - прогресс никто не покажет
+            pass
+
+    async def get(self, timeout):
+        """Следующее событие или None, если за timeout секунд событий не было"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=max(0, timeout))
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self):
+        """Все события, уже стоящие в очереди"""
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
@@ -0,0 +1,102 @@
+"""
+Кеш авторизованной сессии TradeWatch
+
+Хранит cookies (JSESSIONID и др.) после успешного входа в файле на диске
+со сроком жизни, чтобы новые драйверы и параллельные сессии не проходили
+форму логина каждый раз.
+"""
+import os
+import json
+import time
+import threading
+from pathlib import Path
+
+import config
+
+# Поля cookie, которые принимает WebDriver.add_cookie()
+COOKIE_FIELDS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+
+class TradeWatchSessionCache:
+    """Файловый кеш cookies авторизованной сессии TradeWatch"""
+
+    def __init__(self, cache_file: str, ttl_seconds: int):
+        self.cache_file = Path(cache_file)
+        self.ttl_seconds = ttl_seconds
+        # Только один поток выполняет вход через форму, остальные ждут его cookies
+        self.login_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    def load(self):
+        """
+        Возвращает сохраненные cookies или None, если кеш пуст или устарел
+        """
+        with self._file_lock:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+        if data.get('expires_at', 0) <= time.time():
+            return None
+
+        cookies = data.get('cookies')
+        return cookies or None
+
+    def save(self, cookies):
+        """Сохраняет cookies с временем истечения (атомарная запись)"""
+        now = time.time()
+        data = {
+            'saved_at': now,
+            'expires_at': now + self.ttl_seconds,
+            'cookies': [
+                {key: cookie[key] for key in COOKIE_FIELDS if key in cookie}
+                for cookie in cookies
+            ]
+        }
+
+        with self._file_lock:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.chmod(tmp_file, 0o600)
+            os.replace(tmp_file, self.cache_file)
+
+        print(f"🍪 Сессия TradeWatch сохранена в кеш ({len(data['cookies'])} cookies)")
+
+    def invalidate(self, cookies=None):
+        """
+        Удаляет кеш. Если переданы cookies - только если кеш не обновился с тех пор
+        """
+        with self._file_lock:
+            if cookies is not None:
+                try:
+                    with open(self.cache_file, 'r', encoding='utf-8') as f:
+                        if json.load(f).get('cookies') != cookies:
+                            return
+                except (OSError, ValueError):
+                    return
+            try:
+                os.remove(self.cache_file)
+                print("🍪 Кеш сессии TradeWatch сброшен")
+            except OSError:
+                pass
+
+
+# Глобальный кеш, общий для всех воркеров
+_session_cache = None
+_session_cache_lock = threading.Lock()
+
+
+def get_session_cache():
+    """Возвращает глобальный кеш сессии TradeWatch"""
+    global _session_cache
+    with _session_cache_lock:
+        if _session_cache is None:
+            _session_cache = TradeWatchSessionCache(
+                config.SESSION_COOKIE_CACHE_FILE,
+                config.SESSION_COOKIE_TTL_SECONDS
+            )
+        return _session_cache
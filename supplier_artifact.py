@@ -0,0 +1,113 @@
+"""
+Разобранный файл поставщика, который сохраняется рядом с загрузкой
+
+Файл поставщика разбирается openpyxl один раз - при загрузке в бот.
+Рядом с ним сохраняются копия DataFrame (pickle pandas, без Excel) и JSON
+с метаданными: колонки, число строк и подготовленные EAN коды
+(prepare_ean_codes). Проверка файла, счетчик таймера, запросы к TradeWatch
+и объединение отчета берут данные отсюда вместо повторного pd.read_excel.
+Если файл поставщика изменился (другие размер или время изменения),
+артефакт создается заново.
+"""
+import os
+import json
+
+import pandas as pd
+
+from ean_utils import prepare_ean_codes
+
+# Суффиксы файлов артефакта рядом с файлом поставщика
+ARTIFACT_DATA_SUFFIX = ".parsed.pkl"
+ARTIFACT_METADATA_SUFFIX = ".parsed.json"
+
+
+def get_artifact_paths(file_path):
+    """Пути к данным и метаданным артефакта файла поставщика"""
+    file_path = str(file_path)
+    return file_path + ARTIFACT_DATA_SUFFIX, file_path + ARTIFACT_METADATA_SUFFIX
+
+
+def _source_signature(file_path):
+    stat = os.stat(file_path)
+    return {'source_size': stat.st_size, 'source_mtime': stat.st_mtime}
+
+
+def create_supplier_artifact(file_path):
+    """
+    Разбирает файл поставщика и сохраняет артефакт рядом с ним
+
+    Returns:
+        dict: метаданные - columns, total_rows, gtin_count (непустые GTIN),
+              preparation (результат prepare_ean_codes или None без колонки GTIN)
+    """
+    data_path, metadata_path = get_artifact_paths(file_path)
+
+    df = pd.read_excel(file_path)
+    has_gtin = 'GTIN' in df.columns
+    metadata = {
+        **_source_signature(file_path),
+        'columns': [str(column) for column in df.columns],
+        'total_rows': len(df),
+        'gtin_count': int(df['GTIN'].count()) if has_gtin else 0,
+        'preparation': prepare_ean_codes(df['GTIN']) if has_gtin else None,
+    }
+
+    df.to_pickle(data_path)
+    # Метаданные пишутся последними - по ним определяется, что артефакт готов
+    temp_metadata_path = metadata_path + ".tmp"
+    with open(temp_metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False)
+    os.replace(temp_metadata_path, metadata_path)
+
+    print(f"💾 Файл поставщика разобран и сохранен: {os.path.basename(data_path)} ({len(df)} строк)")
+    return metadata
+
+
+def load_supplier_metadata(file_path):
+    """
+    Метаданные артефакта (создает артефакт, если его нет или файл изменился)
+
+    Returns:
+        dict: см. create_supplier_artifact
+    """
+    _, metadata_path = get_artifact_paths(file_path)
+    try:
+        with open(metadata_path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        signature = _source_signature(file_path)
+        if all(metadata.get(key) == value for key, value in signature.items()):
+            return metadata
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Артефакт файла поставщика поврежден, разбираем файл заново: {e}")
+
+    return create_supplier_artifact(file_path)
+
+
+def load_supplier_frame(file_path):
+    """
+    DataFrame файла поставщика из артефакта (без разбора Excel)
+
+    Returns:
+        pd.DataFrame
+    """
+    load_supplier_metadata(file_path)
+    data_path, _ = get_artifact_paths(file_path)
+    try:
+        return pd.read_pickle(data_path)
+    except Exception as e:
+        print(f"⚠️ Не удалось прочитать артефакт файла поставщика, разбираем файл заново: {e}")
+        create_supplier_artifact(file_path)
+        return pd.read_pickle(data_path)
+
+
+def remove_supplier_artifact(file_path):
+    """Удаляет артефакт вместе с файлом поставщика"""
+    for path in get_artifact_paths(file_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Не удалось удалить {path}: {e}")
@@ -6,11 +6,12 @@ from pathlib import Path
 from typing import Dict, List
 import zipfile
 import time
+import concurrent.futures
 
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from telegram.constants import ParseMode
-import pandas as pd
+from telegram.error import RetryAfter
 
 # Проверяем доступность Selenium и выбираем соответствующий модуль
 try:
@@ -25,6 +26,15 @@ except ImportError:
 
 # Импортируем наши функции для обработки Excel
 from merge_excel_with_calculations import process_supplier_with_tradewatch_auto
+from batch_sizing import get_observed_rate
+from supplier_artifact import create_supplier_artifact, load_supplier_metadata, remove_supplier_artifact
+from job_queue import ReportJobQueue
+from job_store import get_job_store, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from progress_bridge import (
+    ProgressBridge, EVENT_STAGE, EVENT_PROCESSED, EVENT_CACHE, EVENT_BATCH_STARTED, EVENT_BATCH_DONE,
+    EVENT_BATCH_FAILED, EVENT_BATCH_RETRY, EVENT_BATCH_SPLIT, EVENT_EAN_FAILED
+)
+import config
 
 # Настройка логирования
 logging.basicConfig(
@@ -57,12 +67,22 @@ TEMP_DIR.mkdir(exist_ok=True)
 # Хранилище для файлов пользователей - теперь только файлы поставщика
 user_supplier_files: Dict[int, str] = {}
 
+# Выбранный пользователем режим отбора строк отчета (ключ config.REPORT_FILTERS)
+user_report_filters: Dict[int, str] = {}
+
 # Глобальные переменные для отслеживания прогресса
 processing_progress = {}
 active_timers = {}
 
 class ProcessingTimer:
-    """Класс для отслеживания прогресса обработки EAN кодов"""
+    """
+    Сообщение с прогрессом обработки EAN кодов
+
+    Потоки обработки передают события через ProgressBridge, цикл таймера
+    в event loop применяет все накопившиеся события разом и редактирует
+    сообщение не чаще config.PROGRESS_MIN_EDIT_INTERVAL секунд (и раз
+    в config.PROGRESS_REFRESH_INTERVAL секунд без событий - для времени).
+    """
     
     def __init__(self, user_id: int, total_ean_count: int, progress_message, estimated_rate: float = 600):
         self.user_id = user_id
@@ -72,14 +92,22 @@ class ProcessingTimer:
         self.processed_count = 0
         self.estimated_rate = estimated_rate  # EAN в минуту
         self.actual_rate = estimated_rate  # Будет пересчитываться
+        self.stage = "Обработка EAN кодов"
+        self.batches_done = 0
+        self.batches_in_flight = 0
+        self.batch_retries = 0
+        self.failed_ean_count = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.running = True
         self.timer_task = None
         self.loop = None
+        self.bridge = None
         
     def start(self, loop):
         """Запуск таймера"""
         self.loop = loop
-        self._force_update_event = asyncio.Event()
+        self.bridge = ProgressBridge(loop)
         self.timer_task = asyncio.create_task(self._timer_loop())
         
     async def stop(self):
@@ -92,85 +120,113 @@ class ProcessingTimer:
             except asyncio.CancelledError:
                 pass
     
-    def update_progress(self, processed_count: int):
-        """Обновление прогресса"""
-        print(f"📈 Обновление прогресса: {processed_count} из {self.total_ean_count} кодов")
-        self.processed_count = processed_count
+    def emit(self, event_type: str, **data):
+        """Событие прогресса из любого потока (см. progress_bridge.py)"""
+        if self.bridge:
+            self.bridge.emit(event_type, **data)
+    
+    def update_progress(self, processed_count):
+        """Обновление прогресса: число обработанных кодов или текст этапа (из любого потока)"""
+        if isinstance(processed_count, str):
+            self.emit(EVENT_STAGE, stage=processed_count)
+        else:
+            self.emit(EVENT_PROCESSED, processed=processed_count)
+    
+    def _apply_event(self, event):
+        event_type = event['type']
+        if event_type == EVENT_PROCESSED:
+            self.processed_count = event['processed']
+            elapsed_time = event['time'] - self.start_time
+            if elapsed_time > 0 and self.processed_count > 0:
+                # Пересчитываем фактическую скорость (EAN в минуту)
+                self.actual_rate = (self.processed_count / elapsed_time) * 60
+        elif event_type == EVENT_STAGE:
+            self.stage = event['stage']
+        elif event_type == EVENT_CACHE:
+            self.cache_hits = event['hits']
+            self.cache_misses = event['misses']
+        elif event_type == EVENT_BATCH_STARTED:
+            self.batches_in_flight += 1
+        elif event_type == EVENT_BATCH_DONE:
+            self.batches_in_flight -= 1
+            self.batches_done += 1
+        elif event_type == EVENT_BATCH_FAILED:
+            self.batches_in_flight -= 1
+        elif event_type in (EVENT_BATCH_RETRY, EVENT_BATCH_SPLIT):
+            self.batch_retries += 1
+        elif event_type == EVENT_EAN_FAILED:
+            self.failed_ean_count += 1
+    
+    def _render(self) -> str:
         elapsed_time = time.time() - self.start_time
+        # Фактическая скорость после первых обработанных кодов, до этого - расчетная
+        rate = self.actual_rate if self.processed_count > 0 else self.estimated_rate
+        remaining_count = max(0, self.total_ean_count - self.processed_count)
+        remaining_minutes = remaining_count / rate if rate > 0 else 0
+        
+        progress_text = f"🔄 {self.stage}...\n\n"
+        progress_text += f"📊 Прогресс: {self.processed_count}/{self.total_ean_count} кодов\n"
+        if self.cache_hits:
+            progress_text += f"🗄️ Из кеша: {self.cache_hits} EAN, запрос в TradeWatch: {self.cache_misses} EAN\n"
+        if self.batches_done or self.batches_in_flight:
+            progress_text += f"📦 Группы: готово {self.batches_done}, в работе {self.batches_in_flight}"
+            progress_text += f", повторов {self.batch_retries}\n" if self.batch_retries else "\n"
+        if self.failed_ean_count:
+            progress_text += f"⚠️ Не удалось получить: {self.failed_ean_count} EAN\n"
+        progress_text += f"⏱️ Прошло времени: {elapsed_time/60:.1f} мин\n"
+        progress_text += f"🚀 Скорость: {rate:.0f} EAN/мин\n"
+        progress_text += f"⏰ До конца обработки осталось: {remaining_minutes:.1f} мин"
+        return progress_text
         
-        if elapsed_time > 0 and processed_count > 0:
-            # Пересчитываем фактическую скорость (EAN в минуту)
-            self.actual_rate = (processed_count / elapsed_time) * 60
-            print(f"🚀 Новая скорость: {self.actual_rate:.0f} EAN/мин")
-            
-        # Принудительно обновляем таймер после изменения прогресса
-        if self.timer_task and not self.timer_task.done():
-            # Создаем событие для немедленного обновления
-            try:
-                if hasattr(self, '_force_update_event'):
-                    self._force_update_event.set()
-            except:
-                pass
-    
     async def _timer_loop(self):
         """Основной цикл таймера"""
         print(f"🕐 Таймер запущен для пользователя {self.user_id}")
         
-        last_update_time = time.time()
+        last_edit_time = 0.0
+        last_text = None
+        retry_after_until = 0.0
+        has_changes = True
         
         while self.running:
             try:
-                current_time = time.time()
-                elapsed_time = current_time - self.start_time
-                
-                if self.processed_count > 0:
-                    # Используем фактическую скорость
-                    rate = self.actual_rate
+                # Изменения показываем, как только позволяет ограничение частоты,
+                # без изменений - обновляем только время
+                if has_changes:
+                    next_edit_time = max(last_edit_time + config.PROGRESS_MIN_EDIT_INTERVAL, retry_after_until)
                 else:
-                    # Используем расчетную скорость для первой минуты
-                    rate = self.estimated_rate
-                
-                remaining_count = self.total_ean_count - self.processed_count
+                    next_edit_time = max(last_edit_time + config.PROGRESS_REFRESH_INTERVAL, retry_after_until)
                 
-                if remaining_count <= 0:
-                    print(f"🏁 Таймер завершен - все коды обработаны")
-                    break
-                
-                # Рассчитываем оставшееся время
-                remaining_minutes = remaining_count / rate if rate > 0 else 0
-                
-                # Обновляем сообщение только если прошло достаточно времени или есть принудительное обновление
-                time_since_update = current_time - last_update_time
-                force_update = self._force_update_event.is_set()
+                current_time = time.time()
+                if current_time < next_edit_time:
+                    event = await self.bridge.get(next_edit_time - current_time)
+                    if event:
+                        # Все накопившиеся события - в одно обновление сообщения
+                        for queued_event in [event] + self.bridge.drain():
+                            self._apply_event(queued_event)
+                        has_changes = True
+                    continue
                 
-                if time_since_update >= 15 or force_update:
-                    # Формируем сообщение
-                    progress_text = f"🔄 Обработка EAN кодов...\n\n"
-                    progress_text += f"📊 Прогресс: {self.processed_count}/{self.total_ean_count} кодов\n"
-                    progress_text += f"⏱️ Прошло времени: {elapsed_time/60:.1f} мин\n"
-                    progress_text += f"🚀 Скорость: {rate:.0f} EAN/мин\n"
-                    progress_text += f"⏰ До конца обработки осталось: {remaining_minutes:.1f} мин"
-                    
-                    print(f"📊 Обновление таймера: {self.processed_count}/{self.total_ean_count} кодов")
-                    
-                    # Обновляем сообщение (с защитой от ошибок)
-                    try:
-                        await self.progress_message.edit_text(progress_text)
-                        print(f"✅ Сообщение обновлено успешно")
-                        last_update_time = current_time
-                        
-                        # Сбрасываем флаг принудительного обновления
-                        if force_update:
-                            self._force_update_event.clear()
-                            
-                    except Exception as e:
-                        print(f"❌ Ошибка обновления сообщения: {e}")
+                progress_text = self._render()
+                last_edit_time = current_time
+                has_changes = False
+                if progress_text == last_text:
+                    continue
                 
-                # Ждем 5 секунд до следующей проверки или принудительного обновления
+                # Обновляем сообщение (с защитой от ошибок)
                 try:
-                    await asyncio.wait_for(self._force_update_event.wait(), timeout=5)
-                except asyncio.TimeoutError:
-                    pass  # Нормальное поведение - продолжаем цикл
+                    await self.progress_message.edit_text(progress_text)
+                    last_text = progress_text
+                    print(f"📊 Обновление таймера: {self.processed_count}/{self.total_ean_count} кодов")
+                except RetryAfter as e:
+                    # Telegram ограничил частоту - ждем указанное время
+                    retry_after = e.retry_after
+                    if hasattr(retry_after, 'total_seconds'):
+                        retry_after = retry_after.total_seconds()
+                    retry_after_until = time.time() + retry_after
+                    has_changes = True
+                    print(f"⏳ Telegram просит подождать {retry_after:.0f} сек перед обновлением")
+                except Exception as e:
+                    print(f"❌ Ошибка обновления сообщения: {e}")
                 
             except asyncio.CancelledError:
                 print(f"🛑 Таймер отменен для пользователя {self.user_id}")
@@ -197,6 +253,23 @@ class TelegramBot:
         self.application = Application.builder().token(token).request(request).build()
         logger.info("✅ Application создана успешно")
 
+        # Общая очередь отчетов: число одновременно работающих браузеров
+        # ограничено для всех пользователей вместе
+        self.report_queue = ReportJobQueue(config.REPORT_BROWSER_SLOTS)
+        # Каждый отчет занимает хотя бы один слот - потоков хватает на все запущенные отчеты
+        self.report_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=config.REPORT_BROWSER_SLOTS, thread_name_prefix="report"
+        )
+
+        # Файлы, загруженные до перезапуска бота
+        restored_uploads = {
+            user_id: file_path for user_id, file_path in get_job_store().load_uploads().items()
+            if os.path.exists(file_path)
+        }
+        user_supplier_files.update(restored_uploads)
+        if restored_uploads:
+            logger.info(f"Восстановлено загруженных файлов: {len(restored_uploads)}")
+
         # ДОБАВИТЬ: Логирование конфигурации при запуске бота
         print("🚀 ЗАПУСК TELEGRAM БОТА")
         print("=" * 50)
@@ -230,8 +303,10 @@ class TelegramBot:
         self.application.add_handler(CommandHandler("help", self.help))
         self.application.add_handler(CommandHandler("clear", self.clear_files))
         
-        # Callback для кнопок
-        self.application.add_handler(CallbackQueryHandler(self.button_callback))
+        # Callback для кнопок. Не блокирует получение обновлений: отчет
+        # создается долго, а в это время бот должен принимать файлы, команды
+        # и нажатия других пользователей (очередь отчетов - ReportJobQueue)
+        self.application.add_handler(CallbackQueryHandler(self.button_callback, block=False))
         
         # Обработка файлов
         self.application.add_handler(MessageHandler(filters.Document.FileExtension("xlsx"), self.handle_file))
@@ -310,17 +385,25 @@ class TelegramBot:
         """Очистка файлов пользователя"""
         user_id = update.effective_user.id
         
+        if self.report_queue.has_job(user_id):
+            await update.message.reply_text(
+                "⏳ Файл используется для создания отчёта. Удалить его можно после завершения."
+            )
+            return
+        
         if user_id in user_supplier_files:
             # Удаляем файл с диска
             file_path = user_supplier_files[user_id]
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
+                remove_supplier_artifact(file_path)
             except Exception as e:
                 logger.error(f"Ошибка при удалении файла {file_path}: {e}")
             
             # Очищаем запись
             del user_supplier_files[user_id]
+            get_job_store().remove_upload(user_id)
             
             await update.message.reply_text(
                 "🗑️ Файл поставщика удалён! Можете загрузить новый файл.",
@@ -335,21 +418,39 @@ class TelegramBot:
     def get_main_keyboard(self, user_id: int) -> InlineKeyboardMarkup:
         """Создание основной клавиатуры"""
         has_file = user_id in user_supplier_files
+        filter_label = self.get_report_filter_label(user_id)
         
         if has_file:
             file_name = os.path.basename(user_supplier_files[user_id])
             keyboard = [
                 [InlineKeyboardButton(f" Создать отчёт ({file_name})", callback_data="report")],
+                [InlineKeyboardButton(f"🔎 Отбор строк: {filter_label}", callback_data="filter")],
                 [InlineKeyboardButton("🗑️ Очистить файл", callback_data="clear")]
             ]
         else:
             keyboard = [
                 [InlineKeyboardButton("📊 Создать отчёт (нет файла)", callback_data="report")],
+                [InlineKeyboardButton(f"🔎 Отбор строк: {filter_label}", callback_data="filter")],
                 [InlineKeyboardButton("🗑️ Очистить файл", callback_data="clear")]
             ]
         
         return InlineKeyboardMarkup(keyboard)
 
+    def get_report_filter_label(self, user_id: int) -> str:
+        """Название выбранного пользователем режима отбора строк"""
+        report_filter = user_report_filters.get(user_id, config.DEFAULT_REPORT_FILTER)
+        return config.REPORT_FILTERS[report_filter]['label']
+
+    def get_filter_keyboard(self, user_id: int) -> InlineKeyboardMarkup:
+        """Клавиатура выбора режима отбора строк отчета"""
+        current_filter = user_report_filters.get(user_id, config.DEFAULT_REPORT_FILTER)
+        keyboard = [
+            [InlineKeyboardButton(f"{'✅ ' if name == current_filter else ''}{settings['label']}",
+                                  callback_data=f"filter:{name}")]
+            for name, settings in config.REPORT_FILTERS.items()
+        ]
+        return InlineKeyboardMarkup(keyboard)
+
     def get_processing_keyboard(self, user_id: int) -> InlineKeyboardMarkup:
         """Создание клавиатуры во время обработки"""
         keyboard = []
@@ -367,20 +468,44 @@ class TelegramBot:
         
         elif query.data == "clear":
             await self.clear_user_files(query, user_id)
+        
+        elif query.data == "filter":
+            await query.edit_message_text(
+                "🔎 Какие строки оставить в отчёте?\n\n"
+                "Profit и ROI считаются по параметрам отчёта по умолчанию.",
+                reply_markup=self.get_filter_keyboard(user_id)
+            )
+        
+        elif query.data.startswith("filter:"):
+            report_filter = query.data.split(":", 1)[1]
+            if report_filter in config.REPORT_FILTERS:
+                user_report_filters[user_id] = report_filter
+            await query.edit_message_text(
+                f"🔎 Отбор строк: {self.get_report_filter_label(user_id)}",
+                reply_markup=self.get_main_keyboard(user_id)
+            )
 
     async def clear_user_files(self, query, user_id: int):
         """Очистка файлов пользователя через callback"""
+        if self.report_queue.has_job(user_id):
+            await query.message.reply_text(
+                "⏳ Файл используется для создания отчёта. Удалить его можно после завершения."
+            )
+            return
+        
         if user_id in user_supplier_files:
             # Удаляем файл с диска
             file_path = user_supplier_files[user_id]
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
+                remove_supplier_artifact(file_path)
             except Exception as e:
                 logger.error(f"Ошибка при удалении файла {file_path}: {e}")
             
             # Очищаем запись
             del user_supplier_files[user_id]
+            get_job_store().remove_upload(user_id)
             
             await query.edit_message_text(
                 "🗑️ Файл поставщика удалён! Можете загрузить новый файл.",
@@ -406,6 +531,13 @@ class TelegramBot:
             )
             return
 
+        if self.report_queue.has_job(user_id):
+            # Новый файл мог бы заменить на диске файл, с которым работает отчет
+            await update.message.reply_text(
+                "⏳ Ваш отчёт ещё создаётся. Загрузите новый файл после его завершения."
+            )
+            return
+
         try:
             # Создаём папку для пользователя
             user_dir = TEMP_DIR / str(user_id)
@@ -416,10 +548,10 @@ class TelegramBot:
             downloaded_file = await context.bot.get_file(file.file_id)
             await downloaded_file.download_to_drive(file_path)
 
-            # Проверяем наличие необходимых колонок
+            # Разбираем файл один раз - следующие этапы берут данные из артефакта
             try:
-                df = pd.read_excel(file_path)
-                if 'GTIN' not in df.columns or 'Price' not in df.columns:
+                metadata = create_supplier_artifact(file_path)
+                if 'GTIN' not in metadata['columns'] or 'Price' not in metadata['columns']:
                     await update.message.reply_text(
                         "❌ В файле нет необходимых колонок GTIN и Price!",
                         reply_markup=self.get_main_keyboard(user_id)
@@ -427,7 +559,7 @@ class TelegramBot:
                     return
 
                 # Подсчитываем количество EAN кодов
-                ean_count = df['GTIN'].dropna().count()
+                ean_count = metadata['gtin_count']
 
                 if ean_count == 0:
                     await update.message.reply_text(
@@ -458,6 +590,7 @@ class TelegramBot:
 
             # Сохраняем файл поставщика
             user_supplier_files[user_id] = str(file_path)
+            get_job_store().save_upload(user_id, file_path)
 
             await update.message.reply_text(
                 f"✅ Файл поставщика загружен!\n\n"
@@ -474,8 +607,18 @@ class TelegramBot:
                 reply_markup=self.get_main_keyboard(user_id)
             )
 
+    def get_report_job_slots(self) -> int:
+        """Сколько слотов браузеров занимает один отчет"""
+        if not SELENIUM_AVAILABLE:
+            return 1
+        from tradewatch_login import get_parallel_sessions, get_tradewatch_transport
+        if get_tradewatch_transport() == "http":
+            # HTTP транспорт не запускает Chrome
+            return 1
+        return get_parallel_sessions()
+
     async def create_report(self, query, user_id: int):
-        """Создание отчёта с автоматическим получением данных TradeWatch"""
+        """Постановка отчёта в общую очередь и его создание"""
         if user_id not in user_supplier_files or not user_supplier_files[user_id]:
             await query.edit_message_text(
                 "📁 Сначала загрузите файл поставщика!\n\n"
@@ -484,15 +627,101 @@ class TelegramBot:
             )
             return
         
-        # Показываем прогресс
-        progress_message = await query.edit_message_text(
-            "⏳ Начинаю обработку файла поставщика...\n"
-            "Это может занять несколько минут."
-        )
+        job = self.report_queue.enqueue(user_id, self.get_report_job_slots())
+        if job is None:
+            await query.message.reply_text(
+                "⏳ Ваш отчёт уже создаётся или ждёт в очереди.\n"
+                "Дождитесь результата, прежде чем запускать новый."
+            )
+            return
+        
+        # Файл и отбор строк фиксируются при постановке в очередь - пока отчет
+        # ждет и создается, пользователь может изменить настройки для следующего
+        supplier_file_path = user_supplier_files[user_id]
+        report_filter = user_report_filters.get(user_id)
         
         try:
-            supplier_file_path = user_supplier_files[user_id]
+            # Показываем прогресс
+            progress_message = await query.edit_message_text(
+                "⏳ Начинаю обработку файла поставщика...\n"
+                "Это может занять несколько минут."
+            )
+            
+            # Задача сохраняется, чтобы продолжить ее после перезапуска бота
+            job_id = get_job_store().create_job(
+                user_id, progress_message.chat_id, supplier_file_path, report_filter
+            )
+            await self.run_stored_report_job(progress_message, user_id, job, job_id,
+                                             supplier_file_path, report_filter)
+        finally:
+            await self.report_queue.release(job)
+
+    async def resume_interrupted_jobs(self):
+        """Продолжение задач, прерванных перезапуском бота"""
+        get_job_store().prune_finished_jobs()
+        for stored_job in get_job_store().incomplete_jobs():
+            user_id = stored_job['user_id']
+            job = self.report_queue.enqueue(user_id, self.get_report_job_slots())
+            if job is None:
+                continue
+            
+            user_supplier_files[user_id] = stored_job['supplier_file']
+            if stored_job['report_filter']:
+                user_report_filters[user_id] = stored_job['report_filter']
+            logger.info(f"Продолжаем задачу {stored_job['job_id']} пользователя {user_id}")
+            self.application.create_task(self.resume_report(stored_job, job))
+
+    async def resume_report(self, stored_job, job):
+        """Продолжение одной сохраненной задачи"""
+        user_id = stored_job['user_id']
+        try:
+            # Счетчик увеличивается до запуска: если задача снова уронит бот,
+            # следующий запуск это учтет
+            resume_count = get_job_store().increment_resume_count(stored_job['job_id'])
+            if resume_count > config.JOB_MAX_RESUMES:
+                logger.error(f"Задача {stored_job['job_id']} прерывалась перезапуском {resume_count - 1} раз, "
+                             f"больше не продолжаем")
+                get_job_store().set_job_status(stored_job['job_id'], JOB_FAILED)
+                await self.application.bot.send_message(
+                    chat_id=stored_job['chat_id'],
+                    text="❌ Не удалось создать отчёт: бот несколько раз перезапускался во время его обработки.\n\n"
+                         "Попробуйте разделить файл поставщика на части и загрузить их по очереди.",
+                    reply_markup=self.get_main_keyboard(user_id)
+                )
+                return
             
+            progress_message = await self.application.bot.send_message(
+                chat_id=stored_job['chat_id'],
+                text="🔄 Бот был перезапущен во время создания вашего отчёта.\n"
+                     "Продолжаю с места остановки - уже полученные данные TradeWatch "
+                     "повторно не запрашиваются."
+            )
+            await self.run_stored_report_job(progress_message, user_id, job, stored_job['job_id'],
+                                             stored_job['supplier_file'], stored_job['report_filter'])
+        except Exception as e:
+            logger.error(f"Не удалось продолжить задачу {stored_job['job_id']}: {e}")
+            get_job_store().set_job_status(stored_job['job_id'], JOB_FAILED)
+        finally:
+            await self.report_queue.release(job)
+
+    async def run_stored_report_job(self, progress_message, user_id: int, job, job_id: str,
+                                    supplier_file_path: str, report_filter: str = None):
+        """
+        Создание отчёта с отметкой статуса в хранилище задач. Если бот
+        остановится во время работы, задача останется незавершенной и
+        продолжится после запуска
+        """
+        try:
+            await self.run_report_job(progress_message, user_id, job, job_id, supplier_file_path, report_filter)
+        except Exception:
+            get_job_store().set_job_status(job_id, JOB_FAILED)
+            raise
+        get_job_store().set_job_status(job_id, JOB_DONE)
+
+    async def run_report_job(self, progress_message, user_id: int, job, job_id: str,
+                             supplier_file_path: str, report_filter: str = None):
+        """Создание отчёта с автоматическим получением данных TradeWatch"""
+        try:
             # Проверяем, что файл существует
             if not os.path.exists(supplier_file_path):
                 await progress_message.edit_text(
@@ -509,11 +738,10 @@ class TelegramBot:
             
             # Подсчитываем количество EAN кодов для таймера
             try:
-                df = pd.read_excel(supplier_file_path)
-                if 'GTIN' in df.columns:
-                    ean_codes = df['GTIN'].dropna().astype(str).tolist()
-                    ean_codes = [code.strip() for code in ean_codes if code.strip() and code.strip() != 'nan']
-                    total_ean_count = len(ean_codes)
+                preparation = load_supplier_metadata(supplier_file_path)['preparation']
+                if preparation:
+                    # Считаем так же, как обработка: уникальные корректные коды
+                    total_ean_count = len(preparation['ean_codes'])
                 else:
                     total_ean_count = 0
             except Exception as e:
@@ -524,6 +752,17 @@ class TelegramBot:
             user_temp_dir = TEMP_DIR / str(user_id)
             user_temp_dir.mkdir(exist_ok=True)
             
+            # Ждём свободных слотов браузеров в общей очереди
+            async def show_queue_position(position):
+                await progress_message.edit_text(
+                    f"⏳ Отчёт в очереди: позиция {position}\n"
+                    f"Сейчас создаются отчёты других пользователей, "
+                    f"обработка начнётся автоматически."
+                )
+            
+            await self.report_queue.wait_for_turn(job, on_position=show_queue_position)
+            get_job_store().set_job_status(job_id, JOB_RUNNING)
+            
             # Запускаем таймер
             timer = None
             if total_ean_count > 0:
@@ -533,7 +772,9 @@ class TelegramBot:
                     f"Запускаю таймер прогресса..."
                 )
                 
-                timer = ProcessingTimer(user_id, total_ean_count, progress_message)
+                # Оценка скорости - по последней задаче (размер групп подстраивается), иначе 600 EAN/мин
+                timer = ProcessingTimer(user_id, total_ean_count, progress_message,
+                                        estimated_rate=get_observed_rate(600))
                 active_timers[user_id] = timer
                 timer.start(asyncio.get_event_loop())
                 
@@ -541,21 +782,18 @@ class TelegramBot:
                 await asyncio.sleep(2)
             
             # Запускаем обработку в отдельном потоке, чтобы не блокировать таймер
-            import concurrent.futures
-            import threading
-            
             def run_processing():
                 return process_supplier_with_tradewatch_auto(
                     supplier_file_path, 
                     str(user_temp_dir),
-                    progress_callback=lambda processed: timer.update_progress(processed) if timer else None
+                    progress_callback=timer.update_progress if timer else None,
+                    progress_events=timer.emit if timer else None,
+                    report_filter=report_filter
                 )
             
-            # Запускаем обработку в отдельном потоке
+            # Запускаем обработку в общем пуле потоков отчетов
             loop = asyncio.get_event_loop()
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = loop.run_in_executor(executor, run_processing)
-                result = await future
+            result = await loop.run_in_executor(self.report_executor, run_processing)
             
             # Останавливаем таймер
             if timer:
@@ -597,6 +835,20 @@ class TelegramBot:
             
             await progress_message.edit_text(f"📤 Отправляю результат... (размер: {file_size_mb:.1f} MB)")
             
+            # Статистика подготовки EAN, кеша и коды, которые TradeWatch не отдал даже после повторов
+            failed_ean_codes = result.get('failed_ean_codes', [])
+            report_notes = f"\n• Не получено из TradeWatch: {len(failed_ean_codes)} EAN" if failed_ean_codes else ""
+            if result.get('invalid_ean_count') or result.get('duplicate_ean_count'):
+                report_notes = (f"\n• Пропущено EAN: дубликатов {result.get('duplicate_ean_count', 0)}, "
+                                f"с неверной контрольной цифрой {result.get('invalid_ean_count', 0)}") + report_notes
+            if result.get('filtered_out_rows'):
+                filter_label = config.REPORT_FILTERS[report_filter or config.DEFAULT_REPORT_FILTER]['label']
+                report_notes = (f"\n• Отбор строк ({filter_label}): "
+                                f"убрано {result['filtered_out_rows']}") + report_notes
+            if result.get('cache_hits'):
+                report_notes = (f"\n• Из кеша: {result['cache_hits']} EAN, "
+                                f"запрошено в TradeWatch: {result.get('cache_misses', 0)}") + report_notes
+            
             # Telegram ограничение: 50MB для документов
             if file_size_mb > 45:  # Оставляем небольшой запас
                 # Пробуем сжать файл
@@ -619,7 +871,7 @@ class TelegramBot:
                 # Отправляем сжатый файл
                 report_status = " Отчёт готов!"
                 with open(zip_file, 'rb') as f:
-                    await query.message.reply_document(
+                    await progress_message.reply_document(
                         document=f,
                         filename=zip_file.name,
                         caption=f"{report_status}\n\n"
@@ -628,6 +880,7 @@ class TelegramBot:
                                f"• Уникальных EAN: {result['unique_ean']}\n"
                                f"• Размер файла: {file_size_mb:.1f} MB\n"
                                f"• Архив: {zip_size:.1f} MB"
+                               f"{report_notes}"
                     )
             else:
                 # Отправляем файл как есть с увеличенными таймаутами
@@ -635,7 +888,7 @@ class TelegramBot:
                 try:
                     with open(output_file, 'rb') as f:
                         await asyncio.wait_for(
-                            query.message.reply_document(
+                            progress_message.reply_document(
                                 document=f,
                                 filename=os.path.basename(output_file),
                                 caption=f"{report_status}\n\n"
@@ -643,6 +896,7 @@ class TelegramBot:
                                        f"• Всего строк: {result['total_rows']}\n"
                                        f"• Уникальных EAN: {result['unique_ean']}\n"
                                        f"• Размер файла: {file_size_mb:.1f} MB"
+                                       f"{report_notes}"
                             ),
                             timeout=600  # 10 минут для загрузки больших файлов
                         )
@@ -705,6 +959,7 @@ class TelegramBot:
         # Настраиваем команды меню при запуске
         async def post_init(application):
             await self.setup_bot_commands()
+            await self.resume_interrupted_jobs()
         
         self.application.post_init = post_init
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,375 @@
+"""
+HTTP транспорт для отчета EAN Price Report (без браузера)
+
+Выполняет те же JSF запросы, что и Chrome в process_batch_in_session()
+(вход, ввод EAN кодов, "Generuj", "Eksport do XLS"), напрямую через
+requests.Session с пулом соединений и потоково пишет XLSX на диск.
+Вместо сотен МБ на Chrome требуется несколько МБ на группу.
+"""
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+from session_cache import get_session_cache
+from ean_utils import normalize_ean_series
+
+LOGIN_PATH = config.TRADEWATCH_LOGIN_PATH
+REPORT_PATH = config.TRADEWATCH_REPORT_PATH
+
+# ID кнопки "Generuj" на странице отчета
+GENERATE_BUTTON_ID = "j_idt703"
+
+# Текст ссылки экспорта в XLS
+EXPORT_LINK_TEXT = "Eksport do XLS"
+
+# Типы ответа, которые означают скачивание файла, а не HTML страницу
+SPREADSHEET_CONTENT_TYPES = ('spreadsheetml', 'ms-excel', 'octet-stream')
+
+
+class JsfForm:
+    """Поля одной HTML формы страницы JSF"""
+
+    def __init__(self, form_id, action):
+        self.form_id = form_id
+        self.action = action
+        self.fields = {}       # Скрытые и текстовые поля: name -> value
+        self.field_ids = {}    # id элемента -> name
+        self.buttons = {}      # id кнопки -> (name, value)
+        self.links = []        # (id, текст, onclick)
+
+    def find_field_name(self, element_id):
+        """Имя поля по его id (в JSF имя часто содержит префикс формы)"""
+        if element_id in self.field_ids:
+            return self.field_ids[element_id]
+        for field_id, name in self.field_ids.items():
+            if field_id.endswith(':' + element_id):
+                return name
+        return None
+
+
+class JsfPageParser(HTMLParser):
+    """Извлекает формы, поля, кнопки и ссылки из HTML страницы JSF"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms = []
+        self._form = None
+        self._textarea = None
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'form':
+            self._form = JsfForm(attrs.get('id') or attrs.get('name'), attrs.get('action', ''))
+            self.forms.append(self._form)
+            return
+
+        if self._form is None:
+            return
+
+        if tag == 'input':
+            name = attrs.get('name')
+            input_type = (attrs.get('type') or 'text').lower()
+            if not name:
+                return
+            if input_type in ('submit', 'button', 'image'):
+                self._form.buttons[attrs.get('id') or name] = (name, attrs.get('value', ''))
+            elif input_type in ('checkbox', 'radio'):
+                if 'checked' in attrs:
+                    self._form.fields[name] = attrs.get('value', 'on')
+            else:
+                self._form.fields[name] = attrs.get('value', '')
+            if attrs.get('id'):
+                self._form.field_ids[attrs['id']] = name
+
+        elif tag == 'textarea' and attrs.get('name'):
+            self._textarea = attrs['name']
+            self._form.fields[self._textarea] = ''
+            if attrs.get('id'):
+                self._form.field_ids[attrs['id']] = self._textarea
+
+        elif tag == 'button' and attrs.get('name'):
+            self._form.buttons[attrs.get('id') or attrs['name']] = (attrs['name'], attrs.get('value', ''))
+
+        elif tag == 'a':
+            self._link = [attrs.get('id'), '', attrs.get('onclick', '')]
+
+    def handle_data(self, data):
+        if self._textarea is not None:
+            self._form.fields[self._textarea] += data
+        if self._link is not None:
+            self._link[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self._form = None
+        elif tag == 'textarea':
+            self._textarea = None
+        elif tag == 'a' and self._link is not None:
+            if self._form is not None:
+                self._form.links.append((self._link[0], self._link[1].strip(), self._link[2]))
+            self._link = None
+
+
+def parse_jsf_forms(html):
+    """Возвращает список форм JsfForm со страницы"""
+    parser = JsfPageParser()
+    parser.feed(html)
+    parser.close()
+    return parser.forms
+
+
+def find_form_with_field(forms, element_id):
+    """Ищет форму, содержащую поле с указанным id или именем"""
+    for form in forms:
+        if form.find_field_name(element_id) or element_id in form.fields:
+            return form
+    return None
+
+
+def get_export_link_param(form):
+    """
+    Определяет параметр, который отправляет ссылка "Eksport do XLS"
+
+    commandLink в JSF отправляет форму с параметром {clientId: clientId},
+    clientId берем из id ссылки или из ее onclick.
+    """
+    for link_id, text, onclick in form.links:
+        if EXPORT_LINK_TEXT not in text and 'icon-excel' not in onclick:
+            continue
+        if link_id:
+            return link_id
+        match = re.search(r"['\"]([\w:]*j_idt\d+)['\"]", onclick or '')
+        if match:
+            return match.group(1)
+    return None
+
+
+class TradeWatchHttpClient:
+    """HTTP клиент отчета EAN Price Report без браузера"""
+
+    def __init__(self, base_url=None, email=None, password=None, pool_size=4, timeout=120):
+        self.base_url = (base_url or config.TRADEWATCH_HTTP_BASE_URL).rstrip('/')
+        self.email = email if email is not None else os.getenv("TRADEWATCH_EMAIL", "TRADEWATCH_EMAIL")
+        self.password = password if password is not None else os.getenv("TRADEWATCH_PASSWORD", "TRADEWATCH_PASSWORD")
+        self.timeout = timeout
+        self.logged_in = False
+
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = (
+            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+        )
+
+    def _url(self, path):
+        return self.base_url + path
+
+    def _is_login_page(self, response):
+        return LOGIN_PATH in response.url or 'j_username' in response.text
+
+    def _open_report_page(self):
+        """Открывает страницу отчета, возвращает форму с полем eansPhrase или None"""
+        response = self.session.get(self._url(REPORT_PATH), timeout=self.timeout)
+        response.raise_for_status()
+        if self._is_login_page(response):
+            return None, response
+        return find_form_with_field(parse_jsf_forms(response.text), 'eansPhrase'), response
+
+    def _restore_cached_session(self):
+        """Пробует cookies из общего кеша сессии (их же использует Selenium)"""
+        cookies = get_session_cache().load()
+        if not cookies:
+            return False
+
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'],
+                                     domain=cookie.get('domain'), path=cookie.get('path', '/'))
+
+        form, _ = self._open_report_page()
+        return form is not None
+
+    def login(self):
+        """
+        Выполняет вход: сначала по сохраненной сессии, затем через форму
+
+        Returns:
+            bool: True если вход выполнен успешно
+        """
+        if self._restore_cached_session():
+            print("🍪 HTTP: вход выполнен по сохраненной сессии")
+            self.logged_in = True
+            return True
+
+        cache = get_session_cache()
+        with cache.login_lock:
+            self.session.cookies.clear()
+            response = self.session.get(self._url(LOGIN_PATH), timeout=self.timeout)
+            response.raise_for_status()
+
+            form = find_form_with_field(parse_jsf_forms(response.text), 'j_username')
+            if form is None:
+                print("❌ HTTP: форма входа не найдена")
+                return False
+
+            data = dict(form.fields)
+            data[form.find_field_name('j_username') or 'j_username'] = self.email
+            data[form.find_field_name('j_password') or 'j_password'] = self.password
+            for name, value in form.buttons.values():
+                if name == 'btnLogin':
+                    data[name] = value
+
+            response = self.session.post(urljoin(response.url, form.action), data=data, timeout=self.timeout)
+            response.raise_for_status()
+            if self._is_login_page(response):
+                print("❌ HTTP: ошибка входа в систему")
+                return False
+
+            cache.save([
+                {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path, 'secure': bool(c.secure)}
+                for c in self.session.cookies
+            ])
+
+        print("✅ HTTP: успешный вход в систему")
+        self.logged_in = True
+        return True
+
+    def export_ean_report(self, ean_codes, output_path):
+        """
+        Генерирует отчет по EAN кодам и сохраняет XLSX
+
+        Args:
+            ean_codes: список EAN кодов (уже в 13-цифровом формате)
+            output_path: путь для сохранения файла
+
+        Returns:
+            str: путь к сохраненному файлу или None если ошибка
+        """
+        if not self.logged_in and not self.login():
+            return None
+
+        form, _ = self._open_report_page()
+        if form is None:
+            # Сессия истекла - входим заново один раз
+            print("⚠️ HTTP: сессия истекла, выполняем повторный вход")
+            get_session_cache().invalidate()
+            self.logged_in = False
+            if not self.login():
+                return None
+            form, _ = self._open_report_page()
+            if form is None:
+                print("❌ HTTP: страница отчета недоступна")
+                return None
+
+        # Шаг 1: "Generuj" - отправляем форму с EAN кодами и ViewState
+        data = dict(form.fields)
+        data[form.find_field_name('eansPhrase')] = ' '.join(ean_codes)
+        button = form.buttons.get(GENERATE_BUTTON_ID)
+        if button is None:
+            button = next((b for b_id, b in form.buttons.items() if b_id.endswith(GENERATE_BUTTON_ID)), None)
+        if button is None:
+            print("❌ HTTP: кнопка 'Generuj' не найдена")
+            return None
+        data[button[0]] = button[1]
+
+        action_url = urljoin(self._url(REPORT_PATH), form.action)
+        response = self.session.post(action_url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+
+        # Страница с результатами содержит новый ViewState и ссылку экспорта
+        forms = parse_jsf_forms(response.text)
+        export_form, export_param = None, None
+        for candidate in forms:
+            export_param = get_export_link_param(candidate)
+            if export_param:
+                export_form = candidate
+                break
+
+        if export_form is None:
+            print("❌ HTTP: ссылка 'Eksport do XLS' не найдена в результатах")
+            return None
+
+        # Шаг 2: "Eksport do XLS" - commandLink отправляет форму с параметром {clientId: clientId}
+        data = dict(export_form.fields)
+        data[export_param] = export_param
+        action_url = urljoin(response.url, export_form.action)
+
+        with self.session.post(action_url, data=data, timeout=self.timeout, stream=True) as export_response:
+            export_response.raise_for_status()
+            content_type = export_response.headers.get('Content-Type', '')
+            disposition = export_response.headers.get('Content-Disposition', '')
+            if 'attachment' not in disposition and not any(t in content_type for t in SPREADSHEET_CONTENT_TYPES):
+                print(f"❌ HTTP: экспорт вернул не файл ({content_type})")
+                return None
+
+            # Пишем во временный файл и атомарно переименовываем
+            tmp_path = output_path + '.part'
+            with open(tmp_path, 'wb') as f:
+                for chunk in export_response.iter_content(chunk_size=64 * 1024):
+                    if chunk:
+                        f.write(chunk)
+
+        os.replace(tmp_path, output_path)
+        return output_path
+
+    def close(self):
+        self.session.close()
+
+
+# Один клиент на поток: requests.Session не рассчитан на параллельные запросы
+_thread_local = threading.local()
+
+
+def get_http_client():
+    """Возвращает HTTP клиент TradeWatch для текущего потока"""
+    client = getattr(_thread_local, 'client', None)
+    if client is None:
+        client = TradeWatchHttpClient()
+        _thread_local.client = client
+    return client
+
+
+def process_batch_with_http(ean_codes_batch, download_dir, batch_number):
+    """
+    Обрабатывает группу EAN кодов через HTTP транспорт (без браузера)
+
+    Args:
+        ean_codes_batch: список EAN кодов для обработки
+        download_dir: папка для сохранения файлов
+        batch_number: номер группы для идентификации файла
+
+    Returns:
+        str: путь к скачанному файлу или None если ошибка
+    """
+    if not ean_codes_batch:
+        print("Пустая группа EAN кодов")
+        return None
+
+    # Форматируем EAN коды в 13-цифровой формат
+    formatted_ean_codes = normalize_ean_series(ean_codes_batch).dropna().tolist()
+    if not formatted_ean_codes:
+        print("Нет валидных EAN кодов после форматирования")
+        return None
+
+    os.makedirs(download_dir, exist_ok=True)
+    output_path = os.path.join(download_dir, f"TradeWatch_batch_{batch_number}.xlsx")
+
+    try:
+        print(f"🌐 HTTP: обрабатываем группу {batch_number} с {len(formatted_ean_codes)} EAN кодами")
+        result = get_http_client().export_ean_report(formatted_ean_codes, output_path)
+        if result:
+            print(f"✅ HTTP: файл для группы {batch_number} сохранен: {result} (размер: {os.path.getsize(result)} байт)")
+        return result
+    except requests.RequestException as e:
+        print(f"❌ HTTP: ошибка при обработке группы {batch_number}: {e}")
+        return None
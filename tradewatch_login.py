@@ -9,6 +9,7 @@ import time
 import os
 import glob
 import shutil
+import tempfile
 import pandas as pd
 import hashlib
 from pathlib import Path
@@ -16,11 +17,33 @@ import threading
 import concurrent.futures
 from datetime import datetime
 from selenium.webdriver.common.window import WindowTypes
+import config
+from session_cache import get_session_cache
+from batch_sizing import AdaptiveBatchSizer
+from batch_scheduler import EanBatchScheduler
+from ean_utils import print_ean_preparation, normalize_ean_series
+from supplier_artifact import load_supplier_metadata
+from ean_cache import get_ean_cache, cache_hits_frame
+from download_watcher import DownloadWatcher, is_complete_xlsx
+from batch_manifest import BatchManifest, BATCH_DONE
+from progress_bridge import emit_progress_event, EVENT_STAGE, EVENT_CACHE
+from page_waits import (
+    wait_for_login_redirect, wait_for_ean_field_ready, wait_for_ajax_idle,
+    wait_for_report_results, wait_for_export_link, wait_for_field_value, wait_telemetry
+)
 
 # TradeWatch credentials (используйте переменные окружения для Railway)
 TRADEWATCH_EMAIL = os.getenv("TRADEWATCH_EMAIL", "TRADEWATCH_EMAIL")
 TRADEWATCH_PASSWORD = os.getenv("TRADEWATCH_PASSWORD", "TRADEWATCH_PASSWORD")
 
+# Адреса страниц TradeWatch (те же, что у HTTP транспорта - см. config.py)
+TRADEWATCH_BASE_URL = config.TRADEWATCH_BASE_URL
+TRADEWATCH_LOGIN_URL = TRADEWATCH_BASE_URL + config.TRADEWATCH_LOGIN_PATH
+TRADEWATCH_REPORT_URL = config.TRADEWATCH_REPORT_URL
+
+# Префикс временных папок загрузки отдельных воркеров внутри download_dir
+WORKER_DIR_PREFIX = ".batch_"
+
 def is_hobby_plan():
     """Определяет, используется ли Railway Hobby план"""
     # Удален Hobby план - всегда возвращаем False для использования бесплатного плана
@@ -135,6 +158,169 @@ def get_chrome_service():
     print("📦 Используем WebDriver Manager для скачивания ChromeDriver")
     return Service(ChromeDriverManager().install())
 
+
+def create_chrome_driver(download_dir, headless=True):
+    """
+    Создает новый драйвер Chrome с настройками для работы с TradeWatch
+    
+    Args:
+        download_dir: папка для скачивания файлов
+        headless: запуск в headless режиме (True) или с GUI (False)
+    
+    Returns:
+        webdriver.Chrome: новый веб-драйвер
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    
+    if headless:
+        options.add_argument("--headless")
+    
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-logging")
+    options.add_argument("--disable-web-security")
+    options.add_argument("--allow-running-insecure-content")
+    
+    # 🔥 КРИТИЧЕСКИ ВАЖНО: Отключаем ВСЕ виды кеширования
+    options.add_argument("--disable-application-cache")
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_argument("--disable-features=TranslateUI")
+    options.add_argument("--disable-ipc-flooding-protection")
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--disable-default-apps")
+    options.add_argument("--disable-sync")
+    options.add_argument("--disable-translate")
+    options.add_argument("--hide-scrollbars")
+    options.add_argument("--metrics-recording-only")
+    options.add_argument("--no-first-run")
+    options.add_argument("--safebrowsing-disable-auto-update")
+    options.add_argument("--disable-plugins")
+    options.add_argument("--disable-plugins-discovery")
+    options.add_argument("--disable-preconnect")
+    
+    # Настройка для автоматической загрузки файлов
+    download_path = Path(download_dir)
+    prefs = {
+        "download.default_directory": str(download_path.absolute()),
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+    options.add_experimental_option("prefs", prefs)
+    
+    service = get_chrome_service()
+    return webdriver.Chrome(service=service, options=options)
+
+
+def login_tradewatch_with_form(driver, wait):
+    """
+    Выполняет вход в TradeWatch через форму логина
+    
+    Args:
+        driver: веб-драйвер
+        wait: объект WebDriverWait
+    
+    Returns:
+        bool: True если вход выполнен успешно
+    """
+    # Переход на страницу входа
+    driver.get(TRADEWATCH_LOGIN_URL)
+    
+    # Ищем поле для email
+    email_field = wait.until(EC.presence_of_element_located((By.NAME, "j_username")))
+    
+    # Вводим email
+    email_field.clear()
+    email_field.send_keys(TRADEWATCH_EMAIL)
+    
+    # Ищем поле для пароля
+    password_field = driver.find_element(By.NAME, "j_password")
+    
+    # Вводим пароль
+    password_field.clear()
+    password_field.send_keys(TRADEWATCH_PASSWORD)
+    
+    # Нажимаем кнопку входа
+    login_button = driver.find_element(By.NAME, "btnLogin")
+    login_button.click()
+    
+    # Ждем редиректа со страницы логина (успешный вход)
+    return wait_for_login_redirect(driver)
+
+
+def restore_tradewatch_session(driver, wait, cookies):
+    """
+    Подставляет сохраненные cookies в драйвер и проверяет, что сессия активна
+    
+    Args:
+        driver: веб-драйвер
+        wait: объект WebDriverWait
+        cookies: список cookies из кеша сессии
+    
+    Returns:
+        bool: True если сессия принята сервером (открыта страница отчета)
+    """
+    try:
+        # add_cookie работает только на странице того же домена - берем самую легкую
+        driver.get(TRADEWATCH_BASE_URL + "/favicon.ico")
+        for cookie in cookies:
+            driver.add_cookie(cookie)
+        
+        driver.get(TRADEWATCH_REPORT_URL)
+        if "login.jsf" in driver.current_url:
+            return False
+        
+        wait.until(EC.presence_of_element_located((By.ID, "eansPhrase")))
+        return True
+    except Exception as e:
+        print(f"⚠️ Сохраненная сессия не подошла: {e}")
+        return False
+
+
+def login_tradewatch(driver, wait):
+    """
+    Выполняет вход в TradeWatch, по возможности без формы логина
+    
+    Сначала пробует cookies из кеша сессии, общего для всех воркеров.
+    Вход через форму выполняет только один поток, остальные ждут
+    и используют сохраненные им cookies.
+    
+    Args:
+        driver: веб-драйвер
+        wait: объект WebDriverWait
+    
+    Returns:
+        bool: True если вход выполнен успешно
+    """
+    cache = get_session_cache()
+    
+    cookies = cache.load()
+    if cookies and restore_tradewatch_session(driver, wait, cookies):
+        print("🍪 Вход выполнен по сохраненной сессии")
+        return True
+    
+    with cache.login_lock:
+        # Пока мы ждали блокировку, другой поток мог уже войти и обновить кеш
+        fresh_cookies = cache.load()
+        if fresh_cookies and fresh_cookies != cookies and restore_tradewatch_session(driver, wait, fresh_cookies):
+            print("🍪 Вход выполнен по сессии, сохраненной другим воркером")
+            return True
+        
+        if cookies:
+            cache.invalidate(cookies)
+        
+        if not login_tradewatch_with_form(driver, wait):
+            return False
+        
+        cache.save(driver.get_cookies())
+        return True
+
+
 def clear_ean_field_thoroughly(driver, ean_field, batch_number):
     """
     КРИТИЧЕСКИ ВАЖНО: Тщательно очищает поле EAN кодов несколькими способами
@@ -150,38 +336,34 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
     initial_value = ean_field.get_attribute("value")
     print(f"Изначальное содержимое поля: '{initial_value}'")
     
+    # Все способы ниже синхронные (WebDriver ждет выполнения команды),
+    # поэтому пауз между ними не нужно - результат проверяется в конце
+    
     # Сначала убеждаемся, что поле в фокусе
     try:
         ean_field.click()
-        time.sleep(0.3)
     except:
         pass
     
     # СПОСОБ 1: Стандартная очистка (может не работать)
     ean_field.clear()
-    time.sleep(0.2)
     
     # СПОСОБ 2: Выделяем все и удаляем (может не работать)
     try:
         ean_field.send_keys(Keys.CONTROL + "a")
-        time.sleep(0.1)
         ean_field.send_keys(Keys.DELETE)
-        time.sleep(0.2)
     except:
         pass
     
     # СПОСОБ 3: Альтернативная очистка клавишами
     try:
         ean_field.send_keys(Keys.CONTROL + "a")
-        time.sleep(0.1)
         ean_field.send_keys(Keys.BACKSPACE)
-        time.sleep(0.2)
     except:
         pass
     
     # СПОСОБ 4: JavaScript очистка (основной метод)
     driver.execute_script("arguments[0].value = '';", ean_field)
-    time.sleep(0.2)
     
     # СПОСОБ 5: Более агрессивная JavaScript очистка
     driver.execute_script("""
@@ -192,7 +374,6 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
         element.innerText = '';
         if (element.defaultValue) element.defaultValue = '';
     """, ean_field)
-    time.sleep(0.2)
     
     # СПОСОБ 6: Эмуляция очистки через JavaScript события
     driver.execute_script("""
@@ -205,7 +386,6 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
         element.dispatchEvent(new Event('keydown', { bubbles: true }));
         element.dispatchEvent(new Event('keyup', { bubbles: true }));
     """, ean_field)
-    time.sleep(0.3)
     
     # СПОСОБ 7: Удаление через execCommand
     driver.execute_script("""
@@ -216,7 +396,6 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
         document.execCommand('delete');
         document.execCommand('removeFormat');
     """, ean_field)
-    time.sleep(0.2)
     
     # СПОСОБ 8: Принудительная замена содержимого
     driver.execute_script("""
@@ -225,7 +404,6 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
         element.removeAttribute('defaultValue');
         if (element.value) element.value = '';
     """, ean_field)
-    time.sleep(0.3)
     
     # КРИТИЧЕСКАЯ ПРОВЕРКА: Проверяем, что поле действительно очищено
     for attempt in range(3):
@@ -274,7 +452,9 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
                 element.dispatchEvent(new Event('input', { bubbles: true }));
                 element.dispatchEvent(new Event('change', { bubbles: true }));
             """, ean_field)
-            time.sleep(0.5)
+            
+            # Ждем, пока поле действительно опустеет (события input/change могут его менять)
+            wait_for_field_value(driver, ean_field, lambda value: not value.strip(), step='field_cleared')
             
             # Если все еще не очищено, принудительно заменяем элемент
             if attempt == 2:
@@ -283,13 +463,73 @@ def clear_ean_field_thoroughly(driver, ean_field, batch_number):
                     print(f"🔥 КРИТИЧЕСКАЯ ОШИБКА: Поле не удается очистить! Содержимое: '{final_value}'")
                     print("Выполняем принудительную перезагрузку страницы...")
                     driver.refresh()
-                    time.sleep(3)
+                    wait_for_ean_field_ready(driver)
                     return False
     
     print(f"✅ Агрессивная очистка завершена для группы {batch_number}")
     return True
 
 
+# Заполнение поля EAN кодов за один вызов: нативный setter value (его не
+# перехватывают обертки PrimeFaces/фреймворков) + события input/change
+FILL_EAN_FIELD_SCRIPT = """
+var element = arguments[0];
+var text = arguments[1];
+var setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(element), 'value').set;
+element.focus();
+setter.call(element, text);
+element.dispatchEvent(new Event('input', { bubbles: true }));
+element.dispatchEvent(new Event('change', { bubbles: true }));
+element.blur();
+return element.value;
+"""
+
+
+def ean_codes_match(field_value, ean_codes_string):
+    """
+    Проверяет, что в поле ровно тот же набор EAN кодов, что ожидался
+    (сравнение множеств: нет ни пропущенных, ни посторонних кодов)
+    """
+    inserted_codes = set((field_value or "").split())
+    expected_codes = set(ean_codes_string.split())
+    return inserted_codes == expected_codes
+
+
+def fill_ean_field_fast(driver, ean_field, ean_codes_string):
+    """
+    Записывает EAN коды в поле одним execute_script вместо посимвольного send_keys
+    
+    Returns:
+        str: значение поля после записи
+    """
+    return driver.execute_script(FILL_EAN_FIELD_SCRIPT, ean_field, ean_codes_string)
+
+
+def populate_ean_field(driver, ean_field, ean_codes_string, batch_number):
+    """
+    Заполняет поле EAN кодов и проверяет, что в нем ровно коды группы
+    
+    Сначала быстрая запись через JavaScript. Медленные способы
+    (clear_ean_field_thoroughly + insert_ean_codes_safely) используются
+    только если набор кодов в поле не совпал с ожидаемым.
+    
+    Returns:
+        bool: True если в поле ровно коды группы
+    """
+    started_at = time.time()
+    field_value = fill_ean_field_fast(driver, ean_field, ean_codes_string)
+    if ean_codes_match(field_value, ean_codes_string):
+        print(f"✅ Вставлено {len(ean_codes_string.split())} EAN кодов для группы {batch_number} "
+              f"за {time.time() - started_at:.2f} сек")
+        return True
+    
+    print(f"⚠️ Быстрая вставка для группы {batch_number} дала другой набор кодов, используем медленные способы...")
+    if not clear_ean_field_thoroughly(driver, ean_field, batch_number):
+        return False
+    
+    return insert_ean_codes_safely(driver, ean_field, ean_codes_string, batch_number)
+
+
 def insert_ean_codes_safely(driver, ean_field, ean_codes_string, batch_number):
     """
     Безопасно вставляет EAN коды с проверкой результата
@@ -347,22 +587,19 @@ def insert_ean_codes_safely(driver, ean_field, ean_codes_string, batch_number):
             if not inserted_value or len(inserted_value.strip()) == 0:
                 return False
     
-    # Проверяем соответствие количества кодов
+    # Проверяем, что в поле ровно коды группы
     inserted_codes = inserted_value.strip().split()
     expected_codes = ean_codes_string.strip().split()
     
-    if len(inserted_codes) != len(expected_codes):
-        print(f"Предупреждение: количество вставленных кодов ({len(inserted_codes)}) не совпадает с ожидаемым ({len(expected_codes)})")
-        print(f"Ожидались: {expected_codes[:5]}...")
-        print(f"Вставлены: {inserted_codes[:5]}...")
-        
-        # Проверяем, что хотя бы половина кодов вставилась
-        if len(inserted_codes) < len(expected_codes) * 0.5:
-            print(f"Критическая ошибка: вставлено менее половины кодов!")
-            return False
-    else:
-        print(f"✅ Вставлено {len(inserted_codes)} EAN кодов для группы {batch_number}")
+    if not ean_codes_match(inserted_value, ean_codes_string):
+        missing_codes = set(expected_codes) - set(inserted_codes)
+        extra_codes = set(inserted_codes) - set(expected_codes)
+        print(f"Критическая ошибка: набор кодов в поле не совпадает с ожидаемым для группы {batch_number}")
+        print(f"Не хватает: {sorted(missing_codes)[:5]}... ({len(missing_codes)} шт.)")
+        print(f"Посторонние: {sorted(extra_codes)[:5]}... ({len(extra_codes)} шт.)")
+        return False
     
+    print(f"✅ Вставлено {len(inserted_codes)} EAN кодов для группы {batch_number}")
     return True
 
 
@@ -414,56 +651,29 @@ def verify_batch_uniqueness(downloaded_files):
         return True
 
 
-def format_ean_to_13_digits(ean_code):
+def wait_for_tradewatch_download(watcher, batch_number, max_wait_time=60):
     """
-    Форматирует EAN код в стандартный 13-цифровой формат
+    Ждет, пока Chrome завершит загрузку экспорта TradeWatch
     
     Args:
-        ean_code: EAN код (строка или число)
+        watcher: DownloadWatcher, созданный до клика по кнопке экспорта
+        batch_number: номер группы (для логов)
+        max_wait_time: максимальное время ожидания (в секундах)
         
     Returns:
-        str: EAN код в 13-цифровом формате с ведущими нулями
-        
-    Пример:
-        format_ean_to_13_digits("123456789") -> "0000123456789"
-        format_ean_to_13_digits("1234567890123") -> "1234567890123"
+        str: путь к загруженному файлу или None
     """
+    started_at = time.time()
     try:
-        # Конвертируем в строку и удаляем пробелы
-        ean_str = str(ean_code).strip()
-        
-        # Если получилось пустое значение, возвращаем None
-        if not ean_str:
-            return None
-        
-        # Особая обработка для научной нотации
-        if 'E' in ean_str.upper() or 'e' in ean_str:
-            try:
-                # Конвертируем через float для обработки научной нотации
-                ean_float = float(ean_str)
-                ean_str = str(int(ean_float))
-            except:
-                pass
-        
-        # Удаляем все нечисловые символы
-        ean_digits = ''.join(char for char in ean_str if char.isdigit())
-        
-        # Если получилось пустое значение, возвращаем None
-        if not ean_digits:
-            return None
-            
-        # Обрезаем до 13 цифр если больше
-        if len(ean_digits) > 13:
-            ean_digits = ean_digits[:13]
-            
-        # Дополняем ведущими нулями до 13 цифр
-        ean_formatted = ean_digits.zfill(13)
-        
-        return ean_formatted
-        
-    except Exception as e:
-        print(f"Ошибка при форматировании EAN кода '{ean_code}': {e}")
-        return None
+        latest_file = watcher.wait(max_wait_time)
+    finally:
+        watcher.close()
+    
+    if latest_file:
+        print(f"Файл для группы {batch_number} загружен за {time.time() - started_at:.1f} сек: "
+              f"{latest_file} (размер: {os.path.getsize(latest_file)} байт)")
+    return latest_file
+
 
 def process_ean_codes_batch(ean_codes_batch, download_dir, batch_number=1, headless=True):
     """
@@ -539,59 +749,29 @@ def process_ean_codes_batch(ean_codes_batch, download_dir, batch_number=1, headl
     try:
         print(f"Обработка группы {batch_number} с {len(ean_codes_batch)} EAN кодами...")
         
-        # Переход на страницу входа
-        driver.get("https://tradewatch.pl/login.jsf")
-        
         # Ждем загрузки страницы
         wait = WebDriverWait(driver, 10)
         
-        # Ищем поле для email
-        email_field = wait.until(EC.presence_of_element_located((By.NAME, "j_username")))
-        
-        # Вводим email
-        email_field.clear()
-        email_field.send_keys(TRADEWATCH_EMAIL)
-        
-        # Ищем поле для пароля
-        password_field = driver.find_element(By.NAME, "j_password")
-        
-        # Вводим пароль
-        password_field.clear()
-        password_field.send_keys(TRADEWATCH_PASSWORD)
-        
-        # Ищем кнопку входа
-        login_button = driver.find_element(By.NAME, "btnLogin")
-        
-        # Нажимаем кнопку входа
-        login_button.click()
-        
-        # Ждем немного после входа
-        time.sleep(3)
-        
-        # Проверяем успешность входа
-        current_url = driver.current_url
-        
-        if "login.jsf" not in current_url:
+        # Вход в систему (по сохраненной сессии или через форму)
+        if login_tradewatch(driver, wait):
             print("Успешный вход в систему!")
             
-            # Переходим на страницу EAN Price Report
-            driver.get("https://tradewatch.pl/report/ean-price-report.jsf")
-            time.sleep(3)
+            # Переходим на страницу EAN Price Report (если вход не открыл ее сам)
+            if TRADEWATCH_REPORT_URL not in driver.current_url:
+                driver.get(TRADEWATCH_REPORT_URL)
+                wait_for_ean_field_ready(driver)
             
             try:
                 # Ищем поле для ввода EAN кодов
                 ean_field = wait.until(EC.presence_of_element_located((By.ID, "eansPhrase")))
                 
-                # Тщательно очищаем поле
-                clear_ean_field_thoroughly(driver, ean_field, batch_number)
-                
-                # Безопасно вставляем EAN коды
-                if not insert_ean_codes_safely(driver, ean_field, ean_codes_string, batch_number):
+                # Заполняем поле (медленные способы - только при несовпадении)
+                if not populate_ean_field(driver, ean_field, ean_codes_string, batch_number):
                     print(f"Ошибка: не удалось вставить EAN коды для группы {batch_number}")
                     return None
                 
-                # Ждем немного
-                time.sleep(1)
+                # Ждем, пока отработают AJAX обработчики поля
+                wait_for_ajax_idle(driver)
                 
                 # Ищем кнопку "Generuj"
                 generate_button = driver.find_element(By.ID, "j_idt703")
@@ -599,60 +779,28 @@ def process_ean_codes_batch(ean_codes_batch, download_dir, batch_number=1, headl
                 # Нажимаем кнопку
                 generate_button.click()
                 
-                # Ждем обработки
-                print("Ждем обработки запроса...")
-                time.sleep(5)
-                
-                # Ждем появления результатов
+                # Ждем появления результатов (завершение AJAX запроса и таблица результатов)
                 print("Ждем появления результатов...")
-                time.sleep(5)  # Увеличиваем время ожидания результатов
+                if not wait_for_report_results(driver):
+                    print(f"Результаты для группы {batch_number} не появились, пробуем экспорт")
                 
                 # Ищем кнопку "Eksport do XLS"
                 try:
-                    export_button = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Eksport do XLS")))
+                    export_button = wait_for_export_link(driver)
+                    if export_button is None:
+                        raise Exception("Ссылка 'Eksport do XLS' не стала кликабельной")
+                    
+                    # Следим за папкой загрузок до клика, чтобы не пропустить файл
+                    watcher = DownloadWatcher(download_dir)
                     
                     # Нажимаем кнопку экспорта
                     export_button.click()
                     
-                    # Ждем начала загрузки файла
+                    # Ждем завершения загрузки файла
                     print("Ждем загрузки файла...")
-                    
-                    # Ждем появления файла с проверкой каждые 2 секунды
-                    max_wait_time = 60  # Максимальное время ожидания 60 секунд
-                    wait_interval = 2   # Проверяем каждые 2 секунды
-                    waited_time = 0
-                    
-                    downloaded_file_found = False
-                    
-                    while waited_time < max_wait_time:
-                        time.sleep(wait_interval)
-                        waited_time += wait_interval
-                        
-                        # Ищем скачанный файл (только оригинальное имя)
-                        downloaded_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji.xlsx"))
-                        if downloaded_files:
-                            # Проверяем, что файл полностью скачался (не изменяется в размере)
-                            latest_file = downloaded_files[0]  # Берем первый (и единственный) файл
-                            
-                            # Ждем немного и проверяем, что размер файла не изменился
-                            initial_size = os.path.getsize(latest_file)
-                            time.sleep(3)  # Ждем 3 секунды
-                            
-                            try:
-                                final_size = os.path.getsize(latest_file)
-                                if initial_size == final_size and final_size > 0:
-                                    # Файл стабильного размера, значит скачивание завершено
-                                    print(f"Файл для группы {batch_number} загружен: {latest_file} (размер: {final_size} байт)")
-                                    downloaded_file_found = True
-                                    break
-                                else:
-                                    print(f"Файл еще скачивается... (размер: {final_size} байт)")
-                            except:
-                                # Файл может быть заблокирован, продолжаем ждать
-                                print(f"Файл заблокирован, продолжаем ждать...")
-                                continue
-                        else:
-                            print(f"Ожидание файла... ({waited_time}/{max_wait_time} сек)")
+                    max_wait_time = 60
+                    latest_file = wait_for_tradewatch_download(watcher, batch_number, max_wait_time)
+                    downloaded_file_found = latest_file is not None
                     
                     if downloaded_file_found:
                         # Переименовываем файл для идентификации
@@ -673,40 +821,20 @@ def process_ean_codes_batch(ean_codes_batch, download_dir, batch_number=1, headl
                     # Попробуем альтернативный способ
                     try:
                         export_button = driver.find_element(By.CSS_SELECTOR, "a.icon-excel")
+                        watcher = DownloadWatcher(download_dir)
                         export_button.click()
                         
-                        # Ждем с проверкой завершения скачивания
-                        max_wait_time = 60
-                        wait_interval = 2
-                        waited_time = 0
-                        
-                        while waited_time < max_wait_time:
-                            time.sleep(wait_interval)
-                            waited_time += wait_interval
+                        # Ждем завершения загрузки файла
+                        latest_file = wait_for_tradewatch_download(watcher, batch_number)
+                        if latest_file:
+                            new_filename = f"TradeWatch_batch_{batch_number}.xlsx"
+                            new_filepath = os.path.join(download_dir, new_filename)
+                            
+                            if os.path.exists(new_filepath):
+                                os.remove(new_filepath)
                             
-                            downloaded_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji.xlsx"))
-                            if downloaded_files:
-                                latest_file = downloaded_files[0]
-                                
-                                # Проверяем стабильность размера файла
-                                initial_size = os.path.getsize(latest_file)
-                                time.sleep(3)
-                                
-                                try:
-                                    final_size = os.path.getsize(latest_file)
-                                    if initial_size == final_size and final_size > 0:
-                                        new_filename = f"TradeWatch_batch_{batch_number}.xlsx"
-                                        new_filepath = os.path.join(download_dir, new_filename)
-                                        
-                                        if os.path.exists(new_filepath):
-                                            os.remove(new_filepath)
-                                        
-                                        os.rename(latest_file, new_filepath)
-                                        return new_filepath
-                                except:
-                                    continue
-                            else:
-                                print(f"Альтернативный способ: ожидание файла... ({waited_time}/{max_wait_time} сек)")
+                            os.rename(latest_file, new_filepath)
+                            return new_filepath
                         
                         return None
                     except Exception as alt_error:
@@ -736,11 +864,12 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
     Args:
         driver: активный веб-драйвер
         ean_codes_batch: список EAN кодов для обработки
-        download_dir: папка для скачивания файлов
+        download_dir: папка для скачивания файлов (папка воркера группы)
         batch_number: номер группы для идентификации файла
     
     Returns:
-        str: путь к скачанному файлу или None если ошибка
+        str: путь к скачанному файлу в download_dir (как его назвал браузер)
+            или None если ошибка; в общую папку файл переносит publish_batch_file
     """
     if not ean_codes_batch:
         print("Пустая группа EAN кодов")
@@ -748,11 +877,7 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
     
     try:
         # Форматируем EAN коды в 13-цифровой формат
-        formatted_ean_codes = []
-        for code in ean_codes_batch:
-            formatted_code = format_ean_to_13_digits(code)
-            if formatted_code:
-                formatted_ean_codes.append(formatted_code)
+        formatted_ean_codes = normalize_ean_series(ean_codes_batch).dropna().tolist()
         
         if not formatted_ean_codes:
             print("Нет валидных EAN кодов после форматирования")
@@ -773,11 +898,10 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
         
         # Переходим на пустую страницу для полного сброса
         driver.get("about:blank")
-        time.sleep(1)
         
         # Переходим на страницу EAN Price Report заново
-        driver.get("https://tradewatch.pl/report/ean-price-report.jsf")
-        time.sleep(3)  # Увеличиваем время ожидания после полного сброса
+        driver.get(TRADEWATCH_REPORT_URL)
+        wait_for_ean_field_ready(driver)
         
         wait = WebDriverWait(driver, 15)  # Увеличиваем время ожидания
         
@@ -791,43 +915,24 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
             
             # Принудительная очистка всей страницы
             driver.refresh()
-            time.sleep(3)
+            wait_for_ean_field_ready(driver)
             ean_field = wait.until(EC.presence_of_element_located((By.ID, "eansPhrase")))
         
-        # Тщательно очищаем поле
-        if not clear_ean_field_thoroughly(driver, ean_field, batch_number):
-            print(f"Критическая ошибка: не удалось очистить поле для группы {batch_number}")
-            return None
-        
-        # Безопасно вставляем EAN коды
-        if not insert_ean_codes_safely(driver, ean_field, ean_codes_string, batch_number):
-            print(f"Ошибка: не удалось вставить EAN коды для группы {batch_number}")
-            return None
-        
-        # КРИТИЧЕСКИ ВАЖНО: Проверяем, что в поле только наши коды
-        final_value = ean_field.get_attribute("value")
-        final_codes = final_value.strip().split() if final_value else []
-        expected_codes = ean_codes_string.strip().split()
-        
-        # Проверяем на наличие посторонних кодов
-        extra_codes = [code for code in final_codes if code not in expected_codes]
-        if extra_codes:
-            print(f"КРИТИЧЕСКАЯ ОШИБКА: Обнаружены посторонние коды в поле: {extra_codes}")
-            print(f"Ожидались только: {expected_codes}")
-            print(f"Найдено в поле: {final_codes}")
+        # Заполняем поле (медленные способы - только при несовпадении набора кодов)
+        if not populate_ean_field(driver, ean_field, ean_codes_string, batch_number):
+            print(f"КРИТИЧЕСКАЯ ОШИБКА: в поле не ровно коды группы {batch_number}, перезагружаем страницу")
             
             # Принудительная перезагрузка и повторная попытка
             driver.refresh()
-            time.sleep(3)
+            wait_for_ean_field_ready(driver)
             ean_field = wait.until(EC.presence_of_element_located((By.ID, "eansPhrase")))
-            clear_ean_field_thoroughly(driver, ean_field, batch_number)
             
-            if not insert_ean_codes_safely(driver, ean_field, ean_codes_string, batch_number):
+            if not populate_ean_field(driver, ean_field, ean_codes_string, batch_number):
                 print(f"Повторная попытка также не удалась для группы {batch_number}")
                 return None
         
-        # Ждем немного
-        time.sleep(1)
+        # Ждем, пока отработают AJAX обработчики поля
+        wait_for_ajax_idle(driver)
         
         # Ищем кнопку "Generuj"
         generate_button = driver.find_element(By.ID, "j_idt703")
@@ -835,17 +940,19 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
         # Нажимаем кнопку
         generate_button.click()
         
-        # Ждем обработки
-        print("Ждем обработки запроса...")
-        time.sleep(5)
-        
-        # Ждем появления результатов
+        # Ждем появления результатов (завершение AJAX запроса и таблица результатов)
         print("Ждем появления результатов...")
-        time.sleep(3)
+        if not wait_for_report_results(driver):
+            print(f"Результаты для группы {batch_number} не появились, пробуем экспорт")
+        
+        # Следим за папкой загрузок до клика, чтобы не пропустить файл
+        watcher = DownloadWatcher(download_dir)
         
         # Ищем кнопку "Eksport do XLS"
         try:
-            export_button = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Eksport do XLS")))
+            export_button = wait_for_export_link(driver)
+            if export_button is None:
+                raise Exception("Ссылка 'Eksport do XLS' не стала кликабельной")
             
             # Пытаемся кликнуть разными способами
             click_success = False
@@ -896,75 +1003,15 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
                 raise Exception("Не удалось кликнуть по кнопке экспорта")
             
             # Если клик успешен, ждем скачивания
-            # Ждем появления файла с проверкой каждые 2 секунды
             print("Ждем загрузки файла...")
             max_wait_time = 60
-            wait_interval = 2
-            waited_time = 0
-            
-            downloaded_file_found = False
+            latest_file = wait_for_tradewatch_download(watcher, batch_number, max_wait_time)
             
-            while waited_time < max_wait_time:
-                time.sleep(wait_interval)
-                waited_time += wait_interval
-                
-                # Ищем скачанный файл (только оригинальное имя)
-                downloaded_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji.xlsx"))
-                if downloaded_files:
-                    # Проверяем, что файл полностью скачался
-                    latest_file = downloaded_files[0]
-                    
-                    # Ждем немного и проверяем, что размер файла не изменился
-                    initial_size = os.path.getsize(latest_file)
-                    time.sleep(3)
-                    
-                    try:
-                        final_size = os.path.getsize(latest_file)
-                        if initial_size == final_size and final_size > 0:
-                            print(f"Файл для группы {batch_number} загружен: {latest_file} (размер: {final_size} байт)")
-                            downloaded_file_found = True
-                            break
-                        else:
-                            print(f"Файл еще скачивается... (размер: {final_size} байт)")
-                    except:
-                        print(f"Файл заблокирован, продолжаем ждать...")
-                        continue
-                else:
-                    print(f"Ожидание файла... ({waited_time}/{max_wait_time} сек)")
-            
-            if downloaded_file_found:
-                # Переименовываем файл для идентификации
-                new_filename = f"TradeWatch_batch_{batch_number}.xlsx"
-                new_filepath = os.path.join(download_dir, new_filename)
-                
-                # Проверяем, что новый файл действительно отличается от существующего
-                if os.path.exists(new_filepath):
-                    try:
-                        existing_size = os.path.getsize(new_filepath)
-                        new_size = os.path.getsize(latest_file)
-                        
-                        if existing_size == new_size:
-                            print(f"Файл {new_filepath} уже существует с таким же размером ({existing_size} байт), пропускаем...")
-                            # Удаляем загруженный файл, так как он дублирует существующий
-                            os.remove(latest_file)
-                            return new_filepath
-                        else:
-                            print(f"Существующий файл {new_filepath} имеет другой размер ({existing_size} vs {new_size} байт), заменяем...")
-                            os.remove(new_filepath)
-                    except Exception as rm_e:
-                        print(f"Не удалось удалить существующий файл {new_filepath}: {rm_e}")
-                
-                # Переименовываем файл
-                try:
-                    os.rename(latest_file, new_filepath)
-                    print(f"Файл переименован: {latest_file} -> {new_filepath}")
-                    return new_filepath
-                except Exception as rename_e:
-                    print(f"Ошибка при переименовании файла: {rename_e}")
-                    return None
-            else:
-                print(f"Файл для группы {batch_number} не найден после {max_wait_time} секунд ожидания")
-                return None
+            if latest_file:
+                # Имя TradeWatch_batch_N.xlsx файлу дает вызывающий код (publish_batch_file)
+                return latest_file
+            print(f"Файл для группы {batch_number} не найден после {max_wait_time} секунд ожидания")
+            return None
                 
         except Exception as export_error:
             print(f"Ошибка при экспорте группы {batch_number}: {export_error}")
@@ -1012,66 +1059,7 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
                     
                 # Если альтернативный метод сработал, ждем файл
                 print("Ждем загрузки файла...")
-                max_wait_time = 60
-                wait_interval = 2
-                waited_time = 0
-                
-                downloaded_file_found = False
-                
-                while waited_time < max_wait_time:
-                    time.sleep(wait_interval)
-                    waited_time += wait_interval
-                    
-                    # Ищем скачанный файл
-                    downloaded_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji.xlsx"))
-                    if downloaded_files:
-                        latest_file = downloaded_files[0]
-                        
-                        initial_size = os.path.getsize(latest_file)
-                        time.sleep(3)
-                        
-                        try:
-                            final_size = os.path.getsize(latest_file)
-                            if initial_size == final_size and final_size > 0:
-                                print(f"Файл для группы {batch_number} загружен: {latest_file} (размер: {final_size} байт)")
-                                downloaded_file_found = True
-                                break
-                        except:
-                            continue
-                    else:
-                        print(f"Ожидание файла... ({waited_time}/{max_wait_time} сек)")
-                
-                if downloaded_file_found:
-                    new_filename = f"TradeWatch_batch_{batch_number}.xlsx"
-                    new_filepath = os.path.join(download_dir, new_filename)
-                    
-                    # Проверяем, что новый файл действительно отличается от существующего
-                    if os.path.exists(new_filepath):
-                        try:
-                            existing_size = os.path.getsize(new_filepath)
-                            new_size = os.path.getsize(latest_file)
-                            
-                            if existing_size == new_size:
-                                print(f"Файл {new_filepath} уже существует с таким же размером ({existing_size} байт), пропускаем...")
-                                # Удаляем загруженный файл, так как он дублирует существующий
-                                os.remove(latest_file)
-                                return new_filepath
-                            else:
-                                print(f"Существующий файл {new_filepath} имеет другой размер ({existing_size} vs {new_size} байт), заменяем...")
-                                os.remove(new_filepath)
-                        except Exception as rm_e:
-                            print(f"Не удалось удалить существующий файл {new_filepath}: {rm_e}")
-                    
-                    # Переименовываем файл
-                    try:
-                        os.rename(latest_file, new_filepath)
-                        print(f"Файл переименован: {latest_file} -> {new_filepath}")
-                        return new_filepath
-                    except Exception as rename_e:
-                        print(f"Ошибка при переименовании файла: {rename_e}")
-                        return None
-                else:
-                    return None
+                return wait_for_tradewatch_download(watcher, batch_number)
                     
             except Exception as alt_error:
                 print(f"Альтернативный метод тоже не сработал для группы {batch_number}: {alt_error}")
@@ -1082,24 +1070,147 @@ def process_batch_in_session(driver, ean_codes_batch, download_dir, batch_number
         return None
 
 
-def process_batches_sequential(batches, download_dir, headless, progress_callback):
+def get_tradewatch_transport():
+    """
+    Получить транспорт для запросов к TradeWatch: "selenium" или "http"
+    """
+    return os.getenv("TRADEWATCH_TRANSPORT", config.TRADEWATCH_TRANSPORT).lower()
+
+
+def create_worker_download_dir(download_dir, batch_number):
+    """
+    Создает отдельную папку загрузок для одной группы
+    
+    Каждый воркер (новый браузер, сессия пула или HTTP клиент) скачивает
+    экспорт в свою папку, поэтому параллельные группы не могут забрать
+    чужой "TradeWatch - raport konkurencji.xlsx".
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{WORKER_DIR_PREFIX}{batch_number}_", dir=download_dir)
+
+
+def publish_batch_file(file_path, download_dir, batch_number):
+    """
+    Атомарно переносит файл группы из папки воркера в общую папку
+    под именем TradeWatch_batch_{batch_number}.xlsx
+    
+    Returns:
+        str: итоговый путь к файлу группы
+    """
+    final_path = os.path.join(download_dir, f"TradeWatch_batch_{batch_number}.xlsx")
+    # Папка воркера лежит внутри download_dir - os.replace атомарен (одна ФС)
+    os.replace(file_path, final_path)
+    return final_path
+
+
+def cleanup_worker_download_dirs(download_dir):
+    """Удаляет папки воркеров, оставшиеся от прерванных запусков"""
+    for worker_dir in glob.glob(os.path.join(download_dir, f"{WORKER_DIR_PREFIX}*")):
+        shutil.rmtree(worker_dir, ignore_errors=True)
+
+
+def process_batch(ean_codes_batch, download_dir, batch_number, headless=True):
+    """
+    Обрабатывает одну группу EAN кодов выбранным транспортом
+    
+    - http: прямые JSF запросы без браузера
+    - selenium + пул: "теплая" сессия из пула браузеров
+    - selenium без пула: новый браузер на каждую группу
+    
+    Файл скачивается в отдельную папку воркера и затем атомарно
+    переносится в download_dir как TradeWatch_batch_{batch_number}.xlsx.
+    
+    Returns:
+        str: путь к скачанному файлу или None если ошибка
+    """
+    worker_dir = create_worker_download_dir(download_dir, batch_number)
+    try:
+        result = _process_batch_with_transport(ean_codes_batch, worker_dir, batch_number, headless)
+        if not result:
+            return None
+        
+        final_path = publish_batch_file(result, download_dir, batch_number)
+        print(f"📁 Файл группы {batch_number} перенесен: {final_path}")
+        return final_path
+    except Exception as e:
+        print(f"❌ Не удалось сохранить файл группы {batch_number}: {e}")
+        return None
+    finally:
+        shutil.rmtree(worker_dir, ignore_errors=True)
+
+
+def _process_batch_with_transport(ean_codes_batch, download_dir, batch_number, headless):
+    if get_tradewatch_transport() == "http":
+        from tradewatch_http import process_batch_with_http
+        return process_batch_with_http(ean_codes_batch, download_dir, batch_number)
+    
+    if config.BROWSER_POOL_ENABLED:
+        # Берем уже залогиненную сессию из пула
+        return process_batch_with_pool(ean_codes_batch, download_dir, batch_number, headless)
+    
+    # Очищаем временные директории Chrome перед новой сессией
+    cleanup_chrome_temp_dirs()
+    
+    # Обрабатываем группу в новой сессии браузера
+    return process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number, headless)
+
+
+def restore_completed_batches(batch_manifest):
+    """
+    Группы прерванного запуска, файлы которых уже скачаны и целы
+
+    Returns:
+        tuple: (список файлов групп, set EAN кодов этих групп, последний номер группы)
+    """
+    completed_files = []
+    completed_codes = set()
+    last_batch_number = 0
+    for batch_number, ean_codes, status, file_path in batch_manifest.batches():
+        last_batch_number = max(last_batch_number, batch_number)
+        if status == BATCH_DONE and file_path and is_complete_xlsx(file_path):
+            completed_files.append(file_path)
+            completed_codes.update(ean_codes)
+    return completed_files, completed_codes, last_batch_number
+
+
+def notify_batch_file(batch_file_callback, file_path, ean_codes=None):
+    """
+    Передает готовый файл группы потребителю (например, фоновому разбору)
+
+    Потребитель разбирает файл и сохраняет строки группы ean_codes в кеш
+    EAN. Без потребителя файл для кеша читается здесь.
+    """
+    if batch_file_callback:
+        try:
+            batch_file_callback(file_path, ean_codes)
+        except Exception as e:
+            print(f"Ошибка в batch_file_callback: {e}")
+    elif ean_codes is not None and config.EAN_CACHE_ENABLED:
+        get_ean_cache().store_batch_file(ean_codes, file_path)
+
+
+def process_batches_sequential(scheduler, download_dir, headless, progress_callback, batch_file_callback=None,
+                               batch_manifest=None):
     """Последовательная обработка батчей (для бесплатного плана)"""
     downloaded_files = []
     processed_count = 0
     
-    for i, batch in enumerate(batches, 1):
-        print(f"\n🆕 СОЗДАЕМ НОВУЮ СЕССИЮ БРАУЗЕРА для группы {i}/{len(batches)}")
-        
-        # Очищаем временные директории Chrome перед новой сессией
-        cleanup_chrome_temp_dirs()
+    while not scheduler.is_finished():
+        next_batch = scheduler.next_batch()
+        if next_batch is None:
+            # Остались только группы на повтор - ждем окончания паузы
+            time.sleep(scheduler.seconds_until_ready() or 0)
+            continue
+        i, batch = next_batch
         
-        # Обрабатываем группу в новой сессии браузера
-        result = process_batch_with_new_browser(batch, download_dir, i, headless)
+        print(f"\n📦 Обрабатываем группу {i} ({len(batch)} кодов, {scheduler.position}/{len(scheduler.ean_codes)})")
+        result, batch_size = process_batch_worker((batch, download_dir, i, headless, scheduler, batch_manifest))
         
         if result:
             downloaded_files.append(result)
-            processed_count += len(batch)
-            print(f"✅ Группа {i} обработана успешно в новой сессии")
+            notify_batch_file(batch_file_callback, result, batch)
+            processed_count += batch_size
+            print(f"✅ Группа {i} обработана успешно")
             
             # Обновляем прогресс через callback
             if progress_callback:
@@ -1108,23 +1219,26 @@ def process_batches_sequential(batches, download_dir, headless, progress_callbac
                 except Exception as e:
                     print(f"Ошибка в progress_callback: {e}")
         else:
-            print(f"❌ Ошибка при обработке группы {i} в новой сессии")
+            print(f"❌ Ошибка при обработке группы {i}")
     
     return downloaded_files
 
 
 def process_batch_worker(args):
     """Рабочая функция для обработки одного батча в параллельном режиме"""
-    batch, download_dir, batch_index, headless = args
+    batch, download_dir, batch_index, headless, scheduler, batch_manifest = args
     
+    started_at = time.time()
+    result = None
+    try:
+        if batch_manifest:
+            batch_manifest.batch_started(batch_index, batch)
+    except Exception as e:
+        print(f"⚠️ Не удалось записать группу {batch_index} в манифест групп: {e}")
     try:
         print(f"\n🚀 ПАРАЛЛЕЛЬНАЯ СЕССИЯ {batch_index}: Обрабатываем {len(batch)} EAN кодов")
         
-        # Очищаем временные директории Chrome перед новой сессией
-        cleanup_chrome_temp_dirs()
-        
-        # Обрабатываем группу в новой сессии браузера
-        result = process_batch_with_new_browser(batch, download_dir, batch_index, headless)
+        result = process_batch(batch, download_dir, batch_index, headless)
         
         if result:
             print(f"✅ ПАРАЛЛЕЛЬНАЯ СЕССИЯ {batch_index}: Группа обработана успешно")
@@ -1136,52 +1250,85 @@ def process_batch_worker(args):
     except Exception as e:
         print(f"❌ ПАРАЛЛЕЛЬНАЯ СЕССИЯ {batch_index}: Исключение - {e}")
         return None, 0
+    
+    finally:
+        # Время и результат группы определяют размер следующих групп,
+        # неудачная группа ставится на повтор или делится пополам
+        scheduler.sizer.record(batch_index, len(batch), time.time() - started_at, result is not None)
+        scheduler.report_result(batch_index, result is not None)
+        if batch_manifest:
+            try:
+                batch_manifest.batch_finished(batch_index, batch, result)
+            except Exception as e:
+                print(f"⚠️ Не удалось записать группу {batch_index} в манифест групп: {e}")
 
 
-def process_batches_parallel(batches, download_dir, headless, progress_callback, max_workers):
+def process_batches_parallel(scheduler, download_dir, headless, progress_callback, max_workers, batch_file_callback=None,
+                             batch_manifest=None):
     """Параллельная обработка батчей (для Hobby плана)"""
     downloaded_files = []
     processed_count = 0
     
-    # Подготавливаем аргументы для воркеров
-    worker_args = []
-    for i, batch in enumerate(batches, 1):
-        worker_args.append((batch, download_dir, i, headless))
-    
-    print(f"🚀 ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА: Запускаем {max_workers} воркеров для {len(batches)} батчей")
+    print(f"🚀 ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА: Запускаем {max_workers} воркеров для {len(scheduler.ean_codes)} кодов")
     
     # Используем ThreadPoolExecutor для параллельной обработки
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Отправляем все задачи
-        future_to_batch = {executor.submit(process_batch_worker, args): i for i, args in enumerate(worker_args, 1)}
+        future_to_batch = {}
         
-        # Собираем результаты по мере выполнения
-        for future in concurrent.futures.as_completed(future_to_batch):
-            batch_num = future_to_batch[future]
-            try:
-                result, batch_size = future.result()
-                if result:
-                    downloaded_files.append(result)
-                    processed_count += batch_size
-                    print(f"✅ ПАРАЛЛЕЛЬНО: Батч {batch_num} завершен, обработано {batch_size} кодов")
-                    
-                    # Обновляем прогресс через callback
-                    if progress_callback:
-                        try:
-                            progress_callback(processed_count)
-                        except Exception as e:
-                            print(f"Ошибка в progress_callback: {e}")
-                else:
-                    print(f"❌ ПАРАЛЛЕЛЬНО: Батч {batch_num} не удалось обработать")
-                    
-            except Exception as exc:
-                print(f"❌ ПАРАЛЛЕЛЬНО: Батч {batch_num} вызвал исключение: {exc}")
+        def submit_next_batch():
+            # Группа нарезается в момент отправки - с текущим размером из регулятора
+            next_batch = scheduler.next_batch()
+            if next_batch is None:
+                return False
+            batch_num, batch = next_batch
+            args = (batch, download_dir, batch_num, headless, scheduler, batch_manifest)
+            future_to_batch[executor.submit(process_batch_worker, args)] = (batch_num, batch)
+            return True
+        
+        while future_to_batch or not scheduler.is_finished():
+            # Заполняем свободные воркеры новыми группами и готовыми повторами
+            while len(future_to_batch) < max_workers and submit_next_batch():
+                pass
+            
+            if not future_to_batch:
+                # Остались только группы на повтор - ждем окончания паузы
+                time.sleep(scheduler.seconds_until_ready() or 0)
+                continue
+            
+            # Собираем результаты по мере выполнения (и просыпаемся к следующему повтору)
+            done, _ = concurrent.futures.wait(
+                future_to_batch,
+                timeout=scheduler.seconds_until_ready(),
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                batch_num, batch = future_to_batch.pop(future)
+                try:
+                    result, batch_size = future.result()
+                    if result:
+                        downloaded_files.append(result)
+                        notify_batch_file(batch_file_callback, result, batch)
+                        processed_count += batch_size
+                        print(f"✅ ПАРАЛЛЕЛЬНО: Батч {batch_num} завершен, обработано {batch_size} кодов")
+                        
+                        # Обновляем прогресс через callback
+                        if progress_callback:
+                            try:
+                                progress_callback(processed_count)
+                            except Exception as e:
+                                print(f"Ошибка в progress_callback: {e}")
+                    else:
+                        print(f"❌ ПАРАЛЛЕЛЬНО: Батч {batch_num} не удалось обработать")
+                        
+                except Exception as exc:
+                    print(f"❌ ПАРАЛЛЕЛЬНО: Батч {batch_num} вызвал исключение: {exc}")
     
-    print(f"🏁 ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА ЗАВЕРШЕНА: {len(downloaded_files)} файлов из {len(batches)} батчей")
+    print(f"🏁 ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА ЗАВЕРШЕНА: {len(downloaded_files)} файлов из {scheduler.batch_count} батчей")
     return downloaded_files
 
 
-def process_supplier_file_with_tradewatch(supplier_file_path, download_dir, headless=True, progress_callback=None):
+def process_supplier_file_with_tradewatch(supplier_file_path, download_dir, headless=True, progress_callback=None, job_stats=None,
+                                          batch_file_callback=None, progress_events=None, cached_rows_callback=None):
     """
     Обрабатывает файл поставщика: извлекает EAN коды, 
     разбивает на группы и получает данные из TradeWatch
@@ -1195,28 +1342,42 @@ def process_supplier_file_with_tradewatch(supplier_file_path, download_dir, head
         download_dir: папка для скачивания файлов TradeWatch
         headless: запуск в headless режиме (True) или с GUI (False)
         progress_callback: функция для отслеживания прогресса
+        job_stats: словарь, куда записывается статистика задачи
+            (failed_ean_codes - коды, которые не удалось получить после всех повторов)
+        batch_file_callback: вызывается с путем каждого готового файла группы
+            и ее EAN кодами сразу после скачивания (None для групп, скачанных
+            до перезапуска); потребитель сохраняет строки группы в кеш EAN
+        progress_events: получатель событий прогресса - этапы, группы, повторы
+            (см. progress_bridge.py), вызывается из потоков обработки
+        cached_rows_callback: вызывается с DataFrame строк TradeWatch, найденных
+            в кеше EAN (их нет среди возвращаемых файлов)
     
     Returns:
         list: список путей к скачанным файлам TradeWatch
     """
     try:
-        # Читаем файл поставщика
+        # Файл поставщика разобран при загрузке - берем колонки и
+        # подготовленные EAN коды из артефакта
         print(f"Читаем файл поставщика: {supplier_file_path}")
-        df = pd.read_excel(supplier_file_path)
+        metadata = load_supplier_metadata(supplier_file_path)
         
         # Проверяем наличие необходимых колонок
-        if 'GTIN' not in df.columns:
+        if 'GTIN' not in metadata['columns']:
             print("Ошибка: В файле поставщика нет колонки GTIN")
             return []
         
-        if 'Price' not in df.columns:
+        if 'Price' not in metadata['columns']:
             print("Ошибка: В файле поставщика нет колонки Price")
             return []
         
-        # Извлекаем EAN коды
-        ean_codes = df['GTIN'].dropna().astype(str).tolist()
-        # Удаляем пустые и некорректные коды
-        ean_codes = [code.strip() for code in ean_codes if code.strip() and code.strip() != 'nan']
+        # EAN коды нормализованы, проверены и без дубликатов (prepare_ean_codes)
+        preparation = metadata['preparation']
+        print_ean_preparation(preparation)
+        ean_codes = preparation['ean_codes']
+        
+        if job_stats is not None:
+            job_stats['invalid_ean_count'] = preparation['invalid_count']
+            job_stats['duplicate_ean_count'] = preparation['duplicate_count']
         
         print(f"Найдено {len(ean_codes)} EAN кодов в файле поставщика")
         
@@ -1224,12 +1385,6 @@ def process_supplier_file_with_tradewatch(supplier_file_path, download_dir, head
             print("Нет EAN кодов для обработки")
             return []
         
-        # Разбиваем на группы оптимального размера
-        batch_size = get_batch_size()
-        batches = [ean_codes[i:i + batch_size] for i in range(0, len(ean_codes), batch_size)]
-        
-        print(f"Разбиваем на {len(batches)} групп по {batch_size} кодов")
-        
         # Создаем папку для скачивания если её нет
         download_path = Path(download_dir)
         download_path.mkdir(parents=True, exist_ok=True)
@@ -1250,18 +1405,106 @@ def process_supplier_file_with_tradewatch(supplier_file_path, download_dir, head
                 except Exception as e:
                     print(f"Не удалось удалить файл {old_file}: {e}")
                     pass
+        cleanup_worker_download_dirs(download_dir)
+        
+        # Продолжение прерванной задачи (перезапуск бота или повторное нажатие
+        # на том же файле поставщика): уже скачанные группы не запрашиваем снова
+        batch_manifest = BatchManifest(download_dir, ean_codes) if config.BATCH_MANIFEST_ENABLED else None
+        
+        completed_files = []
+        last_batch_number = 0
+        if batch_manifest:
+            completed_files, completed_codes, last_batch_number = restore_completed_batches(batch_manifest)
+            if completed_files:
+                ean_codes = [code for code in ean_codes if code not in completed_codes]
+                print(f"♻️ Продолжение задачи: {len(completed_files)} групп уже скачано "
+                      f"({len(completed_codes)} кодов), осталось {len(ean_codes)} кодов")
+                for file_path in completed_files:
+                    notify_batch_file(batch_file_callback, file_path)
+                
+                # Скачанные коды уже обработаны - прогресс считаем поверх них
+                completed_code_count = len(completed_codes)
+                if progress_callback:
+                    resumed_progress_callback = progress_callback
+                    progress_callback = lambda processed: resumed_progress_callback(completed_code_count + processed)
+                    try:
+                        progress_callback(0)
+                    except Exception as e:
+                        print(f"Ошибка в progress_callback: {e}")
+        
+        # Коды со свежими результатами в кеше не отправляем в TradeWatch
+        cache_hits = 0
+        if config.EAN_CACHE_ENABLED:
+            # Коды уже нормализованы к 13 цифрам - это и есть ключи кеша
+            cached_results = get_ean_cache().lookup(ean_codes)
+            cache_hits = len(cached_results)
+            ean_codes = [code for code in ean_codes if code not in cached_results]
+            
+            # Коды из кеша уже обработаны - прогресс групп считаем поверх них
+            cached_code_count = cache_hits
+            if progress_callback and cached_code_count:
+                job_progress_callback = progress_callback
+                progress_callback = lambda processed: job_progress_callback(cached_code_count + processed)
+                try:
+                    progress_callback(0)
+                except Exception as e:
+                    print(f"Ошибка в progress_callback: {e}")
+            
+            # Строки из кеша передаются в объединение отчета как DataFrame
+            cached_rows = cache_hits_frame(cached_results)
+            if cached_rows is not None and cached_rows_callback:
+                try:
+                    cached_rows_callback(cached_rows)
+                except Exception as e:
+                    print(f"Ошибка в cached_rows_callback: {e}")
+            print(f"🗄️ Кеш EAN: {cache_hits} кодов найдено, {len(ean_codes)} нужно запросить в TradeWatch")
+            emit_progress_event(progress_events, EVENT_CACHE, hits=cache_hits, misses=len(ean_codes))
+        
+        if job_stats is not None:
+            job_stats['cache_hits'] = cache_hits
+            job_stats['cache_misses'] = len(ean_codes)
+        
+        if not ean_codes:
+            print("✅ Все EAN коды найдены в кеше или уже скачаны, TradeWatch не нужен")
+            return completed_files
+        
+        # Группы нарезаются по ходу обработки: размер подстраивается
+        # под время ответа TradeWatch и ошибки (см. batch_sizing.py)
+        batch_sizer = AdaptiveBatchSizer(get_batch_size())
+        scheduler = EanBatchScheduler(ean_codes, batch_sizer, first_batch_number=last_batch_number + 1,
+                                      progress_events=progress_events)
+        emit_progress_event(progress_events, EVENT_STAGE, stage="Получение данных из TradeWatch")
+        
+        print(f"Начальный размер группы: {batch_sizer.next_batch_size()} кодов "
+              f"(адаптивный: {'да' if batch_sizer.enabled else 'нет'})")
         
         # � ОПТИМИЗАЦИЯ ДЛЯ HOBBY ПЛАНА: Выбираем стратегию обработки
-        parallel_sessions = get_parallel_sessions()
+        if get_tradewatch_transport() == "http":
+            # HTTP транспорт не запускает Chrome - можно больше параллельных групп
+            parallel_sessions = config.HTTP_PARALLEL_SESSIONS
+        else:
+            parallel_sessions = get_parallel_sessions()
         
         if parallel_sessions > 1:
             print(f"🚀 HOBBY ПЛАН: Параллельная обработка {parallel_sessions} сессий")
-            downloaded_files = process_batches_parallel(batches, download_dir, headless, progress_callback, parallel_sessions)
+            downloaded_files = process_batches_parallel(scheduler, download_dir, headless, progress_callback, parallel_sessions,
+                                                        batch_file_callback, batch_manifest)
         else:
             print(f"🔥 БАЗОВЫЙ ПЛАН: Последовательная обработка")
-            downloaded_files = process_batches_sequential(batches, download_dir, headless, progress_callback)
+            downloaded_files = process_batches_sequential(scheduler, download_dir, headless, progress_callback,
+                                                          batch_file_callback, batch_manifest)
         
-        print(f"\n🏁 Обработка завершена. Загружено {len(downloaded_files)} файлов из {len(batches)} групп")
+        print(f"\n🏁 Обработка завершена. Загружено {len(downloaded_files)} файлов из {scheduler.batch_count} групп")
+        batch_sizer.print_summary()
+        scheduler.print_summary()
+        wait_telemetry.print_summary()
+        
+        if job_stats is not None:
+            job_stats['failed_ean_codes'] = list(scheduler.failed_codes)
+            job_stats['retried_batches'] = scheduler.retried_batches
+            job_stats['split_batches'] = scheduler.split_batches
+        
+        downloaded_files = completed_files + downloaded_files
         
         # Проверяем, что все файлы существуют
         print("Проверка существования файлов:")
@@ -1274,9 +1517,8 @@ def process_supplier_file_with_tradewatch(supplier_file_path, download_dir, head
             else:
                 print(f"  ❌ {file_path} - НЕ НАЙДЕН!")
         
-        # КРИТИЧЕСКИ ВАЖНО: Проверяем уникальность содержимого
-        if existing_files:
-            verify_batch_uniqueness(existing_files)
+        # Проверка уникальности содержимого не нужна: каждая группа скачивается
+        # в свою папку воркера и сохраняется под своим номером
         
         return downloaded_files
         
@@ -1303,63 +1545,14 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
         print("Пустая группа EAN кодов")
         return None
     
-    # Настройка драйвера Chrome для НОВОЙ сессии
-    options = webdriver.ChromeOptions()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    
-    if headless:
-        options.add_argument("--headless")
-    
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-extensions")
-    options.add_argument("--disable-logging")
-    options.add_argument("--disable-web-security")
-    options.add_argument("--allow-running-insecure-content")
-    
-    # 🔥 КРИТИЧЕСКИ ВАЖНО: Отключаем ВСЕ виды кеширования
-    options.add_argument("--disable-application-cache")
-    options.add_argument("--disable-background-timer-throttling")
-    options.add_argument("--disable-backgrounding-occluded-windows")
-    options.add_argument("--disable-renderer-backgrounding")
-    options.add_argument("--disable-features=TranslateUI")
-    options.add_argument("--disable-ipc-flooding-protection")
-    options.add_argument("--disable-background-networking")
-    options.add_argument("--disable-default-apps")
-    options.add_argument("--disable-sync")
-    options.add_argument("--disable-translate")
-    options.add_argument("--hide-scrollbars")
-    options.add_argument("--metrics-recording-only")
-    options.add_argument("--no-first-run")
-    options.add_argument("--safebrowsing-disable-auto-update")
-    options.add_argument("--disable-plugins")
-    options.add_argument("--disable-plugins-discovery")
-    options.add_argument("--disable-preconnect")
-    
-    # Настройка для автоматической загрузки файлов
-    download_path = Path(download_dir)
-    prefs = {
-        "download.default_directory": str(download_path.absolute()),
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    options.add_experimental_option("prefs", prefs)
-    
     # 🆕 СОЗДАЕМ НОВЫЙ ДРАЙВЕР для каждой группы
-    service = get_chrome_service()
-    driver = webdriver.Chrome(service=service, options=options)
+    driver = create_chrome_driver(download_dir, headless)
     
     try:
         print(f"🔥 НОВАЯ СЕССИЯ: Обрабатываем группу {batch_number} с {len(ean_codes_batch)} EAN кодами")
         
         # Форматируем EAN коды в 13-цифровой формат
-        formatted_ean_codes = []
-        for code in ean_codes_batch:
-            formatted_code = format_ean_to_13_digits(code)
-            if formatted_code:
-                formatted_ean_codes.append(formatted_code)
+        formatted_ean_codes = normalize_ean_series(ean_codes_batch).dropna().tolist()
         
         if not formatted_ean_codes:
             print("Нет валидных EAN кодов после форматирования")
@@ -1371,47 +1564,18 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
         ean_codes_string = ' '.join(formatted_ean_codes)
         print(f"🔍 DEBUG: EAN коды для группы {batch_number}: {ean_codes_string[:100]}...")
         
-        # Переход на страницу входа
-        driver.get("https://tradewatch.pl/login.jsf")
-        
-        # Ждем загрузки страницы
+        # Вход в систему
         wait = WebDriverWait(driver, 15)
-        
-        # Ищем поле для email
-        email_field = wait.until(EC.presence_of_element_located((By.NAME, "j_username")))
-        
-        # Вводим email
-        email_field.clear()
-        email_field.send_keys(TRADEWATCH_EMAIL)
-        
-        # Ищем поле для пароля
-        password_field = driver.find_element(By.NAME, "j_password")
-        
-        # Вводим пароль
-        password_field.clear()
-        password_field.send_keys(TRADEWATCH_PASSWORD)
-        
-        # Ищем кнопку входа
-        login_button = driver.find_element(By.NAME, "btnLogin")
-        
-        # Нажимаем кнопку входа
-        login_button.click()
-        
-        # Ждем немного после входа
-        time.sleep(3)
-        
-        # Проверяем успешность входа
-        current_url = driver.current_url
-        
-        if "login.jsf" in current_url:
+        if not login_tradewatch(driver, wait):
             print(f"❌ Ошибка при входе в систему для группы {batch_number}")
             return None
         
         print(f"✅ Успешный вход в систему для группы {batch_number}!")
         
-        # Переходим на страницу EAN Price Report
-        driver.get("https://tradewatch.pl/report/ean-price-report.jsf")
-        time.sleep(3)
+        # Переходим на страницу EAN Price Report (если вход не открыл ее сам)
+        if TRADEWATCH_REPORT_URL not in driver.current_url:
+            driver.get(TRADEWATCH_REPORT_URL)
+            wait_for_ean_field_ready(driver)
         
         # Ищем поле для ввода EAN кодов
         ean_field = wait.until(EC.presence_of_element_located((By.ID, "eansPhrase")))
@@ -1425,21 +1589,12 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
             print(f"✅ Поле изначально пустое в новой сессии для группы {batch_number}")
         
         # Вставляем EAN коды (поле уже должно быть пустым)
-        ean_field.send_keys(ean_codes_string)
-        
-        # Проверяем, что вставились именно наши коды
-        inserted_value = ean_field.get_attribute("value")
-        inserted_codes = inserted_value.strip().split() if inserted_value else []
-        expected_codes = ean_codes_string.strip().split()
-        
-        if len(inserted_codes) != len(expected_codes):
-            print(f"⚠️ Количество вставленных кодов ({len(inserted_codes)}) не совпадает с ожидаемым ({len(expected_codes)})")
+        if not populate_ean_field(driver, ean_field, ean_codes_string, batch_number):
+            print(f"⚠️ В поле не ровно коды группы {batch_number}")
             return None
         
-        print(f"✅ Вставлено {len(inserted_codes)} EAN кодов для группы {batch_number}")
-        
-        # Ждем немного
-        time.sleep(1)
+        # Ждем, пока отработают AJAX обработчики поля
+        wait_for_ajax_idle(driver)
         
         # Ищем кнопку "Generuj"
         generate_button = driver.find_element(By.ID, "j_idt703")
@@ -1447,13 +1602,10 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
         # Нажимаем кнопку
         generate_button.click()
         
-        # Ждем обработки
-        print(f"⏳ Ждем обработки запроса для группы {batch_number}...")
-        time.sleep(5)
-        
-        # Ждем появления результатов
+        # Ждем появления результатов (завершение AJAX запроса и таблица результатов)
         print(f"⏳ Ждем появления результатов для группы {batch_number}...")
-        time.sleep(3)
+        if not wait_for_report_results(driver):
+            print(f"❌ Результаты для группы {batch_number} не появились, пробуем экспорт")
         
         # Очищаем старые файлы перед скачиванием
         old_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji.xlsx"))
@@ -1464,7 +1616,12 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
                 pass
         
         # Ищем кнопку "Eksport do XLS"
-        export_button = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Eksport do XLS")))
+        export_button = wait_for_export_link(driver)
+        if export_button is None:
+            raise Exception("Ссылка 'Eksport do XLS' не стала кликабельной")
+        
+        # Следим за папкой загрузок до клика, чтобы не пропустить файл
+        watcher = DownloadWatcher(download_dir)
         
         # Нажимаем кнопку экспорта
         export_button.click()
@@ -1472,37 +1629,8 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
         # Ждем загрузки файла
         print(f"⏳ Ждем загрузки файла для группы {batch_number}...")
         max_wait_time = 60
-        wait_interval = 2
-        waited_time = 0
-        
-        downloaded_file_found = False
-        
-        while waited_time < max_wait_time:
-            time.sleep(wait_interval)
-            waited_time += wait_interval
-            
-            # Ищем скачанный файл
-            downloaded_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji.xlsx"))
-            if downloaded_files:
-                latest_file = downloaded_files[0]
-                
-                # Проверяем стабильность размера файла
-                initial_size = os.path.getsize(latest_file)
-                time.sleep(3)
-                
-                try:
-                    final_size = os.path.getsize(latest_file)
-                    if initial_size == final_size and final_size > 0:
-                        print(f"✅ Файл для группы {batch_number} загружен: {latest_file} (размер: {final_size} байт)")
-                        downloaded_file_found = True
-                        break
-                    else:
-                        print(f"⏳ Файл еще скачивается... (размер: {final_size} байт)")
-                except:
-                    print(f"⏳ Файл заблокирован, продолжаем ждать...")
-                    continue
-            else:
-                print(f"⏳ Ожидание файла... ({waited_time}/{max_wait_time} сек)")
+        latest_file = wait_for_tradewatch_download(watcher, batch_number, max_wait_time)
+        downloaded_file_found = latest_file is not None
         
         if downloaded_file_found:
             # Переименовываем файл с оригинальным названием и датой/временем
@@ -1540,6 +1668,40 @@ def process_batch_with_new_browser(ean_codes_batch, download_dir, batch_number,
         driver.quit()
 
 
+def process_batch_with_pool(ean_codes_batch, download_dir, batch_number, headless=True):
+    """
+    Обрабатывает группу EAN кодов в "теплой" сессии из пула браузеров
+    
+    Вместо запуска нового Chrome и повторного входа для каждой группы
+    берет уже залогиненный драйвер из пула. Изоляция групп обеспечивается
+    полным сбросом страницы отчета в process_batch_in_session().
+    
+    Args:
+        ean_codes_batch: список EAN кодов для обработки
+        download_dir: папка для скачивания файлов
+        batch_number: номер группы для идентификации файла
+        headless: запуск в headless режиме (True) или с GUI (False)
+    
+    Returns:
+        str: путь к скачанному файлу или None если ошибка
+    """
+    from browser_pool import get_browser_pool
+    
+    pool = get_browser_pool(headless)
+    session = pool.lease(download_dir)
+    if session is None:
+        print(f"❌ Не удалось получить сессию из пула для группы {batch_number}")
+        return None
+    
+    result = None
+    try:
+        result = process_batch_in_session(session.driver, ean_codes_batch, download_dir, batch_number)
+        return result
+    finally:
+        # Неудачная группа - повод пересоздать драйвер
+        pool.release(session, failed=result is None)
+
+
 def process_supplier_file_with_tradewatch_old_version(supplier_file_path, download_dir, headless=True):
     """
     Обрабатывает файл поставщика: извлекает EAN коды, 
@@ -1637,39 +1799,11 @@ def process_supplier_file_with_tradewatch_old_version(supplier_file_path, downlo
         try:
             print("Запускаем браузер и выполняем вход в систему...")
             
-            # Переход на страницу входа
-            driver.get("https://tradewatch.pl/login.jsf")
-            
             # Ждем загрузки страницы
             wait = WebDriverWait(driver, 10)
             
-            # Ищем поле для email
-            email_field = wait.until(EC.presence_of_element_located((By.NAME, "j_username")))
-            
-            # Вводим email
-            email_field.clear()
-            email_field.send_keys(TRADEWATCH_EMAIL)
-            
-            # Ищем поле для пароля
-            password_field = driver.find_element(By.NAME, "j_password")
-            
-            # Вводим пароль
-            password_field.clear()
-            password_field.send_keys(TRADEWATCH_PASSWORD)
-            
-            # Ищем кнопку входа
-            login_button = driver.find_element(By.NAME, "btnLogin")
-            
-            # Нажимаем кнопку входа
-            login_button.click()
-            
-            # Ждем немного после входа
-            time.sleep(3)
-            
-            # Проверяем успешность входа
-            current_url = driver.current_url
-            
-            if "login.jsf" in current_url:
+            # Вход в систему (по сохраненной сессии или через форму)
+            if not login_tradewatch(driver, wait):
                 print("Ошибка при входе в систему")
                 return []
             
@@ -1713,6 +1847,8 @@ def process_supplier_file_with_tradewatch_old_version(supplier_file_path, downlo
                 
                 # Обрабатываем группу в той же сессии
                 result = process_batch_in_session(driver, batch, download_dir, i)
+                if result:
+                    result = publish_batch_file(result, download_dir, i)
                 
                 if result:
                     downloaded_files.append(result)
@@ -1860,60 +1996,37 @@ def process_batch_in_separate_browser(ean_codes_batch, download_dir, batch_numbe
         
         print(f"Создан браузер для группы {batch_number}")
         
-        # Вход в систему
-        driver.get("https://tradewatch.pl/login.jsf")
-        
         # Ждем загрузки страницы
         wait = WebDriverWait(driver, 20)
         
-        # Вводим логин
-        username_field = wait.until(EC.presence_of_element_located((By.NAME, "username")))
-        username_field.clear()
-        username_field.send_keys(TRADEWATCH_EMAIL)
-        
-        # Вводим пароль
-        password_field = driver.find_element(By.NAME, "password")
-        password_field.clear()
-        password_field.send_keys(TRADEWATCH_PASSWORD)
-        
-        # Нажимаем кнопку входа
-        login_button = driver.find_element(By.NAME, "btnLogin")
-        login_button.click()
-        
-        time.sleep(3)
-        
-        # Проверяем успешность входа
-        current_url = driver.current_url
-        if "login.jsf" in current_url:
+        # Вход в систему (по сохраненной сессии или через форму)
+        if not login_tradewatch(driver, wait):
             print(f"Ошибка при входе в систему для группы {batch_number}")
             return None
             
         print(f"Успешный вход для группы {batch_number}")
         
-        # Переходим на страницу EAN Price Report
-        driver.get("https://tradewatch.pl/report/ean-price-report.jsf")
+        # Переходим на страницу EAN Price Report (если вход не открыл ее сам)
+        if TRADEWATCH_REPORT_URL not in driver.current_url:
+            driver.get(TRADEWATCH_REPORT_URL)
         
         # Соединяем EAN коды в одну строку
         ean_codes_string = ' '.join(str(code) for code in ean_codes_batch)
         
         # Ищем текстовое поле для ввода EAN кодов
         ean_input = wait.until(EC.presence_of_element_located((By.ID, "report_form:ean_codes")))
-        ean_input.clear()
-        ean_input.send_keys(ean_codes_string)
-        
-        print(f"Вставлены EAN коды для группы {batch_number}: {len(ean_codes_batch)} кодов")
+        if not populate_ean_field(driver, ean_input, ean_codes_string, batch_number):
+            print(f"Не удалось вставить EAN коды для группы {batch_number}")
+            return None
         
         # Нажимаем кнопку "Szukaj"
         search_button = wait.until(EC.element_to_be_clickable((By.ID, "report_form:search_button")))
         search_button.click()
         
-        print(f"Ждем обработки запроса для группы {batch_number}...")
-        time.sleep(5)
-        
         # Ждем появления результатов
-        wait.until(EC.presence_of_element_located((By.ID, "report_form:results")))
         print(f"Ждем появления результатов для группы {batch_number}...")
-        time.sleep(3)
+        wait.until(EC.presence_of_element_located((By.ID, "report_form:results")))
+        wait_for_ajax_idle(driver)
         
         # Экспортируем результаты
         return export_results_for_separate_browser(driver, download_dir, batch_number, wait)
@@ -1944,7 +2057,12 @@ def export_results_for_separate_browser(driver, download_dir, batch_number, wait
             except:
                 pass
         
-        export_button = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Eksport do XLS")))
+        export_button = wait_for_export_link(driver)
+        if export_button is None:
+            raise Exception("Ссылка 'Eksport do XLS' не стала кликабельной")
+        
+        # Следим за папкой загрузок до клика, чтобы не пропустить файл
+        watcher = DownloadWatcher(download_dir)
         
         # Пытаемся кликнуть разными способами
         click_success = False
@@ -1980,63 +2098,44 @@ def export_results_for_separate_browser(driver, download_dir, batch_number, wait
         
         if not click_success:
             print(f"Все методы клика не сработали для группы {batch_number}")
+            watcher.close()
             return None
         
         # Ждем загрузки файла
         print(f"Ждем загрузки файла для группы {batch_number}...")
-        return wait_for_download_separate_browser(download_dir, batch_number)
+        return wait_for_download_separate_browser(download_dir, batch_number, watcher)
         
     except Exception as e:
         print(f"Ошибка при экспорте группы {batch_number}: {e}")
         return None
 
 
-def wait_for_download_separate_browser(download_dir, batch_number):
+def wait_for_download_separate_browser(download_dir, batch_number, watcher=None):
     """
     Ждет загрузки файла для отдельного браузера
+    
+    Args:
+        watcher: DownloadWatcher, созданный до клика по кнопке экспорта
+            (если не передан - ждем любой новый файл с момента вызова)
     """
     max_wait_time = 60
-    wait_interval = 2
-    waited_time = 0
-    
-    while waited_time < max_wait_time:
-        time.sleep(wait_interval)
-        waited_time += wait_interval
-        
-        # Ищем скачанный файл
-        downloaded_files = glob.glob(os.path.join(download_dir, "TradeWatch - raport konkurencji*.xlsx"))
-        if downloaded_files:
-            # Берем самый новый файл
-            latest_file = max(downloaded_files, key=os.path.getctime)
-            
-            # Проверяем стабильность размера
-            initial_size = os.path.getsize(latest_file)
-            time.sleep(3)
-            
-            try:
-                final_size = os.path.getsize(latest_file)
-                if initial_size == final_size and final_size > 0:
-                    print(f"Файл для группы {batch_number} загружен: {latest_file} (размер: {final_size} байт)")
-                    
-                    # Переименовываем файл
-                    new_filename = f"TradeWatch_batch_{batch_number}.xlsx"
-                    new_filepath = os.path.join(download_dir, new_filename)
-                    
-                    if os.path.exists(new_filepath):
-                        os.remove(new_filepath)
-                    
-                    os.rename(latest_file, new_filepath)
-                    return new_filepath
-                else:
-                    print(f"Файл для группы {batch_number} еще скачивается... (размер: {final_size} байт)")
-            except:
-                print(f"Файл для группы {batch_number} заблокирован, продолжаем ждать...")
-                continue
-        else:
-            print(f"Ожидание файла для группы {batch_number}... ({waited_time}/{max_wait_time} сек)")
+    if watcher is None:
+        watcher = DownloadWatcher(download_dir)
+    
+    latest_file = wait_for_tradewatch_download(watcher, batch_number, max_wait_time)
+    if latest_file is None:
+        print(f"Файл для группы {batch_number} не найден после {max_wait_time} секунд ожидания")
+        return None
+    
+    # Переименовываем файл
+    new_filename = f"TradeWatch_batch_{batch_number}.xlsx"
+    new_filepath = os.path.join(download_dir, new_filename)
+    
+    if os.path.exists(new_filepath):
+        os.remove(new_filepath)
     
-    print(f"Файл для группы {batch_number} не найден после {max_wait_time} секунд ожидания")
-    return None
+    os.rename(latest_file, new_filepath)
+    return new_filepath
 
 
 def process_supplier_file_with_tradewatch_interruptible(supplier_file_path, download_dir, stop_flag_callback=None, progress_callback=None, headless=True):
@@ -0,0 +1,194 @@
+"""
+Локальный stub сервер, имитирующий JSF страницы TradeWatch
+
+Нужен для проверки HTTP транспорта (tradewatch_http.py) без обращения
+к настоящему TradeWatch. Повторяет вход через форму, ViewState, кнопку
+"Generuj" и ссылку "Eksport do XLS", отдает XLSX с листом
+config.TRADEWATCH_SHEET_NAME.
+
+Запуск:
+    python tradewatch_stub_server.py [порт]
+
+Затем в config.py: TRADEWATCH_HTTP_BASE_URL = "http://127.0.0.1:<порт>"
+и переменная окружения TRADEWATCH_TRANSPORT=http.
+"""
+import io
+import os
+import sys
+import uuid
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlparse
+
+from openpyxl import Workbook
+
+import config
+
+STUB_EMAIL = os.getenv("TRADEWATCH_EMAIL", "TRADEWATCH_EMAIL")
+STUB_PASSWORD = os.getenv("TRADEWATCH_PASSWORD", "TRADEWATCH_PASSWORD")
+
+# Колонки листа "Produkty wg EAN" в экспорте
+STUB_REPORT_COLUMNS = ['EAN', 'Top oferta', 'Cena min.', 'Link', 'Dost. szt.', 'Ilość aukcji', 'Transakcje (30 dni)']
+
+LOGIN_PAGE = """<html><body>
+<form id="loginForm" action="/j_spring_security_check" method="post">
+<input type="text" id="j_username" name="j_username" value="">
+<input type="password" id="j_password" name="j_password" value="">
+<input type="submit" id="btnLogin" name="btnLogin" value="Zaloguj">
+</form></body></html>"""
+
+REPORT_PAGE = """<html><body>
+<form id="eanForm" action="/report/ean-price-report.jsf" method="post">
+<textarea id="eanForm:eansPhrase" name="eanForm:eansPhrase">{eans}</textarea>
+<input type="submit" id="j_idt703" name="j_idt703" value="Generuj">
+<input type="hidden" name="javax.faces.ViewState" value="{view_state}">
+{results}
+</form></body></html>"""
+
+RESULTS_BLOCK = """<table id="results">{rows}</table>
+<a id="j_idt133" href="#" class="icon-excel"
+   onclick="mojarra.jsfcljs(document.getElementById('eanForm'),{{'j_idt133':'j_idt133'}},'');return false">Eksport do XLS</a>"""
+
+
+def build_stub_report(ean_codes, output):
+    """
+    Создает XLSX в формате экспорта TradeWatch для списка EAN кодов
+
+    Args:
+        ean_codes: список EAN кодов
+        output: путь к файлу или файловый объект
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = config.TRADEWATCH_SHEET_NAME
+    ws.append(STUB_REPORT_COLUMNS)
+    for i, ean in enumerate(ean_codes):
+        seed = int(ean[-6:]) if ean[-6:].isdigit() else i
+        ws.append([
+            ean,
+            f"Produkt {ean}",
+            round(10 + seed % 500 + (seed % 100) / 100, 2),
+            10000000000 + seed,
+            seed % 50,
+            seed % 30,
+            seed % 200
+        ])
+    wb.save(output)
+
+
+class StubSession:
+    def __init__(self):
+        self.view_state = uuid.uuid4().hex
+        self.ean_codes = []
+
+    def next_view_state(self):
+        self.view_state = uuid.uuid4().hex
+        return self.view_state
+
+
+class TradeWatchStubHandler(BaseHTTPRequestHandler):
+    sessions = {}
+    sessions_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        session_id = cookie['JSESSIONID'].value if 'JSESSIONID' in cookie else None
+        with self.sessions_lock:
+            return self.sessions.get(session_id)
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location, headers=None):
+        headers = dict(headers or {})
+        headers['Location'] = location
+        self._send(302, headers=headers)
+
+    def _render_report(self, session, with_results=False):
+        results = ''
+        if with_results:
+            rows = ''.join(f"<tr><td>{escape(ean)}</td></tr>" for ean in session.ean_codes)
+            results = RESULTS_BLOCK.format(rows=rows)
+        html = REPORT_PAGE.format(
+            eans=escape(' '.join(session.ean_codes)) if with_results else '',
+            view_state=session.next_view_state(),
+            results=results
+        )
+        self._send(200, html.encode('utf-8'))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/login.jsf':
+            self._send(200, LOGIN_PAGE.encode('utf-8'))
+        elif path == '/report/ean-price-report.jsf':
+            session = self._session()
+            if session is None:
+                self._redirect('/login.jsf')
+            else:
+                self._render_report(session)
+        else:
+            self._send(404, b'not found')
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8'), keep_blank_values=True).items()}
+
+        if path == '/j_spring_security_check':
+            if form.get('j_username') == STUB_EMAIL and form.get('j_password') == STUB_PASSWORD:
+                session_id = uuid.uuid4().hex
+                with self.sessions_lock:
+                    self.sessions[session_id] = StubSession()
+                self._redirect('/report/ean-price-report.jsf',
+                               {'Set-Cookie': f'JSESSIONID={session_id}; Path=/; HttpOnly'})
+            else:
+                self._redirect('/login.jsf?error')
+            return
+
+        if path != '/report/ean-price-report.jsf':
+            self._send(404, b'not found')
+            return
+
+        session = self._session()
+        if session is None:
+            self._redirect('/login.jsf')
+            return
+
+        if form.get('javax.faces.ViewState') != session.view_state:
+            # Как JSF: устаревший ViewState - ViewExpiredException
+            self._send(500, b'ViewExpiredException')
+            return
+
+        if 'j_idt703' in form:
+            session.ean_codes = form.get('eanForm:eansPhrase', '').split()
+            self._render_report(session, with_results=True)
+        elif form.get('j_idt133') == 'j_idt133':
+            buffer = io.BytesIO()
+            build_stub_report(session.ean_codes, buffer)
+            self._send(200, buffer.getvalue(),
+                       content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                       headers={'Content-Disposition': 'attachment; filename="TradeWatch - raport konkurencji.xlsx"'})
+        else:
+            self._render_report(session)
+
+
+def run_stub_server(port=8765):
+    """Запускает stub сервер (блокирующий вызов)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), TradeWatchStubHandler)
+    print(f"🧪 Stub TradeWatch запущен: http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    run_stub_server(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)